@@ -0,0 +1,52 @@
+"""
+Compare wall-clock extraction time for the inline path and the process-pool path.
+
+Usage: python -m benchmarks.extraction_benchmark [--files N] [--pages N] [--workers N]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from benchmarks.synthetic_pdfs import generate_job_folder
+from config.settings import EXTRACTION_WORKERS
+from utils.pdf_processor import (
+    create_extraction_pool,
+    extract_text_and_tables_from_pdf,
+    extract_text_and_tables_sync,
+)
+
+def run_inline(paths):
+    # The pre-pool behaviour: every file extracted on the event loop thread, one after another.
+    start = time.perf_counter()
+    for path in paths:
+        extract_text_and_tables_sync(path)
+    return time.perf_counter() - start
+
+async def run_pooled(paths, workers):
+    workers = workers or EXTRACTION_WORKERS
+    with create_extraction_pool(workers) as pool:
+        # Warm the workers up so process start-up is not charged to the first files.
+        await asyncio.gather(*(extract_text_and_tables_from_pdf(p, pool) for p in paths[:workers]))
+        start = time.perf_counter()
+        await asyncio.gather(*(extract_text_and_tables_from_pdf(p, pool) for p in paths))
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = generate_job_folder(folder, files=args.files, pages=args.pages)
+        inline = run_inline(paths)
+        pooled = asyncio.run(run_pooled(paths, args.workers))
+
+    print(f"{len(paths)} files x {args.pages} pages, {args.workers or EXTRACTION_WORKERS} workers")
+    print(f"inline: {inline:.2f}s")
+    print(f"pooled: {pooled:.2f}s ({inline / pooled:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Serves POST /v1/chat/completions (streamed or not) with configurable latency, error rate,
+429 behaviour and output truncation, answering with a small JSON document built from the
+room rows found in the request.
+Also serves the file and batch endpoints used by --batch mode, keeping uploaded files,
+batches and their results as files in --batch-dir.
+Usage: python -m benchmarks.fake_openai_server [--port N] [--latency S] [--error-rate P] ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import uuid
+from collections import deque
+
+from aiohttp import web
+
+STREAM_PIECE_CHARS = 24  # Characters per streamed delta, a few tokens like the real endpoint
+ROOM_ROW = re.compile(r"^\|\s*(\d{3,4})\s*\|\s*([A-Z][A-Z ]+?)\s*\|", re.MULTILINE)
+
+def fake_structure(messages):
+    """
+    Build a plausible structured response from the room rows in the user message.
+    Rooms already present in an earlier assistant message (a continuation) are left out.
+    """
+    content = "".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    answered = "".join(m.get("content") or "" for m in messages if m.get("role") == "assistant")
+    rooms = [{"number": number, "name": name} for number, name in ROOM_ROW.findall(content)
+             if f'"number": "{number}"' not in answered]
+    return {"metadata": {"project": "OHMNI TEST PROJECT"}, "rooms": rooms}
+
+def _truncate(content, options):
+    """Cut the content at --max-output-chars, as a response hitting max_tokens would be."""
+    if options.max_output_chars and len(content) > options.max_output_chars:
+        return content[:options.max_output_chars], "length"
+    return content, "stop"
+
+def _completion(body, content, finish_reason="stop"):
+    prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+def _error(status, message, retry_after=None):
+    headers = {"retry-after": f"{retry_after:.2f}"} if retry_after is not None else None
+    return web.json_response({"error": {"message": message, "type": "fake_error"}}, status=status, headers=headers)
+
+async def chat_completions(request):
+    options = request.app["options"]
+    stats = request.app["stats"]
+    body = await request.json()
+    stats["requests"] += 1
+
+    if options.rpm:
+        window = request.app["window"]
+        now = time.monotonic()
+        while window and now - window[0] > 60:
+            window.popleft()
+        if len(window) >= options.rpm:
+            stats["rate_limited"] += 1
+            return _error(429, "Rate limit reached for requests", retry_after=60 - (now - window[0]))
+        window.append(now)
+
+    if random.random() < options.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return _error(429, "Rate limit reached for tokens", retry_after=options.retry_after)
+    if random.random() < options.error_rate:
+        stats["errors"] += 1
+        return _error(500, "The server had an error while processing your request")
+
+    content, finish_reason = _truncate(json.dumps(fake_structure(body.get("messages", []))), options)
+    if body.get("stream"):
+        return await _stream_completion(request, body, content, finish_reason)
+    await asyncio.sleep(options.latency * random.uniform(0.5, 1.5))
+    return web.json_response(_completion(body, content, finish_reason))
+
+async def _stream_completion(request, body, content, finish_reason):
+    """Send a completion as server-sent events, spreading the latency over the content pieces."""
+    options = request.app["options"]
+    completion = _completion(body, content, finish_reason)
+    response = web.StreamResponse(headers={"content-type": "text/event-stream"})
+    await response.prepare(request)
+
+    async def send(choices, usage=None):
+        event = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+                 "model": completion["model"], "choices": choices, "usage": usage}
+        await response.write(f"data: {json.dumps(event)}\n\n".encode())
+
+    pieces = [content[i:i + STREAM_PIECE_CHARS] for i in range(0, len(content), STREAM_PIECE_CHARS)]
+    delay = options.latency * random.uniform(0.5, 1.5) / max(len(pieces), 1)
+    await send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+    for piece in pieces:
+        await asyncio.sleep(delay)
+        await send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+    await send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+    if (body.get("stream_options") or {}).get("include_usage"):
+        await send([], completion["usage"])
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+def _batch_path(app, kind, object_id):
+    return os.path.join(app["options"].batch_dir, kind, object_id)
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _write_json(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+def _store_file(app, data, filename, purpose):
+    file_id = f"file-fake-{uuid.uuid4().hex[:16]}"
+    with open(_batch_path(app, "files", file_id), "wb") as f:
+        f.write(data)
+    metadata = {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+    _write_json(_batch_path(app, "files", file_id + ".json"), metadata)
+    return metadata
+
+async def upload_file(request):
+    form = await request.post()
+    upload = form["file"]
+    return web.json_response(_store_file(request.app, upload.file.read(), upload.filename, form.get("purpose", "batch")))
+
+async def get_file_content(request):
+    path = _batch_path(request.app, "files", request.match_info["file_id"])
+    if not os.path.exists(path):
+        return _error(404, "No such file")
+    return web.FileResponse(path)
+
+async def run_batch(app, batch_id):
+    """Answer every request of a batch after --batch-latency seconds, with --error-rate failures."""
+    options = app["options"]
+    path = _batch_path(app, "batches", batch_id + ".json")
+    batch = _read_json(path)
+    with open(_batch_path(app, "files", batch["input_file_id"])) as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    batch.update(status="in_progress", in_progress_at=int(time.time()),
+                 request_counts={"total": len(requests), "completed": 0, "failed": 0})
+    _write_json(path, batch)
+    await asyncio.sleep(options.batch_latency)
+
+    output, errors = [], []
+    for item in requests:
+        if random.random() < options.error_rate:
+            errors.append({"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": item["custom_id"],
+                           "response": {"status_code": 500, "body": {"error": {
+                               "message": "The server had an error while processing your request"}}},
+                           "error": None})
+            continue
+        body = item["body"]
+        content, finish_reason = _truncate(json.dumps(fake_structure(body.get("messages", []))), options)
+        output.append({"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": item["custom_id"],
+                       "response": {"status_code": 200, "body": _completion(body, content, finish_reason)},
+                       "error": None})
+
+    def to_jsonl(records):
+        return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+    batch.update(
+        status="completed",
+        completed_at=int(time.time()),
+        output_file_id=_store_file(app, to_jsonl(output), "batch_output.jsonl", "batch_output")["id"],
+        error_file_id=_store_file(app, to_jsonl(errors), "batch_errors.jsonl", "batch_output")["id"] if errors else None,
+        request_counts={"total": len(requests), "completed": len(output), "failed": len(errors)},
+    )
+    _write_json(path, batch)
+    app["stats"]["batch_requests"] += len(requests)
+
+async def create_batch(request):
+    body = await request.json()
+    batch_id = f"batch_fake_{uuid.uuid4().hex[:16]}"
+    batch = {
+        "id": batch_id, "object": "batch", "endpoint": body["endpoint"], "errors": None,
+        "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+        "status": "validating", "output_file_id": None, "error_file_id": None,
+        "created_at": int(time.time()), "metadata": body.get("metadata"),
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+    }
+    _write_json(_batch_path(request.app, "batches", batch_id + ".json"), batch)
+    task = asyncio.create_task(run_batch(request.app, batch_id))
+    request.app["batch_tasks"].add(task)
+    task.add_done_callback(request.app["batch_tasks"].discard)
+    request.app["stats"]["batches"] += 1
+    return web.json_response(batch)
+
+async def get_batch(request):
+    path = _batch_path(request.app, "batches", request.match_info["batch_id"] + ".json")
+    if not os.path.exists(path):
+        return _error(404, "No such batch")
+    return web.json_response(_read_json(path))
+
+async def get_stats(request):
+    return web.json_response(request.app["stats"])
+
+def create_app(options):
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["options"] = options
+    app["stats"] = {"requests": 0, "rate_limited": 0, "errors": 0, "batches": 0, "batch_requests": 0}
+    app["window"] = deque()
+    app["batch_tasks"] = set()
+    for kind in ("files", "batches"):
+        os.makedirs(os.path.join(options.batch_dir, kind), exist_ok=True)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/files", upload_file)
+    app.router.add_get("/v1/files/{file_id}/content", get_file_content)
+    app.router.add_post("/v1/batches", create_batch)
+    app.router.add_get("/v1/batches/{batch_id}", get_batch)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 500 response")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of a random 429 response")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with random 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before answering 429 (0 = unlimited)")
+    parser.add_argument("--max-output-chars", type=int, default=0,
+                        help="Cut responses at this many characters with finish_reason 'length' (0 = never)")
+    parser.add_argument("--batch-dir", default=os.path.join(tempfile.gettempdir(), "fake_openai_batches"),
+                        help="Folder holding uploaded files, batches and batch results")
+    parser.add_argument("--batch-latency", type=float, default=2.0, help="Seconds before a batch completes")
+    return parser
+
+def serve(options):
+    web.run_app(create_app(options), host=options.host, port=options.port, print=None)
+
+if __name__ == "__main__":
+    serve(build_parser().parse_args())
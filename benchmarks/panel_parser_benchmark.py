@@ -0,0 +1,68 @@
+"""
+Parse rate of the rule-based panel schedule parser on a fixture corpus of panel layouts.
+
+Generates panel schedule sheets in every layout of synthetic_pdfs.PANEL_LAYOUTS, extracts
+them as the pipeline does and reports per layout how many sheets the parser structured
+on its own (confidence at or above PANEL_PARSER_MIN_CONFIDENCE), how many of those have
+every circuit, how many would go to the model, and the parse time per sheet.
+Usage: python -m benchmarks.panel_parser_benchmark [--sheets N] [--min-confidence C]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_pdfs import PANEL_LAYOUTS, generate_panel_schedule_pdf
+from config.settings import PANEL_PARSER_MIN_CONFIDENCE
+from utils.panel_parser import parse_panel_pages
+from utils.pdf_processor import extract_page_records_sync
+
+def parse_sheet(path):
+    records = extract_page_records_sync(path, "always")
+    pages = [(record["text_outside_tables"] if record["text_outside_tables"] is not None else record["text"],
+              record["tables"]) for record in records]
+    start = time.perf_counter()
+    parsed = parse_panel_pages(pages)
+    return parsed, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sheets", type=int, default=10, help="Sheets per layout")
+    parser.add_argument("--min-confidence", type=float, default=PANEL_PARSER_MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    totals = {"parse": [0, 0], "model": [0, 0], "none": [0, 0]}  # expected outcome -> [sheets, as expected]
+    parsed_sheets = panel_sheets = 0
+    with tempfile.TemporaryDirectory() as folder:
+        for layout, (_, expected) in PANEL_LAYOUTS.items():
+            parsed_count = complete = 0
+            confidences, seconds = [], []
+            for seed in range(args.sheets):
+                path = os.path.join(folder, f"{layout}_{seed}.pdf")
+                circuits = generate_panel_schedule_pdf(path, layout, seed=seed)
+                parsed, elapsed = parse_sheet(path)
+                seconds.append(elapsed)
+                if parsed is not None:
+                    confidences.append(parsed.confidence)
+                accepted = parsed is not None and parsed.confidence >= args.min_confidence
+                is_complete = accepted and sum(len(panel["circuits"]) for panel in parsed.panels) == circuits
+                parsed_count += accepted
+                complete += is_complete
+                outcome = "parse" if accepted else ("model" if parsed is not None else "none")
+                totals[expected][0] += 1
+                totals[expected][1] += outcome == expected and (is_complete or not accepted)
+            if expected != "none":
+                panel_sheets += args.sheets
+                parsed_sheets += parsed_count
+            mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+            print(f"{layout:>13}: parsed {parsed_count}/{args.sheets}, complete {complete}/{parsed_count}, "
+                  f"not parsed {args.sheets - parsed_count}, mean confidence {mean_confidence:.2f}, "
+                  f"{sum(seconds) / len(seconds) * 1000:.2f} ms/sheet")
+
+    print(f"Parse rate: {parsed_sheets}/{panel_sheets} panel sheets ({parsed_sheets / max(panel_sheets, 1):.0%}) "
+          f"structured without a model request at confidence >= {args.min_confidence}")
+    for expected, (sheets, matched) in totals.items():
+        print(f"Expected '{expected}': {matched}/{sheets} sheets as expected")
+
+if __name__ == "__main__":
+    main()
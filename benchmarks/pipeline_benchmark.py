@@ -0,0 +1,95 @@
+"""
+Run the full pipeline offline against synthetic drawings and the fake OpenAI server.
+
+Reports files/min, pages/sec and peak RSS, so regressions in concurrency, rate limiting
+or extraction show up without spending API credit.
+Usage: python -m benchmarks.pipeline_benchmark [--files N] [--pages N] [--latency S] [--error-rate P] ...
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import urllib.request
+
+import pymupdf
+
+from benchmarks.fake_openai_server import build_parser, serve
+from benchmarks.synthetic_pdfs import generate_job_folder
+
+def peak_rss_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def wait_for_server(base_url, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{base_url}/stats") as response:
+                return json.load(response)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+def main():
+    parser = build_parser()
+    parser.description = __doc__.strip().splitlines()[0]
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent files (default MAX_CONCURRENT_FILES)")
+    parser.add_argument("--batch", action="store_true", help="Run the pipeline in Batch API mode")
+    args = parser.parse_args()
+
+    base_url = f"http://{args.host}:{args.port}"
+    server = multiprocessing.Process(target=serve, args=(args,), daemon=True)
+    server.start()
+    try:
+        wait_for_server(base_url)
+        os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+        os.environ["OPENAI_API_KEY"] = "offline-benchmark"
+        os.environ.setdefault("BATCH_POLL_SECONDS", "0.5")
+
+        # Imported after the environment is set up so the pipeline picks it up
+        import main as pipeline
+
+        logging.basicConfig(level=logging.WARNING)
+        with tempfile.TemporaryDirectory() as tmp:
+            job_folder = os.path.join(tmp, "job")
+            paths = generate_job_folder(job_folder, files=args.files, pages=args.pages)
+            pages = sum(pymupdf.open(path).page_count for path in paths)
+
+            kwargs = {"use_cache": False, "force": True, "batch": args.batch}
+            if args.workers:
+                kwargs["num_workers"] = args.workers
+            start = time.perf_counter()
+            asyncio.run(pipeline.process_job_site_async(job_folder, os.path.join(tmp, "output"), **kwargs))
+            elapsed = time.perf_counter() - start
+
+            with open(os.path.join(tmp, "output", "run_report.json")) as f:
+                report = json.load(f)
+        stats = wait_for_server(base_url)
+    finally:
+        server.terminate()
+        server.join()
+
+    statuses = {}
+    for file_report in report["files"]:
+        statuses[file_report["status"]] = statuses.get(file_report["status"], 0) + 1
+
+    print(f"{len(paths)} files, {pages} pages in {elapsed:.2f}s")
+    print(f"files/min: {len(paths) / elapsed * 60:.1f}")
+    print(f"pages/sec: {pages / elapsed:.2f}")
+    print(f"statuses: {statuses}")
+    print(f"server: {stats['requests']} requests, {stats['rate_limited']} rate limited, {stats['errors']} errors, "
+          f"{stats['batch_requests']} batched requests")
+    print(f"peak RSS: {peak_rss_mb(resource.RUSAGE_SELF):.1f} MB (pipeline), "
+          f"{peak_rss_mb(resource.RUSAGE_CHILDREN):.1f} MB (largest child process)")
+
+if __name__ == "__main__":
+    main()
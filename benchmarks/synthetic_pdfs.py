@@ -0,0 +1,171 @@
+import os
+import random
+import pymupdf
+from typing import List
+
+PAGE_WIDTH = 1224  # 17" x 11" sheet in points
+PAGE_HEIGHT = 792
+PAGE_KINDS = ("floor_plan", "room_schedule", "panel_schedule")
+
+def page_kind(index: int) -> str:
+    """The kind of content generate_drawing_pdf puts on the page with this 0-based index."""
+    return PAGE_KINDS[index % len(PAGE_KINDS)]
+
+def _draw_table(page, x0: float, y0: float, rows: List[List[str]], col_width: float = 90, row_height: float = 14) -> None:
+    """Draw a ruled grid with cell text so that page.find_tables() detects it."""
+    shape = page.new_shape()
+    n_cols = len(rows[0])
+    x1 = x0 + n_cols * col_width
+    y1 = y0 + len(rows) * row_height
+    for r in range(len(rows) + 1):
+        shape.draw_line((x0, y0 + r * row_height), (x1, y0 + r * row_height))
+    for c in range(n_cols + 1):
+        shape.draw_line((x0 + c * col_width, y0), (x0 + c * col_width, y1))
+    shape.finish(color=(0, 0, 0), width=0.5)
+    shape.commit()
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            page.insert_text((x0 + c * col_width + 2, y0 + r * row_height + row_height - 4), str(cell), fontsize=7)
+
+def _room_rows(rng: random.Random, count: int) -> List[List[str]]:
+    names = ["OFFICE", "CORRIDOR", "STORAGE", "CONFERENCE", "RESTROOM", "LOBBY", "BREAK ROOM", "ELEC"]
+    rows = [["ROOM", "NAME", "FLOOR", "BASE", "CEILING", "HEIGHT"]]
+    for i in range(count):
+        rows.append([str(100 + i), rng.choice(names), "LVT", "RB", "ACT-1", f"{rng.choice([8, 9, 10])}'-0\""])
+    return rows
+
+def _panel_rows(rng: random.Random, count: int) -> List[List[str]]:
+    rows = [["CKT", "DESCRIPTION", "LOAD (VA)", "BKR", "POLES", "PHASE"]]
+    for i in range(count):
+        rows.append([str(i + 1), rng.choice(["LIGHTING", "RECEPT", "EF-1", "RTU-1"]),
+                     str(rng.randrange(180, 2400, 60)), rng.choice(["20A", "30A"]), "1", "ABC"[i % 3]])
+    return rows
+
+# Panel schedule layouts of the parser fixture corpus: the header row, and whether the
+# parser is expected to read the table ("parse"), hand it to the model ("model") or
+# reject it as not a panel ("none")
+PANEL_LAYOUTS = {
+    "standard": (["CKT", "DESCRIPTION", "LOAD (VA)", "BKR", "POLES", "PHASE"], "parse"),
+    "two_sided": (["CKT", "DESCRIPTION", "VA", "BKR", "PH", "BKR", "VA", "DESCRIPTION", "CKT"], "parse"),
+    "aliases": (["CIR #", "LOAD DESCRIPTION", "CONNECTED LOAD", "TRIP", "P", "PHS"], "parse"),
+    "misspelled": (["CKT NO", "DESCRIPTON", "LOAD VA", "BREAKR", "POLES", "PHASE"], "parse"),
+    "irregular": (["CKT", "DESCRIPTION", "LOAD (VA)", "BKR", "POLES", "PHASE"], "model"),
+    "room_schedule": (["ROOM", "NAME", "FLOOR", "BASE", "CEILING", "HEIGHT"], "none"),
+}
+
+def _panel_layout_rows(rng: random.Random, layout: str, circuits: int) -> List[List[str]]:
+    header, _ = PANEL_LAYOUTS[layout]
+    if layout == "room_schedule":
+        return _room_rows(rng, circuits)[1:]
+    loads = ["LIGHTING", "RECEPT", "EF-1", "RTU-1", "SPARE", "SPACE"]
+
+    def side(number):
+        description = rng.choice(loads)
+        if description == "SPACE":
+            return [str(number), description, "", "", "", "ABC"[(number - 1) // 2 % 3]]
+        load = str(rng.randrange(180, 2400, 60)) if description != "SPARE" else "0"
+        breaker = rng.choice(["20A", "30A", "20/1"])
+        if layout == "irregular" and rng.random() < 0.4:
+            # Multi-circuit labels and load notes the parser cannot read reliably
+            number, load = f"{number},{number + 2}", rng.choice(["SEE NOTE 3", "EXIST.", "(E) 1.2KVA"])
+        return [str(number), description, f"{int(load):,}" if load.isdigit() and layout == "aliases" else load,
+                breaker, "1", "ABC"[(int(str(number).split(",")[0]) - 1) // 2 % 3]]
+
+    if layout == "two_sided":
+        rows = []
+        for i in range(circuits // 2):
+            left, right = side(2 * i + 1), side(2 * i + 2)
+            rows.append(left[:4] + [left[5]] + [right[3], right[2], right[1], right[0]])
+        return rows
+    return [side(i + 1) for i in range(circuits)]
+
+def generate_panel_schedule_pdf(path: str, layout: str, circuits: int = 42, seed: int = 0) -> int:
+    """
+    Write a one-page panel schedule sheet in one of the PANEL_LAYOUTS, with a title row
+    naming the panel above the header.
+
+    Returns:
+    int: The number of circuit rows drawn (both sides of a two-sided schedule).
+    """
+    rng = random.Random(seed)
+    header, _ = PANEL_LAYOUTS[layout]
+    if layout == "room_schedule":
+        title = ["ROOM FINISH SCHEDULE"] + [""] * (len(header) - 1)
+    else:
+        title = [f"PANEL LP-{seed % 9 + 1}", "208/120V", "3PH", "225A MCB"] + [""] * (len(header) - 4)
+    body = _panel_layout_rows(rng, layout, circuits)
+    doc = pymupdf.open()
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    _draw_table(page, 40, 40, [title, header] + body)
+    _title_block(page, f"E{601 + seed}", "PANEL SCHEDULES")
+    doc.save(path)
+    doc.close()
+    return 2 * len(body) if layout == "two_sided" else len(body)
+
+def _title_block(page, sheet_number: str, title: str) -> None:
+    page.insert_text((PAGE_WIDTH - 220, PAGE_HEIGHT - 60), "OHMNI TEST PROJECT", fontsize=9)
+    page.insert_text((PAGE_WIDTH - 220, PAGE_HEIGHT - 45), title, fontsize=9)
+    page.insert_text((PAGE_WIDTH - 220, PAGE_HEIGHT - 30), f"SHEET {sheet_number}", fontsize=12)
+
+def _floor_plan(page, rng: random.Random) -> None:
+    """Scatter room outlines and labels, i.e. a page with graphics but no tables."""
+    shape = page.new_shape()
+    for _ in range(40):
+        x, y = rng.uniform(40, PAGE_WIDTH - 300), rng.uniform(40, PAGE_HEIGHT - 120)
+        shape.draw_rect(pymupdf.Rect(x, y, x + rng.uniform(40, 160), y + rng.uniform(40, 120)))
+    shape.finish(color=(0, 0, 0), width=1)
+    shape.commit()
+    for i in range(40):
+        page.insert_text((rng.uniform(40, PAGE_WIDTH - 300), rng.uniform(40, PAGE_HEIGHT - 120)), f"RM {100 + i}", fontsize=6)
+
+def generate_drawing_pdf(path: str, sheet_number: str, pages: int = 1, seed: int = 0) -> None:
+    """
+    Write a synthetic drawing PDF with a title block on every page.
+
+    Pages alternate between a floor plan, a room finish schedule and a panel schedule.
+
+    Args:
+    path (str): Output PDF path.
+    sheet_number (str): Sheet number printed in the title block, e.g. "A101".
+    pages (int): Number of pages to generate.
+    seed (int): Seed for the random content.
+    """
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for i in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        kind = page_kind(i)
+        if kind == "floor_plan":
+            _floor_plan(page, rng)
+            _title_block(page, sheet_number, "FLOOR PLAN")
+        elif kind == "room_schedule":
+            _draw_table(page, 40, 40, _room_rows(rng, 30))
+            _title_block(page, sheet_number, "ROOM FINISH SCHEDULE")
+        else:
+            _draw_table(page, 40, 40, _panel_rows(rng, 42))
+            _title_block(page, sheet_number, "PANEL SCHEDULE")
+    doc.save(path)
+    doc.close()
+
+def generate_job_folder(folder: str, files: int = 20, pages: int = 3, seed: int = 0) -> List[str]:
+    """
+    Populate a folder with synthetic drawing PDFs across several disciplines.
+
+    Args:
+    folder (str): Destination folder, created if missing.
+    files (int): Number of PDFs to write.
+    pages (int): Pages per PDF.
+    seed (int): Base seed for the random content.
+
+    Returns:
+    List[str]: Paths of the generated PDFs.
+    """
+    os.makedirs(folder, exist_ok=True)
+    prefixes = ["A", "E", "M", "P"]
+    paths = []
+    for i in range(files):
+        sheet_number = f"{prefixes[i % len(prefixes)]}{101 + i}"
+        path = os.path.join(folder, f"{sheet_number}.pdf")
+        generate_drawing_pdf(path, sheet_number, pages=pages, seed=seed + i)
+        paths.append(path)
+    return paths
@@ -3,4 +3,81 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
\ No newline at end of file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Number of worker processes used for PDF text/table extraction
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1))
+
+# On-disk LLM result cache limits
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+CACHE_MAX_AGE_DAYS = float(os.getenv("CACHE_MAX_AGE_DAYS", 30))
+
+# Number of files processed concurrently by the work queue
+MAX_CONCURRENT_FILES = int(os.getenv("MAX_CONCURRENT_FILES", 10))
+
+# OpenAI account limits shared by every chat completion call
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 500))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 200000))
+
+# Page chunking for large drawings: "off", "page" (one request per page) or
+# "tokens" (pack pages into requests of at most CHUNK_TOKEN_BUDGET input tokens)
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "tokens")
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", 20000))
+
+# Stream completions through an incremental JSON parser, reporting rooms and schedule rows
+# as they arrive
+STREAM_COMPLETIONS = os.getenv("STREAM_COMPLETIONS", "false").lower() in ("1", "true", "yes")
+# Continuation requests made when a response is cut off at max_tokens (0 = none)
+MAX_CONTINUATIONS = int(os.getenv("MAX_CONTINUATIONS", 2))
+
+# Duplicate detection across the job: "off", "exact" (identical words reuse the first copy's
+# result) or "near" (also send chunks at least DEDUP_THRESHOLD similar as a diff-only request)
+DEDUP_MODE = os.getenv("DEDUP_MODE", "near")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.9))
+
+# Sheet tiering: classify each sheet locally and skip blank ones, structure cover sheets and
+# short sheets with SMALL_MODEL and a SMALL_MODEL_MAX_TOKENS output budget, the rest with the
+# full model. SMALL_MODEL_PRICE_FACTOR is its token price relative to the full model.
+MODEL_TIERING = os.getenv("MODEL_TIERING", "true").lower() in ("1", "true", "yes")
+SMALL_MODEL = os.getenv("SMALL_MODEL", "gpt-4o-mini")
+SMALL_MODEL_MAX_TOKENS = int(os.getenv("SMALL_MODEL_MAX_TOKENS", 2000))
+SMALL_MODEL_PRICE_FACTOR = float(os.getenv("SMALL_MODEL_PRICE_FACTOR", 1.0))
+
+# Read panel schedule tables with the rule-based parser instead of the model when its
+# confidence (0-1) reaches PANEL_PARSER_MIN_CONFIDENCE; lower-confidence sheets go to the model
+PANEL_PARSER = os.getenv("PANEL_PARSER", "true").lower() in ("1", "true", "yes")
+PANEL_PARSER_MIN_CONFIDENCE = float(os.getenv("PANEL_PARSER_MIN_CONFIDENCE", 0.9))
+
+# When to run table detection on a page: "always", "heuristic" (skip pages whose
+# vector drawings cannot form a ruled grid) or "never"
+TABLE_DETECTION = os.getenv("TABLE_DETECTION", "heuristic")
+
+# Read each PDF into memory with one sequential read before parsing (helps on network shares)
+PDF_READ_INTO_MEMORY = os.getenv("PDF_READ_INTO_MEMORY", "false").lower() in ("1", "true", "yes")
+
+# Model pricing in dollars per million tokens, used for cost in the run report
+PROMPT_COST_PER_MILLION = float(os.getenv("PROMPT_COST_PER_MILLION", 0.15))
+COMPLETION_COST_PER_MILLION = float(os.getenv("COMPLETION_COST_PER_MILLION", 0.60))
+
+# Batch API mode (--batch): seconds between status polls, the completion window requested,
+# and the price of batch tokens relative to live requests (used for run report costs)
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", 60))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+BATCH_PRICE_FACTOR = float(os.getenv("BATCH_PRICE_FACTOR", 0.5))
+
+# Distributed mode (--distributed): lease on a claimed file, renewed while it is processed;
+# seconds between checks for files left by other workers; claims per file before giving up
+WORK_LEASE_SECONDS = float(os.getenv("WORK_LEASE_SECONDS", 300))
+WORK_POLL_SECONDS = float(os.getenv("WORK_POLL_SECONDS", 5))
+WORK_MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", 3))
+
+# Rewrite the per-floor room files after this many architectural sheets (0 = only at the end)
+ROOM_INDEX_FLUSH_EVERY = int(os.getenv("ROOM_INDEX_FLUSH_EVERY", 0))
+
+# Compress page prompts before sending them: drop text duplicated by tables, collapse
+# whitespace and markdown padding, and drop title block/notes lines repeated on later pages
+# of a PDF sent as one request
+PROMPT_COMPRESSION = os.getenv("PROMPT_COMPRESSION", "true").lower() in ("1", "true", "yes")
+
+# Number of directories listed concurrently when discovering PDFs in a job folder
+DISCOVERY_WORKERS = int(os.getenv("DISCOVERY_WORKERS", 16))
@@ -1,26 +1,47 @@
 import os
 import json
 import sys
+import argparse
 import asyncio
 import aiohttp
-import random
-import time
 import logging
+import time
+import shutil
 from datetime import datetime
 from openai import AsyncOpenAI
+from openai.types import CompletionUsage
 from tqdm.asyncio import tqdm
-from templates.room_templates import process_architectural_drawing
-from utils.pdf_processor import extract_text_and_tables_from_pdf
-from utils.drawing_processor import process_drawing
+from templates.room_templates import process_architectural_drawing, RoomIndex
+from utils.pdf_processor import extract_pages_from_pdf, create_extraction_pool
+from utils.drawing_processor import (
+    build_request, chunk_pages, drawing_cache_key, merge_chunk_responses, process_drawing_chunked,
+)
+from utils.batch_processor import (
+    download_batch_results, load_batch_state, save_batch_state, submit_batch, wait_for_batch, write_batch_input,
+)
+from utils.cache import ResultCache, is_cacheable_response
+from utils.rate_limiter import RateLimiter
+from utils.api_utils import CircuitBreaker
+from utils.manifest import JobManifest, hash_file
+from utils.metrics import RunMetrics, FileMetrics, current_file_metrics
+from utils.output_writer import JsonlWriter, StructuredOutputReader, repair_jsonl
+from utils.file_utils import FileIndex, discover_pdf_files
+from utils.dedup import DuplicateRegistry
+from utils.sheet_classifier import classify_sheet, get_drawing_type, skipped_prompt_tokens, skipped_sheet_output
+from utils.panel_parser import panel_sheet_output, parse_panel_pages, split_prompt_page
+from utils.work_table import (
+    WorkTable, default_worker_id, list_worker_shards, read_worker_roots, rebase_path, work_folder,
+    worker_shard_folder, write_worker_roots,
+)
+from config.settings import (
+    BATCH_PRICE_FACTOR, CACHE_MAX_BYTES, CACHE_MAX_AGE_DAYS, DEDUP_MODE, MAX_CONCURRENT_FILES,
+    OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE, PANEL_PARSER, PANEL_PARSER_MIN_CONFIDENCE,
+    ROOM_INDEX_FLUSH_EVERY, SMALL_MODEL_PRICE_FACTOR, WORK_POLL_SECONDS,
+)
 
 # Suppress pdfminer debug output
 logging.getLogger('pdfminer').setLevel(logging.ERROR)
 
-MAX_RETRIES = 3
-RETRY_DELAY = 5  # seconds
-API_RATE_LIMIT = 60  # Adjust if needed
-TIME_WINDOW = 60  # Time window to respect the rate limit
-
 def setup_logging(output_folder):
     log_folder = os.path.join(output_folder, 'logs')
     os.makedirs(log_folder, exist_ok=True)
@@ -30,169 +51,690 @@ def setup_logging(output_folder):
                         format='%(asctime)s - %(levelname)s - %(message)s')
     print(f"Logging to: {log_file}")
 
-drawing_types = {
-    'Architectural': ['A', 'AD'],
-    'Electrical': ['E', 'ED'],
-    'Mechanical': ['M', 'MD'],
-    'Plumbing': ['P', 'PD'],
-    'Site': ['S', 'SD'],
-    'Civil': ['C', 'CD'],
-    'Low Voltage': ['LV', 'LD'],
-    'Fire Alarm': ['FA', 'FD'],
-    'Kitchen': ['K', 'KD']
-}
-
-def get_drawing_type(filename):
-    prefix = os.path.basename(filename).split('.')[0][:2].upper()
-    for dtype, prefixes in drawing_types.items():
-        if any(prefix.startswith(p.upper()) for p in prefixes):
-            return dtype
-    return 'General'
-
-async def async_safe_api_call(client, *args, **kwargs):
-    retries = 0
-    delay = 1  # Initial delay for backoff
-
-    while retries < MAX_RETRIES:
-        try:
-            return await client.chat.completions.create(*args, **kwargs)
-        except Exception as e:
-            if "rate limit" in str(e).lower():
-                logging.warning(f"Rate limit hit, retrying in {delay} seconds...")
-                retries += 1
-                delay = min(delay * 2, 60)  # Exponential backoff, with a max delay cap
-                await asyncio.sleep(delay + random.uniform(0, 1))  # Adding jitter
+async def save_structured_output(pdf_path, structured_json, output_folder, drawing_type, templates_created,
+                                 file_metrics, room_index=None, output_writer=None):
+    """Parse and save a sheet's structured JSON and run the room-template post-processing."""
+    file_name = os.path.basename(pdf_path)
+    type_folder = os.path.join(output_folder, drawing_type)
+    
+    try:
+        with file_metrics.stage('json_parse'):
+            parsed_json = json.loads(structured_json)
+        with file_metrics.stage('json_dump'):
+            if output_writer is not None:
+                output_path = await output_writer.write(pdf_path, drawing_type, parsed_json)
             else:
-                logging.error(f"API call failed: {e}")
-                await asyncio.sleep(RETRY_DELAY)
-                retries += 1
-
-    logging.error("Max retries reached for API call")
-    raise Exception("Failed to make API call after maximum retries")
+                output_filename = os.path.splitext(file_name)[0] + '_structured.json'
+                output_path = os.path.join(type_folder, output_filename)
+                os.makedirs(type_folder, exist_ok=True)
+                with open(output_path, 'w') as f:
+                    json.dump(parsed_json, f, indent=2)
+        
+        logging.info(f"Successfully processed and saved: {output_path}")
+        
+        if drawing_type == 'Architectural':
+            with file_metrics.stage('room_templates'):
+                result = process_architectural_drawing(parsed_json, pdf_path, type_folder, room_index)
+            templates_created['floor_plan'] = True
+            logging.info(f"Created room templates: {result}")
+        
+        return {"success": True, "file": output_path}
+    
+    except json.JSONDecodeError as e:
+        logging.error(f"JSON parsing error for {pdf_path}: {str(e)}")
+        logging.info(f"Raw API response: {structured_json}")
+        
+        raw_output_filename = os.path.splitext(file_name)[0] + '_raw_response.json'
+        raw_output_path = os.path.join(type_folder, raw_output_filename)
+        os.makedirs(type_folder, exist_ok=True)
+        with open(raw_output_path, 'w') as f:
+            f.write(structured_json)
+        logging.warning(f"Saved raw API response to {raw_output_path}")
+        
+        return {"success": False, "error": "Failed to parse JSON", "file": pdf_path}
 
-async def process_pdf_async(pdf_path, client, output_folder, drawing_type, templates_created):
+async def process_pdf_async(pdf_path, client, output_folder, drawing_type, templates_created, extraction_pool=None, cache=None,
+                            rate_limiter=None, circuit_breaker=None, file_metrics=None, room_index=None,
+                            output_writer=None, duplicates=None):
     file_name = os.path.basename(pdf_path)
+    file_metrics = file_metrics or FileMetrics(pdf_path, drawing_type)
+    # Lets the API layer and the cache attribute tokens, retries and hits to this file
+    current_file_metrics.set(file_metrics)
+    started = time.perf_counter()
+
+    def on_item(path, item):
+        # Streamed rooms and schedule rows, reported as soon as each one is complete
+        file_metrics.streamed_items += 1
+        if file_metrics.first_item_seconds is None:
+            file_metrics.first_item_seconds = time.perf_counter() - started
+            logging.info(f"{file_name}: first {'.'.join(path) or 'item'} entry after "
+                         f"{file_metrics.first_item_seconds:.1f}s")
     with tqdm(total=100, desc=f"Processing {file_name}", leave=False) as pbar:
         try:
             pbar.update(10)  # Start processing
-            raw_content = await extract_text_and_tables_from_pdf(pdf_path)
+            with file_metrics.stage('extract'):
+                pages = await extract_pages_from_pdf(pdf_path, extraction_pool)
             
             pbar.update(20)  # Text and tables extracted
-            structured_json = await process_drawing(raw_content, drawing_type, client)
+            with file_metrics.stage('classify'):
+                classification = apply_classification(classify_sheet(pages, pdf_path), pages, file_metrics)
+            drawing_type = classification.drawing_type
+
+            with file_metrics.stage('process_drawing'):
+                structured_json = structure_locally(classification, pages, file_metrics)
+                if structured_json is None:
+                    structured_json = await process_drawing_chunked(pages, drawing_type, client, cache, rate_limiter,
+                                                                  circuit_breaker, on_item=on_item,
+                                                                  duplicates=duplicates, source=pdf_path,
+                                                                  tier=classification.tier)
             
             pbar.update(40)  # API call completed
-            
-            type_folder = os.path.join(output_folder, drawing_type)
-            os.makedirs(type_folder, exist_ok=True)
-            
-            try:
-                parsed_json = json.loads(structured_json)
-                output_filename = os.path.splitext(file_name)[0] + '_structured.json'
-                output_path = os.path.join(type_folder, output_filename)
-                
-                with open(output_path, 'w') as f:
-                    json.dump(parsed_json, f, indent=2)
-                
-                pbar.update(20)  # JSON saved
-                logging.info(f"Successfully processed and saved: {output_path}")
-                
-                if drawing_type == 'Architectural':
-                    result = process_architectural_drawing(parsed_json, pdf_path, type_folder)
-                    templates_created['floor_plan'] = True
-                    logging.info(f"Created room templates: {result}")
-                
-                pbar.update(10)  # Processing completed
-                return {"success": True, "file": output_path}
-            
-            except json.JSONDecodeError as e:
-                pbar.update(100)  # Ensure bar completes on error
-                logging.error(f"JSON parsing error for {pdf_path}: {str(e)}")
-                logging.info(f"Raw API response: {structured_json}")
-                
-                raw_output_filename = os.path.splitext(file_name)[0] + '_raw_response.json'
-                raw_output_path = os.path.join(type_folder, raw_output_filename)
-                with open(raw_output_path, 'w') as f:
-                    f.write(structured_json)
-                logging.warning(f"Saved raw API response to {raw_output_path}")
-                
-                return {"success": False, "error": "Failed to parse JSON", "file": pdf_path}
+            result = await save_structured_output(pdf_path, structured_json, output_folder, drawing_type,
+                                                  templates_created, file_metrics, room_index, output_writer)
+            pbar.update(100 - pbar.n)  # Processing completed
+            return dict(result, drawing_type=drawing_type)
         
         except Exception as e:
             pbar.update(100)  # Ensure bar completes on error
             logging.error(f"Error processing {pdf_path}: {str(e)}")
-            return {"success": False, "error": str(e), "file": pdf_path}
-
-async def process_batch_async(batch, client, output_folder, templates_created):
-    tasks = []
-    start_time = time.time()
-    for index, pdf_file in enumerate(batch):
-        if index > 0 and index % API_RATE_LIMIT == 0:
-            elapsed = time.time() - start_time
-            if elapsed < TIME_WINDOW:
-                await asyncio.sleep(TIME_WINDOW - elapsed)
-            start_time = time.time()
-        
+            return {"success": False, "error": str(e), "file": pdf_path, "drawing_type": drawing_type}
+
+def apply_classification(classification, pages, file_metrics):
+    """Record a sheet's classification in its metrics, logging where it changes the drawing type."""
+    if classification.drawing_type != file_metrics.drawing_type:
+        logging.info(f"{os.path.basename(file_metrics.file)}: classified as {classification.drawing_type} "
+                     f"(named as {file_metrics.drawing_type})")
+    file_metrics.drawing_type = classification.drawing_type
+    file_metrics.tier = classification.tier
+    if classification.tier == 'small':
+        file_metrics.model_price_factor = SMALL_MODEL_PRICE_FACTOR
+    logging.info(f"{os.path.basename(file_metrics.file)}: tier {classification.tier} ({classification.reason})")
+    return classification
+
+def structure_locally(classification, pages, file_metrics):
+    """
+    The structured JSON of a sheet that needs no model request, else None: 'skip' sheets,
+    and electrical sheets of panel schedules the rule-based parser reads confidently
+    (recorded as tier 'parser').
+    """
+    file_name = os.path.basename(file_metrics.file)
+    if classification.tier == 'skip':
+        structured_json = skipped_sheet_output(classification, pages)
+    elif PANEL_PARSER and classification.drawing_type == 'Electrical':
+        parsed = parse_panel_pages([split_prompt_page(page) for page in pages])
+        if parsed is None:
+            return None
+        if parsed.confidence < PANEL_PARSER_MIN_CONFIDENCE:
+            logging.info(f"{file_name}: panel parser confidence {parsed.confidence:.2f}, using the model")
+            return None
+        logging.info(f"{file_name}: {len(parsed.panels)} panel schedules parsed without the model "
+                     f"(confidence {parsed.confidence:.2f})")
+        structured_json = json.dumps(panel_sheet_output(parsed, classification.sheet_number))
+        file_metrics.tier = 'parser'
+    else:
+        return None
+    file_metrics.skipped_prompt_tokens = skipped_prompt_tokens(pages)
+    return structured_json
+
+async def enqueue_pdf_files(job_folder, queue, num_workers, discovery_options=None):
+    """Discover PDFs in the job folder and feed (PDF path, enqueue time) items to the workers as they are found."""
+    found = 0
+    try:
+        async for pdf_file in discover_pdf_files(job_folder, **(discovery_options or {})):
+            await queue.put((pdf_file, time.perf_counter()))
+            found += 1
+    finally:
+        for _ in range(num_workers):
+            await queue.put(None)  # One stop sentinel per worker
+    return found
+
+async def enqueue_shared_files(job_folder, queue, num_workers, work_table, discovery_options=None):
+    """
+    Feed the workers candidate files from the shared work table: first the discovered
+    files, then any left pending or abandoned by a crashed process, until every file is
+    finished or leased to a live process. Workers claim each file only when they pick it
+    up, so a process never holds more files than it is working on.
+    """
+    found = 0
+    try:
+        async for pdf_file in discover_pdf_files(job_folder, **(discovery_options or {})):
+            found += 1
+            work_table.add(pdf_file)
+            await queue.put((pdf_file, time.perf_counter()))
+        while True:
+            # Let the workers finish the candidates already queued so none is offered twice
+            await queue.join()
+            pdf_files = work_table.claimable(num_workers * 2)
+            if pdf_files:
+                for pdf_file in pdf_files:
+                    await queue.put((pdf_file, time.perf_counter()))
+            elif work_table.claimed_elsewhere():
+                # Files other processes hold may come back if one of them crashes
+                await asyncio.sleep(WORK_POLL_SECONDS)
+            else:
+                break
+    finally:
+        for _ in range(num_workers):
+            await queue.put(None)
+    return found
+
+async def renew_leases(work_table):
+    """Keep this process's claims alive while it works on them."""
+    while True:
+        await asyncio.sleep(work_table.lease_seconds / 3)
+        work_table.renew()
+
+def skip_unchanged(pdf_file, drawing_type, manifest, results, file_metrics, room_index=None, output_reader=None):
+    """Skip a file the manifest records as an unchanged success; returns False if it must be processed."""
+    if manifest is None:
+        return False
+    try:
+        if not manifest.is_up_to_date(pdf_file):
+            return False
+    except OSError as e:
+        # Moved or deleted since discovery; processing it records the failure
+        logging.warning(f"Cannot check {pdf_file} against the manifest: {e}")
+        return False
+    entry = manifest.get(pdf_file)
+    # The recorded type is the one the sheet was classified as when it was processed
+    drawing_type = entry.get('drawing_type') or drawing_type
+    if drawing_type == 'Architectural' and room_index is not None:
+        # Unchanged sheets still contribute their rooms to the floor outputs
+        parsed_json = (output_reader or StructuredOutputReader()).load(entry['output_path'], pdf_file)
+        if parsed_json is None:
+            logging.warning(f"No readable output recorded for unchanged {pdf_file}, reprocessing it")
+            return False
+        room_index.add_sheet(parsed_json, pdf_file)
+    file_metrics.drawing_type = drawing_type
+    results.append({"success": True, "skipped": True, "file": entry['output_path']})
+    file_metrics.status = 'skipped'
+    logging.info(f"Skipping unchanged {pdf_file}")
+    return True
+
+async def record_result(manifest, pdf_file, drawing_type, result, started, output_writer=None):
+    if result['success'] and output_writer is not None:
+        # A success is only recorded once its JSONL line is on disk
+        try:
+            await output_writer.wait_written(pdf_file)
+        except Exception as e:
+            result.update(success=False, error=f"Failed to write output: {e}", file=pdf_file)
+    if manifest is None:
+        return
+    try:
+        content_hash = await asyncio.to_thread(hash_file, pdf_file)
+        manifest.record(pdf_file, drawing_type,
+                        'success' if result['success'] else 'failed',
+                        output_path=result['file'] if result['success'] else None,
+                        started=started,
+                        error=result.get('error'),
+                        content_hash=content_hash)
+    except OSError as e:
+        # The source was moved or deleted mid-run; without a manifest entry it is simply redone next time
+        logging.warning(f"Could not record {pdf_file} in the manifest: {e}")
+
+async def process_queue_worker(queue, results, overall_pbar, client, output_folder, templates_created,
+                               extraction_pool=None, cache=None, rate_limiter=None,
+                               circuit_breaker=None, manifest=None, run_metrics=None, room_index=None,
+                               output_writer=None, duplicates=None, work_table=None, output_reader=None):
+    run_metrics = run_metrics or RunMetrics()
+    while True:
+        item = await queue.get()
+        try:
+            if item is None:
+                return
+            pdf_file, enqueued = item
+            if work_table is not None and not work_table.claim(pdf_file):
+                continue  # Done, or being processed, by another process
+            overall_pbar.total += 1
+            overall_pbar.refresh()
+
+            drawing_type = get_drawing_type(pdf_file)
+            file_metrics = run_metrics.start_file(pdf_file, drawing_type)
+            file_metrics.add_stage('queue_wait', time.perf_counter() - enqueued)
+
+            try:
+                if skip_unchanged(pdf_file, drawing_type, manifest, results, file_metrics, room_index,
+                                  output_reader):
+                    overall_pbar.update(1)
+                    if work_table is not None:
+                        work_table.complete(pdf_file, 'skipped')
+                    continue
+
+                started = time.time()
+                result = await process_pdf_async(pdf_file, client, output_folder, drawing_type, templates_created,
+                                                 extraction_pool, cache, rate_limiter, circuit_breaker, file_metrics,
+                                                 room_index, output_writer, duplicates)
+                await record_result(manifest, pdf_file, result['drawing_type'], result, started, output_writer)
+            except Exception as e:
+                # One bad file (e.g. moved or deleted mid-run) fails on its own instead of stopping the worker
+                logging.error(f"Unexpected error processing {pdf_file}: {str(e)}")
+                result = {"success": False, "error": str(e), "file": pdf_file}
+            file_metrics.status = 'success' if result['success'] else 'failed'
+            results.append(result)
+            overall_pbar.update(1)
+
+            if work_table is not None:
+                work_table.complete(pdf_file, 'done' if result['success'] else 'failed')
+            if result['success']:
+                logging.info(f"Completed {result['file']} ({len(results)} done)")
+            else:
+                logging.error(f"Failed to process {result['file']}: {result['error']}")
+        finally:
+            queue.task_done()
+
+async def discover_changed_files(job_folder, manifest, run_metrics, room_index, results, discovery_options,
+                                 output_reader=None, exclude=()):
+    """
+    Discover the job's PDFs and skip the unchanged ones (see skip_unchanged); returns the
+    (path, drawing type, file metrics) of the others. Files in exclude are left out.
+    """
+    pdf_files = []
+    async for pdf_file in discover_pdf_files(job_folder, **discovery_options):
+        if pdf_file in exclude:
+            continue
         drawing_type = get_drawing_type(pdf_file)
-        tasks.append(process_pdf_async(pdf_file, client, output_folder, drawing_type, templates_created))
-    
-    return await asyncio.gather(*tasks)
+        file_metrics = run_metrics.start_file(pdf_file, drawing_type)
+        if not skip_unchanged(pdf_file, drawing_type, manifest, results, file_metrics, room_index, output_reader):
+            pdf_files.append((pdf_file, drawing_type, file_metrics))
+    return pdf_files
+
+async def prepare_batch(job_folder, output_folder, cache, manifest, run_metrics, room_index, results,
+                        extraction_pool, discovery_options, output_reader=None):
+    """
+    Extract every changed sheet and collect the chunk requests that are not cached.
+
+    Returns the batch state: per file its drawing type, start time and chunks, each chunk
+    holding either its cached response or the custom_id and cache key of its request.
+    """
+    pdf_files = await discover_changed_files(job_folder, manifest, run_metrics, room_index, results,
+                                             discovery_options, output_reader)
+    logging.info(f"Found {len(pdf_files) + len(results)} PDF files in {job_folder}, "
+                 f"{len(pdf_files)} to structure in a batch")
+
+    async def extract(pdf_file, file_metrics):
+        current_file_metrics.set(file_metrics)
+        with file_metrics.stage('extract'):
+            return await extract_pages_from_pdf(pdf_file, extraction_pool)
+
+    pages = await asyncio.gather(*(extract(pdf_file, file_metrics) for pdf_file, _, file_metrics in pdf_files),
+                                 return_exceptions=True)
+
+    state = {"files": {}, "requests": []}
+    for n, ((pdf_file, drawing_type, file_metrics), file_pages) in enumerate(zip(pdf_files, pages)):
+        entry = {"drawing_type": drawing_type, "started": time.time(), "chunks": []}
+        if isinstance(file_pages, Exception):
+            entry["error"] = str(file_pages)
+            state["files"][pdf_file] = entry
+            continue
+
+        classification = apply_classification(classify_sheet(file_pages, pdf_file), file_pages, file_metrics)
+        entry["drawing_type"] = drawing_type = classification.drawing_type
+        local_output = structure_locally(classification, file_pages, file_metrics)
+        entry["tier"] = file_metrics.tier
+        if local_output is not None:
+            entry["local_output"] = local_output
+            entry["skipped_prompt_tokens"] = file_metrics.skipped_prompt_tokens
+        else:
+            for i, chunk in enumerate(chunk_pages(file_pages)):
+                raw_content = "".join(chunk)
+                cache_key = drawing_cache_key(raw_content, drawing_type, classification.tier)
+                cached = cache.get(cache_key) if cache is not None else None
+                if cached is not None:
+                    entry["chunks"].append({"content": cached})
+                    continue
+                custom_id = f"{n}-{i}"
+                entry["chunks"].append({"custom_id": custom_id, "cache_key": cache_key})
+                state["requests"].append((custom_id, build_request(raw_content, drawing_type, classification.tier)))
+        state["files"][pdf_file] = entry
+    return state
+
+async def apply_batch_results(state, responses, output_folder, cache, manifest, run_metrics, room_index,
+                              output_writer, templates_created, results):
+    """Merge each file's chunk responses and save them as process_pdf_async does."""
+    file_metrics_by_path = {file_metrics.file: file_metrics for file_metrics in run_metrics.files}
+    for pdf_file, entry in sorted(state["files"].items()):
+        drawing_type = entry["drawing_type"]
+        file_metrics = file_metrics_by_path.get(pdf_file) or run_metrics.start_file(pdf_file, drawing_type)
+        file_metrics.price_factor = BATCH_PRICE_FACTOR
+        # Restored from the state, which is all a resumed run has
+        file_metrics.drawing_type = drawing_type
+        file_metrics.tier = entry.get("tier")
+        file_metrics.skipped_prompt_tokens = entry.get("skipped_prompt_tokens", 0)
+        if file_metrics.tier == 'small':
+            file_metrics.model_price_factor = SMALL_MODEL_PRICE_FACTOR
+
+        contents = [entry["local_output"]] if "local_output" in entry else []
+        errors = [entry["error"]] if entry.get("error") else []
+        for chunk in entry["chunks"]:
+            if "content" in chunk:
+                contents.append(chunk["content"])
+                file_metrics.cache_hits += 1
+                continue
+            response = responses.get(chunk["custom_id"])
+            if response is None or response["error"] is not None:
+                errors.append(response["error"] if response is not None else f"no batch result for {chunk['custom_id']}")
+                continue
+            contents.append(response["content"])
+            file_metrics.cache_misses += 1
+            file_metrics.record_usage(CompletionUsage.model_validate(response["usage"]) if response["usage"] else None)
+            if cache is not None and is_cacheable_response(response["content"], response.get("finish_reason")):
+                cache.put(chunk["cache_key"], response["content"])
+
+        if errors:
+            result = {"success": False, "error": "; ".join(errors), "file": pdf_file}
+        else:
+            result = await save_structured_output(pdf_file, merge_chunk_responses(contents), output_folder,
+                                                  drawing_type, templates_created, file_metrics, room_index,
+                                                  output_writer)
+        await record_result(manifest, pdf_file, drawing_type, result, entry["started"], output_writer)
+        file_metrics.status = 'success' if result['success'] else 'failed'
+        results.append(result)
+        if not result['success']:
+            logging.error(f"Failed to process {result['file']}: {result['error']}")
+
+async def process_job_site_batch(job_folder, output_folder, client, cache, manifest, run_metrics, room_index,
+                                 output_writer, templates_created, results, extraction_pool, discovery_options,
+                                 output_reader=None):
+    """
+    Structure a job through the Batch API: extract everything, submit one batch, poll it
+    and save the results. The submitted batch is recorded in .batch/batch_state.json, so
+    a rerun with --batch after an interruption resumes polling instead of resubmitting.
+    """
+    batch_folder = os.path.join(output_folder, '.batch')
+    state_path = os.path.join(batch_folder, 'batch_state.json')
+    state = load_batch_state(state_path)
+    if state is not None:
+        logging.info(f"Resuming batch {state['batch_id']} for {len(state['files'])} files")
+        # Unchanged sheets still count in the results and contribute their rooms to the floor files
+        changed = await discover_changed_files(job_folder, manifest, run_metrics, room_index, results,
+                                               discovery_options, output_reader, exclude=state['files'])
+        for _, _, file_metrics in changed:
+            file_metrics.status = 'deferred'
+        if changed:
+            logging.warning(f"{len(changed)} files changed since batch {state['batch_id']} was submitted; "
+                            f"they will be structured on the next run")
+    else:
+        state = await prepare_batch(job_folder, output_folder, cache, manifest, run_metrics, room_index, results,
+                                    extraction_pool, discovery_options, output_reader)
+        requests = state.pop("requests")
+        state["batch_id"] = None
+        if requests:
+            input_path = os.path.join(batch_folder, f"batch_input_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+            write_batch_input(input_path, requests)
+            batch = await submit_batch(client, input_path, metadata={"job_folder": os.path.basename(job_folder)})
+            state["batch_id"] = batch.id
+            save_batch_state(state_path, state)
 
-async def process_job_site_async(job_folder, output_folder):
+    responses = {}
+    if state["batch_id"] is not None:
+        batch = await wait_for_batch(client, state["batch_id"])
+        if batch.status != 'completed':
+            logging.warning(f"Batch {batch.id} ended with status {batch.status}")
+        responses = await download_batch_results(client, batch)
+
+    await apply_batch_results(state, responses, output_folder, cache, manifest, run_metrics, room_index,
+                              output_writer, templates_created, results)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+async def process_job_site_async(job_folder, output_folder, use_cache=True, refresh_cache=False,
+                                 num_workers=MAX_CONCURRENT_FILES, force=False, prometheus=False,
+                                 output_format="json", compression="none", include=None, exclude=None,
+                                 sheet_prefixes=None, batch=False, distributed=False, worker_id=None):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
-    
-    pdf_files = [os.path.join(root, file)
-                 for root, _, files in os.walk(job_folder)
-                 for file in files if file.lower().endswith('.pdf')]
-    
-    logging.info(f"Found {len(pdf_files)} PDF files in {job_folder}")
-    
-    if not pdf_files:
-        logging.warning("No PDF files found. Please check the input folder.")
-        return
+
+    # With --distributed, several processes share the job through a work table in the output
+    # folder; each keeps its manifest, report and JSONL output in its own shard until --merge
+    work_table = None
+    shard_folder = output_folder
+    if distributed:
+        work_table = WorkTable(output_folder, worker_id or default_worker_id(), job_folder=job_folder)
+        shard_folder = worker_shard_folder(output_folder, work_table.worker_id)
+        os.makedirs(shard_folder, exist_ok=True)
+        write_worker_roots(shard_folder, job_folder, output_folder)
+        logging.info(f"Distributed worker {work_table.worker_id}, shard {shard_folder}")
     
     templates_created = {"floor_plan": False}
-    
-    batch_size = 10
-    total_batches = (len(pdf_files) + batch_size - 1) // batch_size
 
-    client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    # Retries are handled by async_safe_api_call, so disable the client's own
+    client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0)
+    rate_limiter = RateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE)
+    circuit_breaker = CircuitBreaker()
+
+    cache = None
+    if use_cache:
+        cache = ResultCache(os.path.join(output_folder, '.cache', 'llm_cache.sqlite'),
+                            max_bytes=CACHE_MAX_BYTES,
+                            max_age_seconds=CACHE_MAX_AGE_DAYS * 24 * 3600,
+                            refresh=refresh_cache)
+
+    # Without --force, files that succeeded before and have not changed are skipped
+    manifest = JobManifest(shard_folder)
+    if force:
+        manifest.entries = {}
+    elif distributed:
+        manifest.entries = {**JobManifest(output_folder).entries, **manifest.entries}
+
+    run_metrics = RunMetrics()
+    # A worker only sees its own sheets, so the floor room files are left to --merge
+    room_index = RoomIndex(os.path.join(output_folder, 'Architectural'),
+                           flush_every=0 if distributed else ROOM_INDEX_FLUSH_EVERY)
 
+    output_writer = JsonlWriter(shard_folder, compression) if output_format == "jsonl" else None
+    # Recorded outputs of unchanged sheets, each JSONL file read once
+    output_reader = StructuredOutputReader()
+
+    # Repeated sheets (issue-set copies, combined and single PDFs, revisions) are structured once
+    duplicates = DuplicateRegistry(near_duplicates=DEDUP_MODE == "near") if DEDUP_MODE != "off" else None
+
+    # Bounded so the folder walk stays only a little ahead of the workers
+    queue = asyncio.Queue(maxsize=num_workers * 2)
     all_results = []
-    with tqdm(total=len(pdf_files), desc="Overall Progress") as overall_pbar:
-        for i in range(0, len(pdf_files), batch_size):
-            batch = pdf_files[i:i+batch_size]
-            logging.info(f"Processing batch {i//batch_size + 1} of {total_batches}")
-            
-            batch_results = await process_batch_async(batch, client, output_folder, templates_created)
-            all_results.extend(batch_results)
-            
-            successes = [r for r in batch_results if r['success']]
-            failures = [r for r in batch_results if not r['success']]
-            
-            overall_pbar.update(len(batch))
-            logging.info(f"Batch completed. Successes: {len(successes)}, Failures: {len(failures)}")
-            
-            for failure in failures:
-                logging.error(f"Failed to process {failure['file']}: {failure['error']}")
+    heartbeat = None
+    with create_extraction_pool() as extraction_pool, \
+            tqdm(total=0, desc="Overall Progress") as overall_pbar:
+        if output_writer is not None:
+            output_writer.start()
+        try:
+            discovery_options = {
+                "include": include,
+                "exclude": exclude,
+                "sheet_prefixes": sheet_prefixes,
+                "file_index": FileIndex(os.path.join(output_folder, '.cache', 'file_index.json')),
+                "skip_dirs": [output_folder],
+            }
+            if batch:
+                await process_job_site_batch(job_folder, output_folder, client, cache, manifest, run_metrics,
+                                             room_index, output_writer, templates_created, all_results,
+                                             extraction_pool, discovery_options, output_reader)
+            else:
+                workers = [asyncio.create_task(process_queue_worker(queue, all_results, overall_pbar, client,
+                                                                    output_folder, templates_created,
+                                                                    extraction_pool, cache, rate_limiter,
+                                                                    circuit_breaker, manifest, run_metrics,
+                                                                    room_index, output_writer, duplicates,
+                                                                    work_table, output_reader))
+                           for _ in range(num_workers)]
+                if work_table is not None:
+                    heartbeat = asyncio.create_task(renew_leases(work_table))
+                    found = await enqueue_shared_files(job_folder, queue, num_workers, work_table,
+                                                       discovery_options)
+                else:
+                    found = await enqueue_pdf_files(job_folder, queue, num_workers, discovery_options)
+                logging.info(f"Found {found} PDF files in {job_folder}")
+                await asyncio.gather(*workers)
+                if work_table is not None:
+                    logging.info(f"This worker processed {len(all_results)} of them")
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            if work_table is not None:
+                # Claims still held after an interruption go back to the other workers
+                work_table.release()
+                logging.info(f"Work table: {work_table.counts()}")
+                work_table.close()
+            if output_writer is not None:
+                await output_writer.close()
+
+    if cache is not None:
+        cache.close()
+    logging.info(f"Rate limiter delayed requests for {rate_limiter.waited_seconds:.1f}s in total")
+    if circuit_breaker.trips:
+        logging.warning(f"Circuit breaker opened {circuit_breaker.trips} time(s)")
+
+    if room_index.dirty and not distributed:
+        logging.info(f"Wrote room files: {room_index.flush()}")
+    if duplicates is not None:
+        run_metrics.duplicate_clusters = duplicates.clusters()
+        if run_metrics.duplicate_clusters:
+            members = sum(len(cluster['members']) for cluster in run_metrics.duplicate_clusters)
+            logging.info(f"Structured {members} duplicate chunks from {len(run_metrics.duplicate_clusters)} "
+                         f"representatives (see duplicate_clusters in run_report.json)")
+    log_tier_summary(run_metrics)
+    run_metrics.write_report(shard_folder, prometheus=prometheus and not distributed)
+
+    if not all_results:
+        logging.warning("No PDF files found. Please check the input folder.")
+        return
 
     successes = [r for r in all_results if r['success']]
     failures = [r for r in all_results if not r['success']]
+    skipped = [r for r in successes if r.get('skipped')]
     
-    logging.info(f"Processing complete. Total successes: {len(successes)}, Total failures: {len(failures)}")
+    logging.info(f"Processing complete. Total successes: {len(successes)} ({len(skipped)} unchanged and skipped), "
+                 f"Total failures: {len(failures)}")
     
     if failures:
         logging.warning("Failures:")
         for failure in failures:
             logging.warning(f"  {failure['file']}: {failure['error']}")
 
+def log_tier_summary(run_metrics):
+    tiers = run_metrics.tier_summary()
+    if tiers:
+        counts = ", ".join(f"{data['files']} {tier}" for tier, data in tiers.items())
+        # Only tiers priced below the full model report a saving; the small tier does not with the default SMALL_MODEL
+        savings = [data['saved_cost'] for data in tiers.values() if data['saved_cost'] is not None]
+        saving = f"; estimated saving ${sum(savings):.4f} over the full model" if savings else ""
+        logging.info(f"Sheet tiers: {counts}{saving} (see by_tier in run_report.json)")
+
+def merge_distributed_run(output_folder, prometheus=False, job_folder=None):
+    """
+    Combine the shards of a --distributed run into the output folder: the manifest, the
+    JSONL files, the run report and the floor room files. Paths a worker recorded under
+    its own mounts are mapped to job_folder and output_folder as seen by this process.
+    Refuses while files are still pending or leased to a live worker; returns whether
+    the merge happened.
+    """
+    if not os.path.isdir(work_folder(output_folder)):
+        logging.error(f"No distributed run to merge in {output_folder}")
+        return False
+    work_table = WorkTable(output_folder, 'merge')
+    counts, remaining = work_table.counts(), work_table.remaining()
+    work_table.close()
+    logging.info(f"Work table: {counts}")
+    if remaining:
+        logging.error(f"{remaining} files are still pending or being processed; start a worker or wait for "
+                      f"the running ones to finish before merging")
+        return False
+    if counts.get('expired'):
+        logging.warning(f"{counts['expired']} files were abandoned after {work_table.max_attempts} attempts "
+                        f"and are missing from the merged output")
+
+    manifest = JobManifest(output_folder)
+    reports = []
+    for shard in list_worker_shards(output_folder):
+        # A shard's JSONL files are appended to the job's; readers keep the last line per source
+        jsonl_files = {}
+        for entry in list(os.scandir(shard)):
+            if '.jsonl' in entry.name:
+                merged_path = os.path.join(output_folder, entry.name)
+                jsonl_files[os.path.abspath(entry.path)] = merged_path
+                # A crashed worker's file, or the job's own, may end mid-record
+                repair_jsonl(entry.path)
+                repair_jsonl(merged_path)
+                with open(entry.path, 'rb') as src, open(merged_path, 'ab') as dst:
+                    shutil.copyfileobj(src, dst)
+
+        roots = read_worker_roots(shard)
+        for pdf_file, entry in JobManifest(shard).entries.items():
+            if job_folder is not None:
+                pdf_file = rebase_path(pdf_file, roots.get('job_folder'), job_folder)
+            entry['output_path'] = rebase_path(entry.get('output_path'), roots.get('output_folder'), output_folder)
+            current = manifest.entries.get(pdf_file)
+            if current is not None and (current.get('finished') or 0) >= (entry.get('finished') or 0):
+                continue
+            if entry['output_path'] and os.path.abspath(entry['output_path']) in jsonl_files:
+                entry['output_path'] = jsonl_files[os.path.abspath(entry['output_path'])]
+            manifest.entries[pdf_file] = entry
+
+        report_path = os.path.join(shard, 'run_report.json')
+        if os.path.exists(report_path):
+            with open(report_path, 'r') as f:
+                reports.append(json.load(f))
+        else:
+            logging.warning(f"No run report in {shard}; that worker did not finish")
+    manifest.save()
+
+    run_metrics = RunMetrics.from_reports(reports)
+    log_tier_summary(run_metrics)
+    run_metrics.write_report(output_folder, prometheus=prometheus)
+
+    room_index = RoomIndex(os.path.join(output_folder, 'Architectural'))
+    output_reader = StructuredOutputReader()
+    for pdf_file, entry in sorted(manifest.entries.items()):
+        if entry.get('drawing_type') == 'Architectural' and entry.get('status') == 'success':
+            parsed_json = output_reader.load(entry['output_path'], pdf_file)
+            if parsed_json is not None:
+                room_index.add_sheet(parsed_json, pdf_file)
+    if room_index.dirty:
+        logging.info(f"Wrote room files: {room_index.flush()}")
+
+    shutil.rmtree(work_folder(output_folder))
+    statuses = [entry.get('status') for entry in manifest.entries.values()]
+    logging.info(f"Merged {len(reports)} worker reports: {statuses.count('success')} successes, "
+                 f"{statuses.count('failed')} failures")
+    return True
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <input_folder> [output_folder]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Extract structured data from a job folder of drawing PDFs.")
+    parser.add_argument("input_folder")
+    parser.add_argument("output_folder", nargs="?")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the LLM result cache")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached LLM results but store fresh ones")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT_FILES,
+                        help="Number of files processed concurrently")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess every file, even those the manifest records as unchanged successes")
+    parser.add_argument("--output-format", choices=["json", "jsonl"], default="json",
+                        help="Pretty JSON file per sheet (default) or one compact JSON line per sheet "
+                             "appended to <drawing type>.jsonl")
+    parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default="none",
+                        help="Compression of JSONL output (zstd needs the zstandard package)")
+    parser.add_argument("--include", action="append",
+                        help="Only process PDFs whose relative path or name matches this glob (repeatable)")
+    parser.add_argument("--exclude", action="append",
+                        help="Skip PDFs and folders matching this glob, e.g. '*/Superseded' (repeatable)")
+    parser.add_argument("--sheet-prefix", action="append", dest="sheet_prefixes",
+                        help="Only process sheets whose file name starts with this prefix, e.g. E (repeatable)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Structure all sheets through the OpenAI Batch API (half price, results within "
+                             "the completion window) instead of live requests")
+    parser.add_argument("--distributed", action="store_true",
+                        help="Share the job with other processes, on this or other machines, running "
+                             "--distributed against the same output folder")
+    parser.add_argument("--worker-id", help="Name of this --distributed worker (default: <host>-<pid>)")
+    parser.add_argument("--merge", action="store_true",
+                        help="Combine the results of a finished --distributed run and exit")
+    parser.add_argument("--prometheus", action="store_true",
+                        help="Also write the run metrics as Prometheus text to metrics.prom")
+    args = parser.parse_args()
+    if args.distributed and args.batch:
+        parser.error("--distributed cannot be combined with --batch")
     
-    job_folder = sys.argv[1]
-    output_folder = sys.argv[2] if len(sys.argv) > 2 else os.path.join(job_folder, "output")
+    job_folder = args.input_folder
+    output_folder = args.output_folder or os.path.join(job_folder, "output")
     
     if not os.path.exists(job_folder):
         print(f"Error: Input folder '{job_folder}' does not exist.")
@@ -202,5 +744,15 @@ if __name__ == "__main__":
     
     logging.info(f"Processing files from: {job_folder}")
     logging.info(f"Output will be saved to: {output_folder}")
+
+    if args.merge:
+        sys.exit(0 if merge_distributed_run(output_folder, prometheus=args.prometheus, job_folder=job_folder) else 1)
     
-    asyncio.run(process_job_site_async(job_folder, output_folder))
\ No newline at end of file
+    asyncio.run(process_job_site_async(job_folder, output_folder,
+                                       use_cache=not args.no_cache, refresh_cache=args.refresh,
+                                       num_workers=args.workers, force=args.force,
+                                       prometheus=args.prometheus, output_format=args.output_format,
+                                       compression=args.compression, include=args.include,
+                                       exclude=args.exclude, sheet_prefixes=args.sheet_prefixes,
+                                       batch=args.batch, distributed=args.distributed,
+                                       worker_id=args.worker_id))
\ No newline at end of file
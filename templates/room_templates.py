@@ -1,7 +1,10 @@
 import json
 import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict
 
-def load_template(template_name):
+def _read_template(template_name):
     current_dir = os.path.dirname(os.path.abspath(__file__))
     template_path = os.path.join(current_dir, f"{template_name}_template.json")
     try:
@@ -14,8 +17,47 @@ def load_template(template_name):
         print(f"Error decoding JSON from file: {template_path}")
         return {}
 
+def _compile(value: Any) -> Callable[[], Any]:
+    """
+    Turn a JSON value into a factory that builds an independent copy of it.
+
+    Scalars are shared (they are immutable); every dict and list is rebuilt on each
+    call, so records made from the same template never share nested containers.
+    Building from a pre-split shape is much cheaper than copy.deepcopy.
+    """
+    if isinstance(value, dict):
+        nested = tuple((key, _compile(item)) for key, item in value.items() if isinstance(item, (dict, list)))
+        # Containers are placeholders here and get replaced, which keeps the key order.
+        base = {key: (None if isinstance(item, (dict, list)) else item) for key, item in value.items()}
+        if not nested:
+            return base.copy
+
+        def make_dict():
+            record = base.copy()
+            for key, make in nested:
+                record[key] = make()
+            return record
+        return make_dict
+
+    if isinstance(value, list):
+        if not any(isinstance(item, (dict, list)) for item in value):
+            items = tuple(value)
+            return lambda: list(items)
+        makers = tuple(_compile(item) for item in value)
+        return lambda: [make() for make in makers]
+
+    return lambda: value
+
+@lru_cache(maxsize=None)
+def get_template_factory(template_name: str) -> Callable[[], Dict[str, Any]]:
+    """Read and compile a template once; the returned factory builds a fresh record per call."""
+    return _compile(_read_template(template_name))
+
+def load_template(template_name):
+    return get_template_factory(template_name)()
+
 def generate_rooms_data(parsed_data, room_type):
-    template = load_template(room_type)
+    new_room = get_template_factory(room_type)
     
     metadata = parsed_data.get('metadata', {})
     
@@ -40,7 +82,7 @@ def generate_rooms_data(parsed_data, room_type):
             print(f"Skipping room with incomplete data: {parsed_room}")
             continue
         
-        room_data = template.copy()
+        room_data = new_room()
         room_data['room_id'] = f"Room_{room_number}"
         room_data['room_name'] = f"{room_name}_{room_number}"
         
@@ -53,28 +95,177 @@ def generate_rooms_data(parsed_data, room_type):
     
     return rooms_data
 
-def process_architectural_drawing(parsed_data, file_path, output_folder):
+ROOM_TYPES = ('e_rooms', 'a_rooms')
+
+FLOOR_FIELDS = ('floor_number', 'floor', 'level')
+TITLE_FIELDS = ('drawing_title', 'title', 'sheet_title', 'drawing_name')
+ORDINALS = {
+    'FIRST': '1', 'SECOND': '2', 'THIRD': '3', 'FOURTH': '4', 'FIFTH': '5',
+    'SIXTH': '6', 'SEVENTH': '7', 'EIGHTH': '8', 'NINTH': '9', 'TENTH': '10',
+    'GROUND': '1',
+}
+NAMED_FLOORS = {'BASEMENT': 'B', 'MEZZANINE': 'M', 'ROOF': 'R', 'PENTHOUSE': 'PH'}
+FLOOR_PATTERNS = (
+    re.compile(r'\b(?:LEVEL|FLOOR|LVL|FLR)[\s_-]*(\d{1,3}|B\d?)\b'),
+    re.compile(r'\b(\d{1,3})(?:ST|ND|RD|TH)[\s_-]*(?:FLOOR|FLR|LEVEL)\b'),
+    # Words alone are too common ("FIRST AID ROOM", "ROOF DETAILS"); they need floor wording after them
+    re.compile(r'\b(' + '|'.join(ORDINALS) + r')[\s_-]*(?:FLOOR|FLR|LEVEL)\b'),
+    re.compile(r'\b(' + '|'.join(NAMED_FLOORS) + r')[\s_-]*(?:FLOOR|FLR|LEVEL|PLAN)\b'),
+)
+# Plan sheet numbers such as A101, A-201 or A3.01 carry the floor in their first digit;
+# sections, elevations and details are numbered by series instead
+SHEET_NUMBER_PATTERN = re.compile(r'^[A-Z]{1,2}[-_. ]?(\d)\.?\d{2}[A-Z]?(?:$|_)')
+PLAN_SHEET_PATTERN = re.compile(r'\b(?:PLANS?|RCP)\b')
+
+def _normalize_floor(value: str) -> str:
+    value = value.upper()
+    if value in ORDINALS:
+        return ORDINALS[value]
+    if value in NAMED_FLOORS:
+        return NAMED_FLOORS[value]
+    return (value.lstrip('0') or '0') if value.isdigit() else value
+
+def _floor_from_text(text: str) -> str:
+    text = text.upper().replace('_', ' ')
+    for pattern in FLOOR_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return _normalize_floor(match.group(1))
+    return ''
+
+def detect_floor(parsed_data, file_path):
+    """
+    Work out which floor an architectural sheet shows.
+
+    Looks, in order, at explicit floor/level fields in the sheet metadata, floor wording in
+    the metadata titles, floor wording in the file name, and finally the sheet number
+    (A101 -> 1, A-201 -> 2) when the title or file name marks the sheet as a plan or
+    reflected ceiling plan.
+
+    Args:
+    parsed_data (dict): The structured sheet returned by the model.
+    file_path (str): The source PDF path.
+
+    Returns:
+    str: A normalized floor such as '1', '2', 'B' or 'R', or '' if it cannot be determined.
+    """
+    metadata = parsed_data.get('metadata', {}) or {}
+    if not isinstance(metadata, dict):
+        metadata = {}
+
+    for field in FLOOR_FIELDS:
+        value = str(metadata.get(field) or '').strip()
+        if value:
+            return _floor_from_text(value) or _normalize_floor(value)
+
+    titles = [str(metadata.get(field) or '') for field in TITLE_FIELDS]
+    for title in titles:
+        floor = _floor_from_text(title)
+        if floor:
+            return floor
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    floor = _floor_from_text(stem)
+    if floor:
+        return floor
+
+    if not PLAN_SHEET_PATTERN.search(' '.join(titles + [stem]).upper().replace('_', ' ')):
+        return ''
+    sheet_number = str(metadata.get('drawing_number') or metadata.get('sheet_number') or stem.split()[0])
+    match = SHEET_NUMBER_PATTERN.match(sheet_number.upper())
+    return match.group(1) if match and match.group(1) != '0' else ''
+
+def _merge_room(existing, new):
+    """Fill in a room from another sheet: nested dicts are merged, the first non-empty value wins."""
+    for key, value in new.items():
+        current = existing.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            _merge_room(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            current.extend(item for item in value if item not in current)
+        elif current in (None, '', [], {}):
+            existing[key] = value
+    return existing
+
+def rooms_file_path(output_folder, room_type, floor_number):
+    return os.path.join(output_folder, f'{room_type}_details_floor_{floor_number or "unknown"}.json')
+
+class RoomIndex:
+    """
+    Cross-sheet room index keyed by (floor, room number), flushed as one file per floor.
+
+    Sheets are added as they complete; each floor is rebuilt from its sheets in file-path
+    order when flushed, so the output does not depend on completion order and re-adding a
+    revised sheet replaces its earlier contribution. Only floors changed since the last
+    flush are rewritten. With flush_every > 0 the index also flushes itself after that
+    many added sheets; otherwise the owner calls flush() once at the end.
+    """
+
+    def __init__(self, output_folder, flush_every=0):
+        self.output_folder = output_folder
+        self.flush_every = flush_every
+        self.sheets = {}  # floor -> {file_path: {room_type: rooms_data}}
+        self.dirty = set()
+        self.pending = 0
+
+    def add_sheet(self, parsed_data, file_path):
+        floor_number = detect_floor(parsed_data, file_path)
+        self.sheets.setdefault(floor_number, {})[file_path] = {
+            room_type: generate_rooms_data(parsed_data, room_type) for room_type in ROOM_TYPES
+        }
+        self.dirty.add(floor_number)
+        self.pending += 1
+        if self.flush_every and self.pending >= self.flush_every:
+            self.flush()
+        return floor_number
+
+    def build_floor(self, floor_number, room_type):
+        floor_data = {"metadata": {}, "project_name": '', "floor_number": floor_number, "rooms": []}
+        rooms = {}
+        for file_path in sorted(self.sheets.get(floor_number, {})):
+            sheet_data = self.sheets[floor_number][file_path][room_type]
+            floor_data['metadata'] = floor_data['metadata'] or sheet_data['metadata']
+            floor_data['project_name'] = floor_data['project_name'] or sheet_data['project_name']
+            for room in sheet_data['rooms']:
+                if room['room_id'] in rooms:
+                    _merge_room(rooms[room['room_id']], room)
+                else:
+                    rooms[room['room_id']] = json.loads(json.dumps(room))
+        floor_data['rooms'] = list(rooms.values())
+        return floor_data
+
+    def flush(self):
+        """Write the room files of every floor changed since the last flush."""
+        written = []
+        if self.dirty:
+            os.makedirs(self.output_folder, exist_ok=True)
+        for floor_number in sorted(self.dirty):
+            for room_type in ROOM_TYPES:
+                path = rooms_file_path(self.output_folder, room_type, floor_number)
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(self.build_floor(floor_number, room_type), f, indent=2)
+                os.replace(tmp_path, path)
+                written.append(path)
+        self.dirty.clear()
+        self.pending = 0
+        return written
+
+def process_architectural_drawing(parsed_data, file_path, output_folder, room_index=None):
     is_reflected_ceiling = "REFLECTED CEILING PLAN" in file_path.upper()
     
-    project_name = parsed_data.get('metadata', {}).get('project', '')
-    job_number = parsed_data.get('metadata', {}).get('job_number', '')
-    floor_number = ''  # If floor number is available in the future, extract it here
-    
-    e_rooms_data = generate_rooms_data(parsed_data, 'e_rooms')
-    a_rooms_data = generate_rooms_data(parsed_data, 'a_rooms')
-    
-    e_rooms_file = os.path.join(output_folder, f'e_rooms_details_floor_{floor_number}.json')
-    a_rooms_file = os.path.join(output_folder, f'a_rooms_details_floor_{floor_number}.json')
-    
-    with open(e_rooms_file, 'w') as f:
-        json.dump(e_rooms_data, f, indent=2)
-    
-    with open(a_rooms_file, 'w') as f:
-        json.dump(a_rooms_data, f, indent=2)
+    # Without a shared index (standalone use), index just this sheet and write it out now
+    flush_now = room_index is None
+    if room_index is None:
+        room_index = RoomIndex(output_folder)
+    floor_number = room_index.add_sheet(parsed_data, file_path)
+    if flush_now:
+        room_index.flush()
     
     return {
-        "e_rooms_file": e_rooms_file,
-        "a_rooms_file": a_rooms_file,
+        "floor_number": floor_number,
+        "e_rooms_file": rooms_file_path(room_index.output_folder, 'e_rooms', floor_number),
+        "a_rooms_file": rooms_file_path(room_index.output_folder, 'a_rooms', floor_number),
         "is_reflected_ceiling": is_reflected_ceiling
     }
 
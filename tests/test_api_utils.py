@@ -0,0 +1,101 @@
+import asyncio
+import time
+import types
+
+import httpx
+import openai
+import pytest
+
+from utils import api_utils
+from utils.api_utils import CircuitBreaker, async_safe_api_call
+from utils.rate_limiter import RateLimiter
+
+MESSAGES = [{"role": "user", "content": "A101"}]
+
+def api_error(error_class, status_code, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+def completion():
+    return types.SimpleNamespace(usage=None, choices=[])
+
+class FakeClient:
+    """Stand-in for AsyncOpenAI whose chat.completions.create raises the queued errors, then succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return completion()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(api_utils, "BASE_DELAY", 0.0)
+    monkeypatch.setattr(api_utils, "backoff_delay", lambda attempt: 0.0)
+
+def call(client, **kwargs):
+    return asyncio.run(async_safe_api_call(client, messages=MESSAGES, **kwargs))
+
+def test_rate_limit_is_retried_after_retry_after():
+    client = FakeClient(api_error(openai.RateLimitError, 429, {"retry-after-ms": "50"}))
+    started = time.monotonic()
+    assert call(client) is not None
+    assert client.calls == 2
+    assert time.monotonic() - started >= 0.05
+
+def test_server_errors_are_retried_until_max_retries():
+    client = FakeClient(*(api_error(openai.InternalServerError, 500) for _ in range(3)))
+    call(client, max_retries=3)
+    assert client.calls == 4
+
+    client = FakeClient(*(api_error(openai.InternalServerError, 503) for _ in range(3)))
+    with pytest.raises(openai.InternalServerError):
+        call(client, max_retries=2)
+    assert client.calls == 3
+
+def test_bad_request_is_raised_immediately():
+    client = FakeClient(api_error(openai.BadRequestError, 400))
+    with pytest.raises(openai.BadRequestError):
+        call(client)
+    assert client.calls == 1
+
+def test_circuit_breaker_opens_on_failure_rate():
+    breaker = CircuitBreaker(failure_threshold=0.5, window=4, min_calls=4, cooldown=0.1)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.trips == 1
+
+def test_open_circuit_breaker_pauses_callers():
+    breaker = CircuitBreaker(cooldown=0.1)
+    breaker.pause(0.1)
+    client = FakeClient()
+    started = time.monotonic()
+    call(client, circuit_breaker=breaker)
+    assert time.monotonic() - started >= 0.1
+    assert client.calls == 1
+
+def test_retry_after_on_rate_limit_pauses_circuit_breaker():
+    breaker = CircuitBreaker()
+    client = FakeClient(api_error(openai.RateLimitError, 429, {"retry-after": "0.05"}))
+    call(client, circuit_breaker=breaker)
+    assert client.calls == 2
+    assert breaker.open_until > 0
+    assert list(breaker.outcomes) == [False, True]
+
+def test_failed_attempts_return_their_token_reservation():
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=100000)
+    client = FakeClient(*(api_error(openai.InternalServerError, 500) for _ in range(3)))
+    with pytest.raises(openai.InternalServerError):
+        call(client, rate_limiter=limiter, max_retries=2, max_tokens=16000)
+    assert client.calls == 3
+    assert limiter.tokens.level == pytest.approx(limiter.tokens.capacity, abs=100)
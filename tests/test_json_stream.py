@@ -0,0 +1,91 @@
+import asyncio
+import json
+import types
+
+from utils.drawing_processor import CONTINUATION_PROMPT, structure_content
+from utils.json_stream import IncrementalJsonParser, repair_truncated_json
+
+DOCUMENT = {
+    "metadata": {"drawing_number": "A101", "title": "FIRST FLOOR PLAN"},
+    "rooms": [
+        {"number": "101", "name": "OFFICE", "notes": ["see \"A\" {detail}", "[typ]"]},
+        {"number": "102", "name": "STORAGE"},
+    ],
+}
+
+def completion(content, finish_reason="stop"):
+    message = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(usage=None, choices=[types.SimpleNamespace(message=message,
+                                                                            finish_reason=finish_reason)])
+
+class FakeClient:
+    """Stand-in for AsyncOpenAI whose chat.completions.create returns the queued responses in order."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.chat = types.SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.responses.pop(0)
+
+def test_complete_document_is_returned_unchanged():
+    assert repair_truncated_json(json.dumps(DOCUMENT)) == DOCUMENT
+
+def test_truncated_document_keeps_every_complete_value():
+    text = json.dumps(DOCUMENT)
+    cut = text.index('{"number": "102"') + len('{"number": "102", "na')
+    repaired = repair_truncated_json(text[:cut])
+    # The cut-off room keeps its complete fields; a continuation fills in the rest by room number
+    assert repaired == {"metadata": DOCUMENT["metadata"], "rooms": [DOCUMENT["rooms"][0], {"number": "102"}]}
+
+def test_truncation_inside_a_string_with_brackets_and_escapes():
+    text = json.dumps(DOCUMENT)
+    cut = text.index("{detail}") + 3
+    assert repair_truncated_json(text[:cut]) == {"metadata": DOCUMENT["metadata"],
+                                                 "rooms": [{"number": "101", "name": "OFFICE"}]}
+
+def test_nothing_complete_gives_none():
+    assert repair_truncated_json('{"metadata": {"drawing_num') is None
+    assert repair_truncated_json("") is None
+
+def test_incremental_parser_reports_array_elements_once_complete():
+    text = json.dumps(DOCUMENT)
+    parser = IncrementalJsonParser()
+    items = []
+    for start in range(0, len(text), 7):
+        items.extend(parser.feed(text[start:start + 7]))
+    assert items == [(("rooms",), room) for room in DOCUMENT["rooms"]]
+    assert parser.complete
+    assert json.loads(parser.text()) == DOCUMENT
+
+def test_cut_off_response_is_continued_and_merged():
+    text = json.dumps(DOCUMENT)
+    cut = text.index('{"number": "102"') + 5
+    client = FakeClient(
+        completion(text[:cut], "length"),
+        completion(json.dumps({"rooms": [{"number": "102", "name": "STORAGE"}, {"number": "103", "name": "HALL"}]})),
+    )
+    content, finish_reason = asyncio.run(structure_content("A101 FIRST FLOOR PLAN", "Architectural", client,
+                                                           stream=False))
+    assert finish_reason == "stop"
+    assert json.loads(content) == {
+        "metadata": DOCUMENT["metadata"],
+        "rooms": [DOCUMENT["rooms"][0], {"number": "102", "name": "STORAGE"}, {"number": "103", "name": "HALL"}],
+    }
+    continuation = client.requests[1]["messages"]
+    assert json.loads(continuation[-2]["content"]) == {"metadata": DOCUMENT["metadata"],
+                                                       "rooms": [DOCUMENT["rooms"][0]]}
+    assert continuation[-1]["content"] == CONTINUATION_PROMPT
+
+def test_continuation_cut_off_again_keeps_what_was_complete(monkeypatch):
+    monkeypatch.setattr("utils.drawing_processor.MAX_CONTINUATIONS", 1)
+    first = '{"metadata": {"drawing_number": "A101"}, "rooms": [{"number": "101"}, {"numb'
+    second = '{"rooms": [{"number": "102"}, {"number": "10'
+    client = FakeClient(completion(first, "length"), completion(second, "length"))
+    content, finish_reason = asyncio.run(structure_content("A101", "Architectural", client, stream=False))
+    assert finish_reason == "length"
+    assert json.loads(content) == {"metadata": {"drawing_number": "A101"},
+                                   "rooms": [{"number": "101"}, {"number": "102"}]}
+    assert len(client.requests) == 2
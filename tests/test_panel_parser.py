@@ -0,0 +1,72 @@
+from config.settings import PANEL_PARSER_MIN_CONFIDENCE
+from utils.panel_parser import match_header, parse_markdown_table, parse_panel_pages, parse_panel_table
+
+TWO_SIDED = """
+|PANEL LP-1 208/120V 3PH 225A MCB||||||||
+|---|---|---|---|---|---|---|---|
+|CKT|DESCRIPTION|LOAD VA|BKR|CKT|DESCRIPTION|LOAD VA|BKR|
+|1|LIGHTING OFFICES|1,200|20A|2|RECEPTACLES 101|900|20/1|
+|3|LIGHTING CORRIDOR|800|20A|4|RECEPTACLES 102|720|20A|
+|5|EXHAUST FAN EF&amp;#45;1|450|15A|6|SPARE||20A|
+"""
+
+def test_header_aliases_and_misspellings():
+    assert match_header("CKT NO.") == "circuit"
+    assert match_header("Load Description") == "description"
+    assert match_header("LOAD (VA)") == "load_va"
+    assert match_header("BREAKR") == "breaker"
+    assert match_header("Remarks") is None
+
+def test_markdown_cells_are_unescaped():
+    rows = parse_markdown_table(TWO_SIDED)
+    assert rows[0][0] == "PANEL LP-1 208/120V 3PH 225A MCB"
+    assert rows[4][1] == "EXHAUST FAN EF-1"
+    assert all(not cell.startswith("---") for row in rows for cell in row)
+
+def test_two_sided_layout_reads_both_sides_in_circuit_order():
+    parsed = parse_panel_table(parse_markdown_table(TWO_SIDED))
+    panel = parsed.panel
+    assert (panel["panel_name"], panel["voltage"], panel["phases"], panel["main"]) == ("LP-1", "208/120V", 3, "225A MCB")
+    assert [c["circuit"] for c in panel["circuits"]] == [1, 2, 3, 4, 5, 6]
+    assert panel["circuits"][1] == {"circuit": 2, "description": "RECEPTACLES 101", "load_va": 900,
+                                    "breaker": "20A", "poles": 1, "phase": None}
+    assert panel["circuits"][5]["load_va"] is None
+    assert panel["total_load_va"] == 1200 + 900 + 800 + 720 + 450
+    assert parsed.confidence >= PANEL_PARSER_MIN_CONFIDENCE
+
+def test_irregular_rows_fall_below_the_confidence_threshold():
+    table = """
+|CKT|DESCRIPTION|LOAD VA|BKR|
+|---|---|---|---|
+|1|LIGHTING|1200|20A|
+|1|SEE NOTE 3|BY OTHERS|20A|
+|A|FUTURE|TBD|--|
+"""
+    parsed = parse_panel_table(parse_markdown_table(table))
+    assert parsed is not None
+    assert parsed.confidence < PANEL_PARSER_MIN_CONFIDENCE
+
+def test_missing_core_columns_lower_the_confidence():
+    table = """
+|CKT|DESCRIPTION|
+|---|---|
+|1|LIGHTING|
+|2|RECEPTACLES|
+"""
+    assert parse_panel_table(parse_markdown_table(table)).confidence == 0.5
+
+def test_room_schedule_is_not_a_panel():
+    table = """
+|ROOM|ROOM NAME|FLOOR FINISH|CEILING HEIGHT|
+|---|---|---|---|
+|101|OFFICE|CPT|9'-0"|
+"""
+    assert parse_panel_table(parse_markdown_table(table)) is None
+    assert parse_panel_pages([("ROOM FINISH SCHEDULE", [table])]) is None
+
+def test_sheet_with_long_text_goes_to_the_model():
+    notes = "GENERAL NOTES " + " ".join(f"note{i}" for i in range(250))
+    assert parse_panel_pages([(notes, [TWO_SIDED])]) is None
+    parsed = parse_panel_pages([("GENERAL NOTES\n1. ALL BREAKERS BOLT-ON.", [TWO_SIDED])])
+    assert [panel["panel_name"] for panel in parsed.panels] == ["LP-1"]
+    assert parsed.notes == ["GENERAL NOTES", "1. ALL BREAKERS BOLT-ON."]
@@ -0,0 +1,57 @@
+import json
+import os
+
+from templates.room_templates import RoomIndex, detect_floor, rooms_file_path
+
+def sheet(rooms, **metadata):
+    return {"metadata": metadata, "rooms": [dict(room) for room in rooms]}
+
+def test_floor_from_metadata_titles_and_file_name():
+    assert detect_floor(sheet([], floor_number="Level 02"), "/job/A-X.pdf") == "2"
+    assert detect_floor(sheet([], drawing_title="SECOND FLOOR PLAN"), "/job/A-X.pdf") == "2"
+    assert detect_floor(sheet([], title="BASEMENT FLOOR PLAN"), "/job/A-X.pdf") == "B"
+    assert detect_floor(sheet([]), "/job/A201 LEVEL 3 RCP.pdf") == "3"
+
+def test_sheet_number_only_counts_for_plans():
+    assert detect_floor(sheet([], drawing_number="A-201", title="FLOOR PLAN - EAST"), "/job/x.pdf") == "2"
+    assert detect_floor(sheet([], drawing_number="A301", title="BUILDING SECTIONS"), "/job/x.pdf") == ""
+    # Floor-like words without floor wording are room names, not floors
+    assert detect_floor(sheet([], title="FIRST AID ROOM DETAILS"), "/job/A501.pdf") == ""
+
+def test_floor_rooms_do_not_depend_on_completion_order(tmp_path):
+    office = {"number": "101", "name": "OFFICE", "finish": ""}
+    office_finish = {"number": "101", "name": "OFFICE", "finish": "CPT"}
+    storage = {"number": "102", "name": "STORAGE"}
+    outputs = []
+    for order in ([("/job/A101.pdf", [office]), ("/job/A102.pdf", [office_finish, storage])],
+                  [("/job/A102.pdf", [office_finish, storage]), ("/job/A101.pdf", [office])]):
+        index = RoomIndex(str(tmp_path / str(len(outputs))))
+        for path, rooms in order:
+            index.add_sheet(sheet(rooms, title="FIRST FLOOR PLAN"), path)
+        index.flush()
+        with open(rooms_file_path(index.output_folder, "a_rooms", "1")) as f:
+            outputs.append(json.load(f))
+    assert outputs[0] == outputs[1]
+    assert [(room["room_id"], room.get("finish")) for room in outputs[0]["rooms"]] == [("Room_101", "CPT"),
+                                                                                      ("Room_102", None)]
+
+def test_revised_sheet_replaces_its_rooms_and_only_dirty_floors_are_written(tmp_path):
+    index = RoomIndex(str(tmp_path))
+    index.add_sheet(sheet([{"number": "101", "name": "OFFICE"}], title="FIRST FLOOR PLAN"), "/job/A101.pdf")
+    index.add_sheet(sheet([{"number": "201", "name": "LAB"}], title="SECOND FLOOR PLAN"), "/job/A201.pdf")
+    assert len(index.flush()) == 4
+
+    index.add_sheet(sheet([{"number": "105", "name": "CONFERENCE"}], title="FIRST FLOOR PLAN"), "/job/A101.pdf")
+    written = index.flush()
+    assert written == [rooms_file_path(str(tmp_path), room_type, "1") for room_type in ("e_rooms", "a_rooms")]
+    with open(written[1]) as f:
+        assert [room["room_id"] for room in json.load(f)["rooms"]] == ["Room_105"]
+    assert index.flush() == []
+
+def test_flush_every_writes_as_sheets_arrive(tmp_path):
+    index = RoomIndex(str(tmp_path / "Architectural"), flush_every=2)
+    index.add_sheet(sheet([{"number": "101", "name": "OFFICE"}], title="FIRST FLOOR PLAN"), "/job/A101.pdf")
+    assert not os.path.exists(index.output_folder)
+    index.add_sheet(sheet([{"number": "102", "name": "STORAGE"}], title="FIRST FLOOR PLAN"), "/job/A102.pdf")
+    assert os.path.exists(rooms_file_path(index.output_folder, "a_rooms", "1"))
+    assert not index.dirty
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+from main import merge_distributed_run
+from utils.manifest import MANIFEST_FILENAME
+from utils.work_table import WorkTable, work_folder, worker_shard_folder, write_worker_roots
+
+def test_a_file_is_claimed_by_one_worker_only(tmp_path):
+    first = WorkTable(str(tmp_path), "w1")
+    second = WorkTable(str(tmp_path), "w2")
+    first.add("/job/A101.pdf")
+    second.add("/job/A101.pdf")
+    assert first.claim("/job/A101.pdf")
+    assert not second.claim("/job/A101.pdf")
+    assert second.claimed_elsewhere() == 1
+    first.complete("/job/A101.pdf", "done")
+    assert not second.claim("/job/A101.pdf")
+    assert second.remaining() == 0
+    assert second.counts() == {"done": 1}
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    crashed = WorkTable(str(tmp_path), "w1", lease_seconds=0.05)
+    other = WorkTable(str(tmp_path), "w2")
+    crashed.add("/job/E101.pdf")
+    assert crashed.claim("/job/E101.pdf")
+    assert other.claimable(10) == []
+    time.sleep(0.1)
+    assert other.counts() == {"expired": 1}
+    assert other.claimable(10) == ["/job/E101.pdf"]
+    assert other.claim("/job/E101.pdf")
+    # The crashed worker's late completion does not overwrite the new claim
+    crashed.complete("/job/E101.pdf", "failed")
+    assert other.counts() == {"claimed": 1}
+
+def test_renewed_lease_is_not_reclaimed(tmp_path):
+    owner = WorkTable(str(tmp_path), "w1", lease_seconds=0.2)
+    other = WorkTable(str(tmp_path), "w2")
+    owner.add("/job/E101.pdf")
+    owner.claim("/job/E101.pdf")
+    time.sleep(0.15)
+    assert owner.renew() == 1
+    time.sleep(0.1)
+    assert not other.claim("/job/E101.pdf")
+
+def test_file_is_given_up_after_max_attempts(tmp_path):
+    for attempt in range(2):
+        table = WorkTable(str(tmp_path), f"w{attempt}", lease_seconds=0.01, max_attempts=2)
+        table.add("/job/M101.pdf")
+        assert table.claim("/job/M101.pdf")
+        time.sleep(0.02)
+    table = WorkTable(str(tmp_path), "w2", max_attempts=2)
+    assert not table.claim("/job/M101.pdf")
+    assert table.claimable(10) == []
+    assert table.remaining() == 0
+    assert table.counts() == {"expired": 1}
+
+def test_release_hands_claims_back_without_using_an_attempt(tmp_path):
+    table = WorkTable(str(tmp_path), "w1", max_attempts=1)
+    table.add("/job/P101.pdf")
+    table.claim("/job/P101.pdf")
+    table.release()
+    assert table.counts() == {"pending": 1}
+    assert WorkTable(str(tmp_path), "w2", max_attempts=1).claim("/job/P101.pdf")
+
+def test_rows_are_shared_across_different_mounts(tmp_path):
+    first = WorkTable(str(tmp_path), "w1", job_folder="/mnt/a/job")
+    second = WorkTable(str(tmp_path), "w2", job_folder="/Volumes/share/job")
+    first.add(os.path.join("/mnt/a/job", "Electrical", "E101.pdf"))
+    second.add(os.path.join("/Volumes/share/job", "Electrical", "E101.pdf"))
+    assert first.counts() == {"pending": 1}
+    assert second.claimable(10) == [os.path.join("/Volumes/share/job", "Electrical", "E101.pdf")]
+    assert first.claim(os.path.join("/mnt/a/job", "Electrical", "E101.pdf"))
+    assert not second.claim(os.path.join("/Volumes/share/job", "Electrical", "E101.pdf"))
+
+def write_shard(output_folder, worker_id, job_folder, entries):
+    shard = worker_shard_folder(output_folder, worker_id)
+    os.makedirs(shard)
+    write_worker_roots(shard, job_folder, output_folder)
+    with open(os.path.join(shard, MANIFEST_FILENAME), "w") as f:
+        json.dump({"files": entries}, f)
+    with open(os.path.join(shard, "run_report.json"), "w") as f:
+        json.dump({"started": 0.0, "files": []}, f)
+
+def test_merge_refuses_while_a_lease_is_live(tmp_path):
+    output_folder = str(tmp_path)
+    table = WorkTable(output_folder, "w1")
+    table.add("/job/E101.pdf")
+    table.claim("/job/E101.pdf")
+    assert not merge_distributed_run(output_folder)
+    assert os.path.isdir(work_folder(output_folder))
+    table.complete("/job/E101.pdf", "done")
+    table.close()
+    assert merge_distributed_run(output_folder)
+    assert not os.path.exists(work_folder(output_folder))
+
+def test_merge_records_paths_as_mounted_locally(tmp_path):
+    output_folder = str(tmp_path / "output")
+    entry = {"status": "success", "drawing_type": "Electrical", "finished": 1.0}
+    write_shard(output_folder, "w1", "/mnt/a/job",
+                {"/mnt/a/job/E101.pdf": dict(entry, output_path="/elsewhere/Electrical/E101_structured.json")})
+    write_shard(output_folder, "w2", "/Volumes/share/job", {"/Volumes/share/job/E102.pdf": dict(entry)})
+    WorkTable(output_folder, "merge").close()
+
+    assert merge_distributed_run(output_folder, job_folder="/data/job")
+    with open(os.path.join(output_folder, MANIFEST_FILENAME)) as f:
+        files = json.load(f)["files"]
+    assert sorted(files) == [os.path.join("/data/job", "E101.pdf"), os.path.join("/data/job", "E102.pdf")]
+    # Only paths under the worker's own output folder are moved
+    assert files[os.path.join("/data/job", "E101.pdf")]["output_path"] == "/elsewhere/Electrical/E101_structured.json"
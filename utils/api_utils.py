@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import openai
+
+from utils.metrics import current_file_metrics
+from utils.rate_limiter import RateLimiter, estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 5
+BASE_DELAY = 1.0  # seconds
+MAX_DELAY = 60.0  # seconds
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide whether an OpenAI error is transient and worth retrying.
+
+    Args:
+    error (Exception): The exception raised by the client.
+
+    Returns:
+    bool: True for timeouts, connection errors, rate limits and server errors.
+    """
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Read the server's requested delay from the Retry-After (or retry-after-ms) header.
+
+    Args:
+    error (Exception): The exception raised by the client.
+
+    Returns:
+    Optional[float]: The delay in seconds, or None if the response did not specify one.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt: int, base: float = BASE_DELAY, cap: float = MAX_DELAY) -> float:
+    """Exponential backoff with full jitter: a uniform delay in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class CircuitBreaker:
+    """
+    Pauses every caller when recent API calls fail too often.
+
+    Outcomes of the last `window` calls are tracked; once at least `min_calls` are known
+    and the failure ratio reaches `failure_threshold`, the breaker opens for `cooldown`
+    seconds and all callers wait in wait_until_closed() instead of retrying independently.
+    """
+
+    def __init__(self, failure_threshold: float = 0.5, window: int = 20, min_calls: int = 10, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window)
+        self.open_until = 0.0
+        self.trips = 0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.open_until
+
+    async def wait_until_closed(self) -> None:
+        while True:
+            delay = self.open_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for at least `seconds`, e.g. for a server-sent Retry-After."""
+        self.open_until = max(self.open_until, time.monotonic() + seconds)
+
+    def record_success(self) -> None:
+        self.outcomes.append(True)
+
+    def record_failure(self) -> None:
+        self.outcomes.append(False)
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_threshold:
+            self.trips += 1
+            logger.warning(f"Circuit breaker open: {failures}/{len(self.outcomes)} recent API calls failed, "
+                           f"pausing all requests for {self.cooldown:.1f}s")
+            self.pause(self.cooldown)
+            self.outcomes.clear()
+
+async def async_safe_api_call(client, rate_limiter: Optional[RateLimiter] = None,
+                              circuit_breaker: Optional[CircuitBreaker] = None,
+                              max_retries: int = MAX_RETRIES, stream_handler: Optional[Callable] = None,
+                              **kwargs):
+    """
+    Create a chat completion with rate limiting, retries and a shared circuit breaker.
+
+    Transient errors (see is_retryable) are retried with exponential backoff and full
+    jitter, or after the server's Retry-After delay when one is sent. Other errors are
+    raised immediately.
+
+    Args:
+    client (AsyncOpenAI): The OpenAI client. It should be created with max_retries=0 so
+        that retries are not stacked on top of the client's own.
+    rate_limiter (Optional[RateLimiter]): The shared requests/tokens limiter.
+    circuit_breaker (Optional[CircuitBreaker]): The shared circuit breaker.
+    max_retries (int): Retries after the first attempt before giving up.
+    stream_handler (Optional[Callable]): With stream=True in kwargs, an async callable that
+        consumes the stream and returns an object with a 'usage' attribute. It runs inside
+        the retry loop, so a retryable error mid-stream restarts the request and the
+        handler must cope with being called again.
+    **kwargs: Arguments for client.chat.completions.create.
+
+    Returns:
+    The chat completion response, or the stream handler's result.
+
+    Raises:
+    openai.OpenAIError: The last error once retries are exhausted, or any non-retryable error.
+    """
+    estimated_tokens = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens"))
+    attempt = 0
+    while True:
+        if circuit_breaker is not None:
+            await circuit_breaker.wait_until_closed()
+        reserved = await rate_limiter.acquire(estimated_tokens) if rate_limiter is not None else 0
+
+        try:
+            response = await client.chat.completions.create(**kwargs)
+            if stream_handler is not None:
+                response = await stream_handler(response)
+        except Exception as e:
+            # A failed attempt produced no tokens; hand its reservation back to the TPM budget
+            if rate_limiter is not None:
+                rate_limiter.reconcile(reserved, 0)
+            if not is_retryable(e):
+                logger.error(f"API call failed with non-retryable error: {e}")
+                raise
+            if circuit_breaker is not None:
+                circuit_breaker.record_failure()
+            if attempt >= max_retries:
+                logger.error(f"Max retries reached for API call: {e}")
+                raise
+
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, BASE_DELAY)
+                if circuit_breaker is not None and isinstance(e, openai.RateLimitError):
+                    circuit_breaker.pause(retry_after)
+            else:
+                delay = backoff_delay(attempt)
+            attempt += 1
+            file_metrics = current_file_metrics.get()
+            if file_metrics is not None:
+                file_metrics.retries += 1
+            logger.warning(f"{type(e).__name__} on API call, retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if circuit_breaker is not None:
+            circuit_breaker.record_success()
+        usage = getattr(response, "usage", None)
+        file_metrics = current_file_metrics.get()
+        if file_metrics is not None:
+            file_metrics.record_usage(usage)
+        if rate_limiter is not None and usage is not None:
+            rate_limiter.reconcile(reserved, usage.total_tokens)
+        return response
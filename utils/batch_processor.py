@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI
+
+from config.settings import BATCH_COMPLETION_WINDOW, BATCH_POLL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def write_batch_input(path: str, requests: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """
+    Write chat completion requests as a Batch API input file.
+
+    Args:
+    path (str): The JSONL file to write.
+    requests (List[Tuple[str, Dict[str, Any]]]): (custom_id, request body) pairs.
+
+    Returns:
+    int: The number of requests written.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for custom_id, body in requests:
+            f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+                               separators=(",", ":")) + "\n")
+    return len(requests)
+
+async def submit_batch(client: AsyncOpenAI, input_path: str, metadata: Optional[Dict[str, str]] = None) -> Any:
+    """Upload a batch input file and create the batch; returns the created batch object."""
+    with open(input_path, 'rb') as f:
+        input_file = await client.files.create(file=f, purpose="batch")
+    batch = await client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                        completion_window=BATCH_COMPLETION_WINDOW, metadata=metadata)
+    logger.info(f"Submitted batch {batch.id} ({input_path})")
+    return batch
+
+async def wait_for_batch(client: AsyncOpenAI, batch_id: str, poll_seconds: float = BATCH_POLL_SECONDS) -> Any:
+    """Poll a batch until it reaches a terminal status and return it."""
+    while True:
+        batch = await client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is not None:
+            logger.info(f"Batch {batch_id} {batch.status}: {counts.completed}/{counts.total} completed, "
+                        f"{counts.failed} failed")
+        else:
+            logger.info(f"Batch {batch_id} {batch.status}")
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        await asyncio.sleep(poll_seconds)
+
+async def download_batch_results(client: AsyncOpenAI, batch: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a finished batch's output and error files.
+
+    Returns:
+    Dict[str, Dict[str, Any]]: Per custom_id, 'content' (the completion text, or None),
+    'finish_reason', 'usage' (the usage dict, or None) and 'error' (a message, or None).
+    """
+    results = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        response = await client.files.content(file_id)
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response_data = record.get("response") or {}
+            body = response_data.get("body") or {}
+            error = record.get("error")
+            if error is None and response_data.get("status_code") != 200:
+                error = body.get("error") or f"HTTP {response_data.get('status_code')}"
+            if error is not None:
+                message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+                results[record["custom_id"]] = {"content": None, "finish_reason": None, "usage": None,
+                                                "error": message}
+                continue
+            results[record["custom_id"]] = {
+                "content": body["choices"][0]["message"]["content"],
+                "finish_reason": body["choices"][0].get("finish_reason"),
+                "usage": body.get("usage"),
+                "error": None,
+            }
+    return results
+
+def load_batch_state(path: str) -> Optional[Dict[str, Any]]:
+    """The state of a batch submitted by an earlier, interrupted run, or None."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_batch_state(path: str, state: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
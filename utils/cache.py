@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(raw_content: str, drawing_type: str, system_message: str, model: str, temperature: float,
+                   max_tokens: int) -> str:
+    """
+    Build the content-addressed key for an LLM structuring result.
+
+    Args:
+    raw_content (str): The extracted text and tables sent as the user message.
+    drawing_type (str): The drawing type the prompt was built for.
+    system_message (str): The full system prompt.
+    model (str): The model name.
+    temperature (float): The sampling temperature.
+    max_tokens (int): The output budget; tiers may share a model but not a budget.
+
+    Returns:
+    str: A hex SHA-256 digest covering every input that affects the response.
+    """
+    digest = hashlib.sha256()
+    for part in (hashlib.sha256(raw_content.encode("utf-8")).hexdigest(), drawing_type, system_message, model, repr(temperature),
+                 str(max_tokens)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def is_cacheable_response(content: Optional[str], finish_reason: Optional[str] = None) -> bool:
+    """Whether a response is worth caching: a complete JSON object, not one cut off at max_tokens."""
+    if content is None or finish_reason == "length":
+        return False
+    try:
+        return isinstance(json.loads(content), dict)
+    except json.JSONDecodeError:
+        return False
+
+class ResultCache:
+    """
+    On-disk SQLite cache of LLM responses with size- and age-based eviction.
+
+    Entries older than max_age_seconds are dropped, then the least recently used
+    entries are dropped until the total payload size fits in max_bytes.
+    With refresh=True lookups always miss but new responses are still stored.
+    """
+
+    def __init__(self, path: str, max_bytes: int, max_age_seconds: float, refresh: bool = False):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._conn = sqlite3.connect(path, timeout=30)  # Shared by the workers of a --distributed run
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.refresh:
+            self.misses += 1
+            return None
+        row = self._conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or now - row[1] > self.max_age_seconds:
+            self.misses += 1
+            return None
+        self._conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode("utf-8")), now, now),
+        )
+        self._conn.commit()
+        self.stores += 1
+
+    def evict(self) -> int:
+        """
+        Drop expired entries, then least recently used entries until under max_bytes.
+
+        Returns:
+        int: The number of entries removed.
+        """
+        removed = self._conn.execute(
+            "DELETE FROM results WHERE created < ?", (time.time() - self.max_age_seconds,)
+        ).rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total > self.max_bytes:
+            victims = []
+            for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY accessed"):
+                if total <= self.max_bytes:
+                    break
+                victims.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM results WHERE key = ?", victims)
+            removed += len(victims)
+        self._conn.commit()
+        self.evictions += removed
+        return removed
+
+    def log_stats(self) -> None:
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0.0
+        logger.info(
+            f"LLM cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+            f"{self.stores} stored, {self.evictions} evicted"
+        )
+
+    def close(self) -> None:
+        self.evict()
+        self.log_stats()
+        self._conn.close()
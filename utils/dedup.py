@@ -0,0 +1,186 @@
+import asyncio
+import difflib
+import hashlib
+import random
+import re
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config.settings import DEDUP_THRESHOLD
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands of 4 rows: pairs from ~0.5 similarity become candidates and are then checked
+ROWS_PER_BAND = NUM_PERMUTATIONS // LSH_BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Fixed seed: signatures must be comparable across every file of a run
+_rng = random.Random(20240917)
+PERMUTATIONS = tuple((_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+                     for _ in range(NUM_PERMUTATIONS))
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[.'/-][a-z0-9]+)*")
+
+def content_words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+def shingle_hashes(words: List[str]) -> set:
+    """Hashes of the overlapping SHINGLE_WORDS-word shingles of a text."""
+    if len(words) <= SHINGLE_WORDS:
+        spans = [" ".join(words)] if words else []
+    else:
+        spans = (" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+    return {int.from_bytes(hashlib.blake2b(span.encode(), digest_size=8).digest(), "big") for span in spans}
+
+def minhash(hashes: set) -> Tuple[int, ...]:
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS)
+
+class Fingerprint(NamedTuple):
+    digest: str  # Of the chunk's words, for exact duplicates
+    signature: Optional[Tuple[int, ...]]  # MinHash of its shingles, for near-duplicates
+
+def fingerprint(text: str, near_duplicates: bool = True) -> Optional[Fingerprint]:
+    """
+    Fingerprint a chunk for DuplicateRegistry.match; None for chunks without words.
+
+    This is the CPU-heavy part of duplicate detection (pure-Python MinHash, a fraction of
+    a second for a large chunk), so callers on the event loop run it in a thread.
+    """
+    words = content_words(text)
+    if not words:
+        return None
+    digest = hashlib.sha256(" ".join(words).encode()).hexdigest()
+    signature = minhash(shingle_hashes(words)) if near_duplicates else None
+    return Fingerprint(digest, signature)
+
+def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(a == b for a, b in zip(left, right)) / NUM_PERMUTATIONS
+
+def apply_structured_diff(base: Any, changes: Any, key: str = "") -> Any:
+    """
+    Apply the changes returned by a diff-only request to a structured result.
+
+    Objects are updated key by key; 'rooms' entries are matched by room number and
+    updated, new rooms are appended; any other value in the changes replaces the base.
+    """
+    if isinstance(base, dict) and isinstance(changes, dict):
+        updated = dict(base)
+        for k, value in changes.items():
+            updated[k] = apply_structured_diff(updated[k], value, k) if k in updated else value
+        return updated
+    if key == "rooms" and isinstance(base, list) and isinstance(changes, list):
+        rooms = list(base)
+        index = {str(room.get("number")): i for i, room in enumerate(rooms)
+                 if isinstance(room, dict) and room.get("number") not in (None, "")}
+        for room in changes:
+            number = str(room.get("number")) if isinstance(room, dict) else None
+            if number in index:
+                rooms[index[number]] = apply_structured_diff(rooms[index[number]], room)
+            else:
+                rooms.append(room)
+        return rooms
+    return changes
+
+class DuplicateEntry:
+    """A representative chunk: its fingerprint, its compressed text and, once done, its result."""
+
+    def __init__(self, source: str, drawing_type: str, signature: Optional[Tuple[int, ...]], digest: str,
+                 text: str):
+        self.source = source
+        self.drawing_type = drawing_type
+        self.signature = signature
+        self.digest = digest
+        self._text = zlib.compress(text.encode())
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.members: List[Dict[str, Any]] = []
+
+    @property
+    def text(self) -> str:
+        return zlib.decompress(self._text).decode()
+
+    def resolve(self, content: str) -> None:
+        if not self.result.done():
+            self.result.set_result(content)
+
+    def fail(self, error: BaseException) -> None:
+        if not self.result.done():
+            self.result.set_exception(error)
+            self.result.exception()  # Members fall back to their own request; nothing else awaits it
+
+    def diff(self, text: str) -> str:
+        """The line diff from this representative's text to another chunk's text."""
+        return "\n".join(difflib.unified_diff(self.text.splitlines(), text.splitlines(), lineterm="", n=0))
+
+class DuplicateRegistry:
+    """
+    Job-wide registry of structured chunks, finding exact and near-duplicate content.
+
+    Each chunk is fingerprinted with MinHash over word shingles and indexed with LSH
+    bands, so a lookup only compares against chunks sharing a band. The first chunk of
+    a cluster is structured as usual; later chunks whose estimated similarity reaches
+    the threshold reuse its result when their words are identical, or are sent as a
+    diff against it.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, near_duplicates: bool = True):
+        self.threshold = threshold
+        self.near_duplicates = near_duplicates
+        self.entries: List[DuplicateEntry] = []
+        self.by_digest: Dict[Tuple[str, str], DuplicateEntry] = {}
+        self.buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[DuplicateEntry]] = {}
+
+    def fingerprint(self, text: str) -> Optional[Fingerprint]:
+        return fingerprint(text, self.near_duplicates)
+
+    def match(self, text: str, drawing_type: str, source: str,
+              chunk_fingerprint: Optional[Fingerprint] = None) -> Tuple[Optional[DuplicateEntry], str, float]:
+        """
+        Find the representative of a chunk, registering the chunk as a new one if none matches.
+
+        Only the index lookup and insert happen here; pass the chunk's fingerprint (from
+        fingerprint(), computed off the event loop) to avoid computing it inline.
+
+        Returns:
+        Tuple[Optional[DuplicateEntry], str, float]: The entry (None for chunks without
+        words), how the chunk relates to it ('representative', 'exact' or 'near') and the
+        estimated similarity.
+        """
+        if chunk_fingerprint is None:
+            chunk_fingerprint = self.fingerprint(text)
+            if chunk_fingerprint is None:
+                return None, "", 0.0
+        digest, signature = chunk_fingerprint
+        exact = self.by_digest.get((drawing_type, digest))
+        if exact is not None:
+            return exact, "exact", 1.0
+
+        bands = []
+        if self.near_duplicates and signature is not None:
+            bands = [(drawing_type, band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+                     for band in range(LSH_BANDS)]
+            best, best_similarity = None, 0.0
+            seen = set()
+            for band in bands:
+                for candidate in self.buckets.get(band, ()):
+                    if id(candidate) in seen:
+                        continue
+                    seen.add(id(candidate))
+                    score = similarity(signature, candidate.signature)
+                    if score >= self.threshold and score > best_similarity:
+                        best, best_similarity = candidate, score
+            if best is not None:
+                return best, "near", best_similarity
+
+        entry = DuplicateEntry(source, drawing_type, signature, digest, text)
+        self.entries.append(entry)
+        self.by_digest[(drawing_type, digest)] = entry
+        for band in bands:
+            self.buckets.setdefault(band, []).append(entry)
+        return entry, "representative", 1.0
+
+    def clusters(self) -> List[Dict[str, Any]]:
+        """The representatives that had duplicates, with each member's similarity and outcome."""
+        return [
+            {"representative": entry.source, "drawing_type": entry.drawing_type, "members": entry.members}
+            for entry in self.entries if entry.members
+        ]
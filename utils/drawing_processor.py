@@ -1,5 +1,24 @@
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 from openai import AsyncOpenAI
 
+from utils.cache import ResultCache, is_cacheable_response, make_cache_key
+from utils.metrics import current_file_metrics
+from utils.api_utils import CircuitBreaker, async_safe_api_call
+from utils.rate_limiter import RateLimiter, estimate_tokens
+from utils.json_stream import IncrementalJsonParser, repair_truncated_json
+from utils.dedup import DuplicateEntry, DuplicateRegistry, apply_structured_diff
+from config.settings import (
+    CHUNKING_MODE, CHUNK_TOKEN_BUDGET, MAX_CONTINUATIONS, SMALL_MODEL, SMALL_MODEL_MAX_TOKENS, STREAM_COMPLETIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.2
+
 DRAWING_INSTRUCTIONS = {
     "Electrical": "Focus on panel schedules, circuit info, equipment schedules with electrical characteristics, and installation notes.",
     "Mechanical": "Capture equipment schedules, HVAC details (CFM, capacities), and installation instructions.",
@@ -20,8 +39,8 @@ DRAWING_INSTRUCTIONS = {
     "General": "Organize all relevant data into logical categories based on content type."
 }
 
-async def process_drawing(raw_content: str, drawing_type: str, client: AsyncOpenAI):
-    system_message = f"""
+def build_system_message(drawing_type: str) -> str:
+    return f"""
     Parse this {drawing_type} drawing/schedule into a structured JSON format. Guidelines:
     1. For text: Extract key information, categorize elements.
     2. For tables: Preserve structure, use nested arrays/objects.
@@ -31,19 +50,376 @@ async def process_drawing(raw_content: str, drawing_type: str, client: AsyncOpen
     6. For all drawing types, if room information is present, always include a 'rooms' array in the JSON output, with each room having at least 'number' and 'name' fields.
     Ensure the entire response is a valid JSON object.
     """
+
+MAX_TOKENS = 16000
+
+# Model and output budget per sheet tier (see utils.sheet_classifier)
+TIER_MODELS = {
+    "full": (MODEL, MAX_TOKENS),
+    "small": (SMALL_MODEL, SMALL_MODEL_MAX_TOKENS),
+}
+
+def build_request(raw_content: str, drawing_type: str, tier: str = "full") -> Dict[str, Any]:
+    """The chat completion arguments used to structure one chunk of a drawing."""
+    model, max_tokens = TIER_MODELS[tier]
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": build_system_message(drawing_type)},
+            {"role": "user", "content": raw_content}
+        ],
+        "temperature": TEMPERATURE,
+        "max_tokens": max_tokens,
+        "response_format": {"type": "json_object"},
+    }
+
+CONTINUATION_PROMPT = (
+    "Your previous response was cut off at the output token limit. The JSON above is the part of it that "
+    "was kept. Return a JSON object with the same structure containing only the data that is not in it yet."
+)
+
+# Called with the key path of its array and the element, e.g. (('rooms',), {...})
+ItemCallback = Callable[[Tuple[str, ...], Dict[str, Any]], None]
+
+class StreamedCompletion(NamedTuple):
+    content: str
+    finish_reason: Optional[str]
+    usage: Any
+
+DIFF_INSTRUCTIONS = """
+    This drawing is a revision or copy of one that was already structured. The user message holds the
+    earlier structured JSON and a diff of the extracted content (lines starting with '-' were removed,
+    lines starting with '+' were added). Return a JSON object with the same structure containing only
+    the values that change or are added; for rooms include 'number' and the changed fields. Return {}
+    if nothing in the structured data changes.
+    """
+DIFF_MAX_TOKENS = 4000
+
+def build_diff_request(base_content: str, diff: str, drawing_type: str) -> Dict[str, Any]:
+    """The request asking only for the changes a diff makes to an already structured result."""
+    request = build_request(f"STRUCTURED JSON:\n{base_content}\n\nDIFF:\n{diff}\n", drawing_type)
+    request["messages"][0]["content"] += DIFF_INSTRUCTIONS
+    request["max_tokens"] = DIFF_MAX_TOKENS
+    return request
+
+def continuation_request(request: Dict[str, Any], kept: Dict[str, Any]) -> Dict[str, Any]:
+    """The request asking for the rest of a response that was cut off at max_tokens."""
+    return dict(request, messages=request["messages"] + [
+        {"role": "assistant", "content": json.dumps(kept)},
+        {"role": "user", "content": CONTINUATION_PROMPT},
+    ])
+
+async def request_completion(client: AsyncOpenAI, request: Dict[str, Any], rate_limiter: Optional[RateLimiter] = None,
+                             circuit_breaker: Optional[CircuitBreaker] = None, stream: bool = STREAM_COMPLETIONS,
+                             on_item: Optional[ItemCallback] = None) -> Tuple[str, Optional[str]]:
+    """
+    Make one chat completion and return its content and finish_reason.
+
+    With stream=True the completion is consumed as it is generated and fed through an
+    incremental JSON parser, calling on_item for each array element (room, schedule row)
+    as soon as it is complete.
+    """
+    if not stream:
+        response = await async_safe_api_call(client, rate_limiter, circuit_breaker, **request)
+        choice = response.choices[0]
+        return choice.message.content, choice.finish_reason
+
+    async def consume(completion_stream) -> StreamedCompletion:
+        parser = IncrementalJsonParser()
+        finish_reason = None
+        usage = None
+        async for chunk in completion_stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            for choice in chunk.choices:
+                if choice.delta.content:
+                    items = parser.feed(choice.delta.content)
+                    if on_item is not None:
+                        for path, item in items:
+                            on_item(path, item)
+                if choice.finish_reason is not None:
+                    finish_reason = choice.finish_reason
+        return StreamedCompletion(parser.text(), finish_reason, usage)
+
+    completion = await async_safe_api_call(client, rate_limiter, circuit_breaker, stream_handler=consume,
+                                           stream=True, stream_options={"include_usage": True}, **request)
+    return completion.content, completion.finish_reason
+
+def drawing_cache_key(raw_content: str, drawing_type: str, tier: str = "full") -> str:
+    model, max_tokens = TIER_MODELS[tier]
+    return make_cache_key(raw_content, drawing_type, build_system_message(drawing_type), model, TEMPERATURE,
+                          max_tokens)
+
+async def process_drawing(raw_content: str, drawing_type: str, client: AsyncOpenAI, cache: Optional[ResultCache] = None,
+                          rate_limiter: Optional[RateLimiter] = None, circuit_breaker: Optional[CircuitBreaker] = None,
+                          stream: bool = STREAM_COMPLETIONS, on_item: Optional[ItemCallback] = None,
+                          duplicates: Optional[DuplicateRegistry] = None, source: str = "", tier: str = "full"):
+    cache_key = None
+    if cache is not None:
+        cache_key = drawing_cache_key(raw_content, drawing_type, tier)
+        cached = cache.get(cache_key)
+        file_metrics = current_file_metrics.get()
+        if file_metrics is not None:
+            if cached is not None:
+                file_metrics.cache_hits += 1
+            else:
+                file_metrics.cache_misses += 1
+        if cached is not None:
+            return cached
     
+    duplicate, relation, score = None, "", 0.0
+    if duplicates is not None:
+        # Fingerprinting is CPU-bound; only the index lookup and insert run on the event loop
+        chunk_fingerprint = await asyncio.to_thread(duplicates.fingerprint, raw_content)
+        if chunk_fingerprint is not None:
+            duplicate, relation, score = duplicates.match(raw_content, drawing_type, source, chunk_fingerprint)
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": raw_content}
-            ],
-            temperature=0.2,
-            max_tokens=16000,
-            response_format={"type": "json_object"}
-        )
-        return response.choices[0].message.content
+        content, finish_reason = None, None
+        if duplicate is not None and relation != "representative":
+            content = await structure_duplicate(duplicate, relation, score, raw_content, drawing_type, source, client,
+                                                rate_limiter, circuit_breaker)
+        if content is None:
+            content, finish_reason = await structure_content(raw_content, drawing_type, client, rate_limiter,
+                                                             circuit_breaker, stream, on_item, tier)
+        if relation == "representative":
+            duplicate.resolve(content)
+
+        # Broken or cut-off responses are not cached, so a rerun asks again instead of replaying them
+        if cache is not None and is_cacheable_response(content, finish_reason):
+            cache.put(cache_key, content)
+        return content
     except Exception as e:
+        if relation == "representative":
+            duplicate.fail(e)
         print(f"Error processing {drawing_type} drawing: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def structure_content(raw_content: str, drawing_type: str, client: AsyncOpenAI,
+                            rate_limiter: Optional[RateLimiter] = None, circuit_breaker: Optional[CircuitBreaker] = None,
+                            stream: bool = STREAM_COMPLETIONS, on_item: Optional[ItemCallback] = None,
+                            tier: str = "full") -> Tuple[str, Optional[str]]:
+    """
+    Structure content with a full request, continuing it if it is cut off at max_tokens.
+
+    Returns the content and the finish_reason of the last request ('length' if the
+    response is still incomplete after MAX_CONTINUATIONS continuations).
+    """
+    request = build_request(raw_content, drawing_type, tier)
+    content, finish_reason = await request_completion(client, request, rate_limiter, circuit_breaker,
+                                                      stream, on_item)
+
+    # A response cut off at max_tokens keeps its complete part; the rest is asked for
+    # in a continuation request and merged in, instead of failing the sheet.
+    kept = None
+    for continuation in range(MAX_CONTINUATIONS):
+        if finish_reason != "length":
+            break
+        partial = repair_truncated_json(content)
+        if partial is None:
+            break
+        kept = partial if kept is None else merge_structured_results(kept, partial)
+        logger.warning(f"{drawing_type} response cut off at max_tokens after {len(content)} characters, "
+                       f"requesting continuation {continuation + 1}/{MAX_CONTINUATIONS}")
+        file_metrics = current_file_metrics.get()
+        if file_metrics is not None:
+            file_metrics.continuations += 1
+        content, finish_reason = await request_completion(client, continuation_request(request, kept),
+                                                          rate_limiter, circuit_breaker, stream, on_item)
+    if kept is not None:
+        if finish_reason == "length":
+            last = repair_truncated_json(content)
+        else:
+            try:
+                last = json.loads(content)
+            except json.JSONDecodeError:
+                last = None
+        content = json.dumps(merge_structured_results(kept, last) if isinstance(last, dict) else kept)
+    return content, finish_reason
+
+async def structure_duplicate(entry: DuplicateEntry, relation: str, score: float, raw_content: str, drawing_type: str,
+                              source: str, client: AsyncOpenAI, rate_limiter: Optional[RateLimiter] = None,
+                              circuit_breaker: Optional[CircuitBreaker] = None) -> Optional[str]:
+    """
+    Structure a duplicate chunk from its representative's result: exact copies reuse it and
+    near-duplicates are sent as a diff-only request against it.
+
+    Returns:
+    Optional[str]: The structured JSON, or None if the chunk needs a full request (the
+    representative failed, or the diff request did not give usable JSON).
+    """
+    member = {"source": source, "similarity": round(score, 3), "outcome": "reused" if relation == "exact" else "diff"}
+    entry.members.append(member)
+    try:
+        base_content = await asyncio.shield(entry.result)
+    except Exception:
+        member["outcome"] = "full request"
+        return None
+
+    file_metrics = current_file_metrics.get()
+    if relation == "exact":
+        if file_metrics is not None:
+            file_metrics.duplicates_reused += 1
+        return base_content
+
+    base = changes = None
+    try:
+        base = json.loads(base_content)
+        diff = await asyncio.to_thread(entry.diff, raw_content)
+        content, finish_reason = await request_completion(client, build_diff_request(base_content, diff, drawing_type),
+                                                          rate_limiter, circuit_breaker, stream=False)
+        changes = json.loads(content) if finish_reason != "length" else None
+    except json.JSONDecodeError:
+        pass
+    if not isinstance(base, dict) or not isinstance(changes, dict):
+        member["outcome"] = "full request"
+        return None
+    if file_metrics is not None:
+        file_metrics.duplicates_diffed += 1
+    return json.dumps(apply_structured_diff(base, changes))
+
+def chunk_pages(pages: List[str], mode: str = CHUNKING_MODE, token_budget: int = CHUNK_TOKEN_BUDGET) -> List[List[str]]:
+    """
+    Group extracted pages into chunks that are structured by separate requests.
+
+    Args:
+    pages (List[str]): Per-page extracted content.
+    mode (str): "off" for a single chunk, "page" for one chunk per page, or "tokens" to pack
+        consecutive pages into chunks of at most token_budget estimated tokens.
+    token_budget (int): Maximum estimated input tokens per chunk in "tokens" mode. A single
+        page larger than the budget still becomes its own chunk.
+
+    Returns:
+    List[List[str]]: The chunks, in page order.
+    """
+    if mode == "off" or len(pages) <= 1:
+        return [pages]
+    if mode == "page":
+        return [[page] for page in pages]
+
+    chunks = []
+    current, current_tokens = [], 0
+    for page in pages:
+        page_tokens = estimate_tokens(page)
+        if current and current_tokens + page_tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(page)
+        current_tokens += page_tokens
+    chunks.append(current)
+    return chunks
+
+def _dedupe_key(item: Any) -> str:
+    return json.dumps(item, sort_keys=True)
+
+def _merge_lists(key: str, left: list, right: list) -> list:
+    merged = list(left)
+    if key == "rooms":
+        # Rooms split across chunks are merged field by field, keyed by room number.
+        by_number = {str(room.get("number")): i for i, room in enumerate(merged)
+                     if isinstance(room, dict) and room.get("number") not in (None, "")}
+        for room in right:
+            number = str(room.get("number")) if isinstance(room, dict) and room.get("number") not in (None, "") else None
+            if number is not None and number in by_number:
+                merged[by_number[number]] = merge_structured_results(merged[by_number[number]], room)
+            else:
+                if number is not None:
+                    by_number[number] = len(merged)
+                merged.append(room)
+        return merged
+
+    seen = {_dedupe_key(item) for item in merged}
+    for item in right:
+        item_key = _dedupe_key(item)
+        if item_key not in seen:
+            seen.add(item_key)
+            merged.append(item)
+    return merged
+
+def merge_structured_results(left: Any, right: Any, key: str = "") -> Any:
+    """
+    Deterministically merge two partial JSON results for the same drawing.
+
+    Objects are merged key by key, arrays are concatenated without exact duplicates
+    ('rooms' entries are de-duplicated and merged by room number), and for scalars
+    the first non-empty value wins.
+
+    Args:
+    left (Any): The result of the earlier chunk.
+    right (Any): The result of the later chunk.
+    key (str): The key both values were found under, if any.
+
+    Returns:
+    Any: The merged value.
+    """
+    if isinstance(left, dict) and isinstance(right, dict):
+        merged = dict(left)
+        for k, value in right.items():
+            merged[k] = merge_structured_results(merged[k], value, k) if k in merged else value
+        return merged
+    if isinstance(left, list) and isinstance(right, list):
+        return _merge_lists(key, left, right)
+    if left in (None, "", [], {}):
+        return right
+    return left
+
+async def process_drawing_chunked(pages: List[str], drawing_type: str, client: AsyncOpenAI, cache: Optional[ResultCache] = None,
+                                  rate_limiter: Optional[RateLimiter] = None, circuit_breaker: Optional[CircuitBreaker] = None,
+                                  mode: str = CHUNKING_MODE, token_budget: int = CHUNK_TOKEN_BUDGET,
+                                  stream: bool = STREAM_COMPLETIONS, on_item: Optional[ItemCallback] = None,
+                                  duplicates: Optional[DuplicateRegistry] = None, source: str = "",
+                                  tier: str = "full") -> str:
+    """
+    Structure a drawing chunk by chunk, concurrently, and merge the partial results.
+
+    Falls back to a single process_drawing call when the pages fit in one chunk.
+
+    Args:
+    pages (List[str]): Per-page extracted content.
+    drawing_type (str): The drawing type.
+    client (AsyncOpenAI): The OpenAI client.
+    cache (Optional[ResultCache]): Cache for per-chunk results.
+    rate_limiter (Optional[RateLimiter]): The shared rate limiter.
+    circuit_breaker (Optional[CircuitBreaker]): The shared circuit breaker.
+    mode (str): Chunking mode, see chunk_pages.
+    token_budget (int): Token budget per chunk, see chunk_pages.
+    stream (bool): Stream completions, see request_completion.
+    on_item (Optional[ItemCallback]): Called with each room or schedule row as it streams in.
+    duplicates (Optional[DuplicateRegistry]): Job-wide registry used to structure repeated
+        chunks only once.
+    source (str): Label of the drawing (its path) for the duplicate clusters report.
+    tier (str): The sheet's tier, 'full' or 'small', selecting the model and output budget.
+
+    Returns:
+    str: The merged JSON document. If any chunk is not valid JSON, the raw chunk
+    responses are returned joined by newlines so the caller can record them.
+    """
+    chunks = chunk_pages(pages, mode, token_budget)
+    if len(chunks) == 1:
+        return await process_drawing("".join(chunks[0]), drawing_type, client, cache, rate_limiter, circuit_breaker,
+                                     stream, on_item, duplicates, source, tier)
+
+    responses = await asyncio.gather(*(
+        process_drawing("".join(chunk), drawing_type, client, cache, rate_limiter, circuit_breaker, stream, on_item,
+                        duplicates, f"{source}#{i + 1}", tier)
+        for i, chunk in enumerate(chunks)
+    ))
+    return merge_chunk_responses(responses)
+
+def merge_chunk_responses(responses: List[str]) -> str:
+    """
+    Merge the responses of a drawing's chunks, in chunk order, into one JSON document.
+
+    A single response is returned unchanged. If any response is not valid JSON, the raw
+    responses are returned joined by newlines so the caller can record them.
+    """
+    if len(responses) == 1:
+        return responses[0]
+    try:
+        partials = [json.loads(response) for response in responses]
+    except json.JSONDecodeError:
+        return "\n".join(responses)
+
+    merged = partials[0]
+    for partial in partials[1:]:
+        merged = merge_structured_results(merged, partial)
+    return json.dumps(merged)
@@ -1,60 +1,190 @@
 import os
+import json
+import asyncio
+import fnmatch
 import logging
-from typing import List, Optional
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from config.settings import DISCOVERY_WORKERS
 
 logger = logging.getLogger(__name__)
 
-def get_drawing_type(file_path: str, job_folder: str) -> Optional[str]:
+class FileIndex:
     """
-    Determine the drawing type based on the file path and job folder.
-    
+    Persistent listing of the PDFs and subdirectories of every directory under a job folder.
+
+    Each directory entry is keyed on its path and records the directory's mtime together
+    with the (name, size, mtime) of its PDFs. A directory whose mtime is unchanged since the
+    last run is not listed again, so repeat runs only stat directories and rescan the
+    changed ones.
+
+    Args:
+    path (str): JSON file the index is persisted to.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dirs: Dict[str, Dict[str, Any]] = {}
+        self.rescanned = 0
+        self.reused = 0
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.dirs = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Ignoring unreadable file index {path}: {str(e)}")
+
+    def save(self) -> None:
+        """
+        Write the index atomically. Several --distributed workers may save the same index at
+        once, so each writes its own temporary file and the last replace wins; the index is
+        only an optimization, so a failed save is logged rather than raised.
+        """
+        folder = os.path.dirname(self.path) or '.'
+        tmp_path = None
+        try:
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=os.path.basename(self.path) + '.', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.dirs, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save file index {self.path}: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def _scan_dir(path: str, cached: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+    """List one directory with os.scandir, or reuse the cached listing if its mtime is unchanged."""
+    mtime = os.stat(path).st_mtime
+    if cached is not None and cached.get('mtime') == mtime:
+        return cached, False
+
+    files, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.name.lower().endswith('.pdf') and entry.is_file():
+                stat = entry.stat()
+                files.append([entry.name, stat.st_size, stat.st_mtime])
+    return {'mtime': mtime, 'files': files, 'subdirs': subdirs}, True
+
+def _matches(relative_path: str, patterns: Optional[List[str]]) -> bool:
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(os.path.basename(relative_path), pattern)
+               for pattern in patterns or [])
+
+def _is_wanted(relative_path: str, include: Optional[List[str]], exclude: Optional[List[str]],
+               sheet_prefixes: Optional[List[str]]) -> bool:
+    if include and not _matches(relative_path, include):
+        return False
+    if _matches(relative_path, exclude):
+        return False
+    if sheet_prefixes:
+        name = os.path.basename(relative_path).upper()
+        return any(name.startswith(prefix.upper()) for prefix in sheet_prefixes)
+    return True
+
+def _relative(path: str, job_folder: str) -> str:
+    return os.path.relpath(path, job_folder).replace(os.sep, '/')
+
+async def discover_pdf_files(job_folder: str, include: Optional[List[str]] = None,
+                             exclude: Optional[List[str]] = None, sheet_prefixes: Optional[List[str]] = None,
+                             file_index: Optional[FileIndex] = None, skip_dirs: Optional[List[str]] = None,
+                             max_workers: int = DISCOVERY_WORKERS) -> AsyncIterator[str]:
+    """
+    Find PDFs under a job folder, yielding each one as soon as its directory is listed.
+
+    Directories are listed concurrently in a thread pool, which hides the per-directory
+    latency of network shares.
+
     Args:
-    file_path (str): The full path to the PDF file.
     job_folder (str): The root job folder path.
+    include (Optional[List[str]]): Glob patterns a PDF's path (relative to the job folder,
+        with '/' separators) or file name must match; all PDFs when empty.
+    exclude (Optional[List[str]]): Glob patterns for PDFs and directories to skip, e.g.
+        '*/Superseded'. Excluded directories are not descended into.
+    sheet_prefixes (Optional[List[str]]): Only yield PDFs whose file name starts with one
+        of these prefixes (case-insensitive), e.g. ['A', 'E'].
+    file_index (Optional[FileIndex]): Index of earlier listings to reuse; updated in place.
+    skip_dirs (Optional[List[str]]): Absolute directories never to descend into, e.g. an
+        output folder inside the job folder.
+    max_workers (int): Number of directories listed concurrently.
 
-    Returns:
-    Optional[str]: The determined drawing type, or None if it can't be determined.
+    Yields:
+    str: Full paths of matching PDF files.
     """
-    relative_path = os.path.relpath(file_path, job_folder)
-    path_components = relative_path.lower().split(os.sep)
-
-    drawing_types = {
-        "architectural": ["architectural", "arch", "a"],
-        "electrical": ["electrical", "elec", "e"],
-        "mechanical": ["mechanical", "mech", "m"],
-        "plumbing": ["plumbing", "plumb", "p"],
-        "structural": ["structural", "struct", "s"],
-        "kitchen": ["kitchen", "kit", "k"],
-        "civil": ["civil", "civ", "c"],
-        "fire_protection": ["fire protection", "fire", "fp"],
-        "low_voltage": ["low voltage", "low-voltage", "lv"],
-        # Add more drawing types here as needed
-    }
-
-    for component in path_components:
-        for drawing_type, keywords in drawing_types.items():
-            if any(keyword in component for keyword in keywords):
-                return drawing_type
-
-    logger.warning(f"Could not determine drawing type for {file_path}")
-    return None
-
-def traverse_job_folder(job_folder: str) -> List[str]:
+    loop = asyncio.get_running_loop()
+    skip = {os.path.abspath(d) for d in skip_dirs or []}
+    cached_dirs = file_index.dirs if file_index is not None else {}
+    seen_dirs: Dict[str, Dict[str, Any]] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending: Dict[asyncio.Future, str] = {}
+
+        def submit(path):
+            pending[loop.run_in_executor(pool, _scan_dir, path, cached_dirs.get(path))] = path
+
+        submit(job_folder)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    listing, rescanned = future.result()
+                except OSError as e:
+                    logger.error(f"Error scanning {path}: {str(e)}")
+                    continue
+                seen_dirs[path] = listing
+                if file_index is not None:
+                    file_index.rescanned += rescanned
+                    file_index.reused += not rescanned
+
+                for name in listing['subdirs']:
+                    subdir = os.path.join(path, name)
+                    if os.path.abspath(subdir) in skip or _matches(_relative(subdir, job_folder), exclude):
+                        continue
+                    submit(subdir)
+                for name, _, _ in listing['files']:
+                    file_path = os.path.join(path, name)
+                    if _is_wanted(_relative(file_path, job_folder), include, exclude, sheet_prefixes):
+                        yield file_path
+
+    if file_index is not None:
+        # Drop directories that no longer exist or were not visited
+        file_index.dirs = seen_dirs
+        file_index.save()
+        logger.info(f"File index: {file_index.rescanned} directories scanned, {file_index.reused} reused")
+
+def traverse_job_folder(job_folder: str, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                        sheet_prefixes: Optional[List[str]] = None) -> List[str]:
     """
     Traverse the job folder and collect all PDF files.
 
     Args:
     job_folder (str): The root job folder path to traverse.
+    include (Optional[List[str]]): Glob patterns PDFs must match (see discover_pdf_files).
+    exclude (Optional[List[str]]): Glob patterns for PDFs and directories to skip.
+    sheet_prefixes (Optional[List[str]]): File name prefixes to keep.
 
     Returns:
     List[str]: A list of full file paths to all PDF files found.
     """
     pdf_files = []
     try:
-        for root, _, files in os.walk(job_folder):
-            for file in files:
-                if file.lower().endswith('.pdf'):
-                    pdf_files.append(os.path.join(root, file))
+        pending = [job_folder]
+        while pending:
+            path = pending.pop()
+            listing, _ = _scan_dir(path, None)
+            for name in listing['subdirs']:
+                subdir = os.path.join(path, name)
+                if not _matches(_relative(subdir, job_folder), exclude):
+                    pending.append(subdir)
+            for name, _, _ in listing['files']:
+                file_path = os.path.join(path, name)
+                if _is_wanted(_relative(file_path, job_folder), include, exclude, sheet_prefixes):
+                    pdf_files.append(file_path)
         logger.info(f"Found {len(pdf_files)} PDF files in {job_folder}")
     except Exception as e:
         logger.error(f"Error traversing job folder {job_folder}: {str(e)}")
@@ -0,0 +1,118 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+CLOSERS = {"{": "}", "[": "]"}
+
+class IncrementalJsonParser:
+    """
+    Parse a JSON object as it streams in, chunk by chunk.
+
+    feed() returns the array elements that became complete with that chunk: every object
+    that is a direct element of an array (a room, a schedule row, a panel), together with
+    the key path of its array such as ('rooms',) or ('schedules', 'panels'). Elements
+    nested inside an already reported element are not reported separately.
+
+    The parser also remembers the last point at which every value so far was complete, so
+    repaired() can turn a truncated document into valid JSON holding everything before it.
+    """
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.length = 0
+        # One frame per open container: [opener, key path, current key, element start or None]
+        self.stack: List[list] = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.expect_key = False
+        self.item_depth = 0  # Number of open frames that are reported elements
+        self.checkpoint: Tuple[int, str] = (0, "")  # (length of complete prefix, openers still open)
+
+    def text(self) -> str:
+        return self._joined()
+
+    def _joined(self) -> str:
+        if len(self.buffer) > 1:
+            self.buffer = ["".join(self.buffer)]
+        return self.buffer[0] if self.buffer else ""
+
+    def feed(self, chunk: str) -> List[Tuple[Tuple[str, ...], Any]]:
+        items = []
+        start = self.length
+        self.buffer.append(chunk)
+        self.length += len(chunk)
+        text = None  # Joined lazily, only when a key or an element completes
+
+        for offset, char in enumerate(chunk):
+            pos = start + offset
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.expect_key and self.stack and self.stack[-1][0] == "{":
+                        text = text or self._joined()
+                        self.stack[-1][2] = json.loads(text[self.string_start:pos + 1])
+                        self.expect_key = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = pos
+            elif char in "{[":
+                parent = self.stack[-1] if self.stack else None
+                if parent is None:
+                    path = ()
+                elif parent[0] == "{":
+                    path = parent[1] + (parent[2],)
+                else:
+                    path = parent[1]
+                element_start = pos if (char == "{" and parent is not None and parent[0] == "["
+                                        and self.item_depth == 0) else None
+                if element_start is not None:
+                    self.item_depth += 1
+                self.stack.append([char, path, None, element_start])
+                self.expect_key = char == "{"
+            elif char in "}]":
+                if not self.stack:
+                    continue
+                frame = self.stack.pop()
+                if frame[3] is not None:
+                    self.item_depth -= 1
+                    text = text or self._joined()
+                    items.append((frame[1], json.loads(text[frame[3]:pos + 1])))
+                self.checkpoint = (pos + 1, "".join(f[0] for f in self.stack))
+                self.expect_key = False
+            elif char == ",":
+                if self.stack:
+                    self.checkpoint = (pos, "".join(f[0] for f in self.stack))
+                    self.expect_key = self.stack[-1][0] == "{"
+        return items
+
+    @property
+    def complete(self) -> bool:
+        return self.length > 0 and not self.stack and not self.in_string and self.checkpoint[0] > 0
+
+    def repaired(self) -> Optional[Any]:
+        """
+        The document up to the last complete value, with its open containers closed.
+
+        Returns:
+        Optional[Any]: The parsed partial document, or None if nothing complete was seen.
+        """
+        end, open_containers = self.checkpoint
+        if end == 0:
+            return None
+        prefix = self.text()[:end].rstrip().rstrip(",")
+        try:
+            return json.loads(prefix + "".join(CLOSERS[opener] for opener in reversed(open_containers)))
+        except json.JSONDecodeError:
+            return None
+
+def repair_truncated_json(text: str) -> Optional[Any]:
+    """Parse a JSON document cut off part way, keeping every value completed before the cut."""
+    parser = IncrementalJsonParser()
+    parser.feed(text)
+    return parser.repaired()
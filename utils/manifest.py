@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a file's contents.
+
+    Args:
+    file_path (str): The file to hash.
+    chunk_size (int): Bytes read per iteration.
+
+    Returns:
+    str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class JobManifest:
+    """
+    Persistent record of every source file processed into an output folder.
+
+    Entries are keyed by source path and hold the file's size, mtime and content hash,
+    its drawing type, output path, status and timings. The manifest is rewritten
+    atomically (temp file + os.replace) after every update so a crashed run loses nothing.
+    """
+
+    def __init__(self, output_folder: str):
+        self.path = os.path.join(output_folder, MANIFEST_FILENAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f).get('files', {})
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+
+    def is_up_to_date(self, pdf_path: str) -> bool:
+        """
+        Check whether a file was already processed successfully and has not changed since.
+
+        Size and mtime are compared first; the content hash is only computed when they
+        differ, so a copied or touched but otherwise identical file is still skipped.
+
+        Args:
+        pdf_path (str): The source PDF.
+
+        Returns:
+        bool: True if the previous successful result can be reused.
+        """
+        entry = self.entries.get(pdf_path)
+        if not entry or entry.get('status') != 'success':
+            return False
+        if not entry.get('output_path') or not os.path.exists(entry['output_path']):
+            return False
+
+        stat = os.stat(pdf_path)
+        if stat.st_size == entry.get('size') and stat.st_mtime == entry.get('mtime'):
+            return True
+        if stat.st_size != entry.get('size') or hash_file(pdf_path) != entry.get('content_hash'):
+            return False
+
+        entry['mtime'] = stat.st_mtime
+        self.save()
+        return True
+
+    def get(self, pdf_path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(pdf_path)
+
+    def record(self, pdf_path: str, drawing_type: str, status: str, output_path: Optional[str] = None,
+               started: Optional[float] = None, error: Optional[str] = None,
+               content_hash: Optional[str] = None) -> None:
+        """
+        Record the outcome of processing a file and persist the manifest.
+
+        Args:
+        pdf_path (str): The source PDF.
+        drawing_type (str): The drawing type it was processed as.
+        status (str): "success" or "failed".
+        output_path (Optional[str]): The structured JSON written for the file.
+        started (Optional[float]): time.time() when processing started.
+        error (Optional[str]): The error message for failures.
+        content_hash (Optional[str]): The file's SHA-256, if already computed.
+        """
+        stat = os.stat(pdf_path)
+        finished = time.time()
+        self.entries[pdf_path] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'content_hash': content_hash or hash_file(pdf_path),
+            'drawing_type': drawing_type,
+            'output_path': output_path,
+            'status': status,
+            'error': error,
+            'started': started,
+            'finished': finished,
+            'duration': finished - started if started is not None else None,
+        }
+        self.save()
+
+    def save(self) -> None:
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'files': self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
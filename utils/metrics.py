@@ -0,0 +1,308 @@
+import csv
+import json
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import PROMPT_COST_PER_MILLION, COMPLETION_COST_PER_MILLION
+
+logger = logging.getLogger(__name__)
+
+# The metrics of the file the current task is working on. Set by the pipeline so that
+# deeper layers (API calls, the cache) can attribute tokens, retries and hits to it.
+current_file_metrics: ContextVar[Optional["FileMetrics"]] = ContextVar("current_file_metrics", default=None)
+
+PERCENTILES = (50, 95, 99)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+class FileMetrics:
+    """Stage timings, token usage, retries and cache hits for one processed file."""
+
+    def __init__(self, file: str, drawing_type: str):
+        self.file = file
+        self.drawing_type = drawing_type
+        self.status: Optional[str] = None
+        self.stages: Dict[str, float] = {}
+        self.api_calls = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Estimated prompt tokens of the extracted pages before and after prompt compression
+        self.input_tokens_before = 0
+        self.input_tokens_after = 0
+        # Streaming: seconds from the start of processing to the first complete room or
+        # schedule row, elements received, and continuations after max_tokens cut-offs
+        self.first_item_seconds: Optional[float] = None
+        self.streamed_items = 0
+        self.continuations = 0
+        # Chunks structured from a duplicate's result: reused as is, or with a diff-only request
+        self.duplicates_reused = 0
+        self.duplicates_diffed = 0
+        # Relative token price, e.g. BATCH_PRICE_FACTOR for requests sent through the Batch API
+        self.price_factor = 1.0
+        # Sheet tier ('skip', 'parser', 'small' or 'full'), the price of its model relative to the
+        # full model, and the estimated prompt tokens a sheet structured without a request did not send
+        self.tier: Optional[str] = None
+        self.model_price_factor = 1.0
+        self.skipped_prompt_tokens = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FileMetrics":
+        """Rebuild a file's metrics from its entry in a run report."""
+        file_metrics = cls(data["file"], data["drawing_type"])
+        for name, value in data.items():
+            if name in ("stages", "total_seconds", "cost", "saved_cost", "file", "drawing_type"):
+                continue
+            setattr(file_metrics, name, value)
+        file_metrics.stages = dict(data.get("stages") or {})
+        return file_metrics
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block (which may contain awaits) and add it to the named stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_usage(self, usage: Any) -> None:
+        self.api_calls += 1
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    @property
+    def full_model_cost(self) -> float:
+        return self.price_factor * (self.prompt_tokens * PROMPT_COST_PER_MILLION
+                                    + self.completion_tokens * COMPLETION_COST_PER_MILLION) / 1_000_000
+
+    @property
+    def cost(self) -> float:
+        return self.model_price_factor * self.full_model_cost
+
+    @property
+    def saved_cost(self) -> Optional[float]:
+        """
+        Estimated saving of the sheet's tier over the full model (prompt tokens only for sheets
+        without a request); None when its tier costs the same as the full model.
+        """
+        if not self.skipped_prompt_tokens and self.model_price_factor >= 1.0:
+            return None
+        skipped = self.price_factor * self.skipped_prompt_tokens * PROMPT_COST_PER_MILLION / 1_000_000
+        return skipped + self.full_model_cost - self.cost
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file": self.file,
+            "drawing_type": self.drawing_type,
+            "status": self.status,
+            "stages": dict(self.stages),
+            "total_seconds": sum(self.stages.values()),
+            "api_calls": self.api_calls,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": self.cost,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "input_tokens_before": self.input_tokens_before,
+            "input_tokens_after": self.input_tokens_after,
+            "first_item_seconds": self.first_item_seconds,
+            "streamed_items": self.streamed_items,
+            "continuations": self.continuations,
+            "duplicates_reused": self.duplicates_reused,
+            "duplicates_diffed": self.duplicates_diffed,
+            "price_factor": self.price_factor,
+            "tier": self.tier,
+            "model_price_factor": self.model_price_factor,
+            "skipped_prompt_tokens": self.skipped_prompt_tokens,
+            "saved_cost": self.saved_cost,
+        }
+
+class RunMetrics:
+    """Collects FileMetrics for a whole run and writes the run report."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.files: List[FileMetrics] = []
+        # Set by the pipeline when duplicate detection is on, see DuplicateRegistry.clusters
+        self.duplicate_clusters: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_reports(cls, reports: List[Dict[str, Any]]) -> "RunMetrics":
+        """Combine run_report.json contents, e.g. those of several distributed workers."""
+        run_metrics = cls()
+        if reports:
+            run_metrics.started = min(report["started"] for report in reports)
+        for report in reports:
+            run_metrics.files.extend(FileMetrics.from_dict(data) for data in report["files"])
+            run_metrics.duplicate_clusters.extend(report.get("duplicate_clusters", []))
+        return run_metrics
+
+    def start_file(self, file: str, drawing_type: str) -> FileMetrics:
+        file_metrics = FileMetrics(file, drawing_type)
+        self.files.append(file_metrics)
+        return file_metrics
+
+    def summary(self) -> Dict[str, Any]:
+        """Per drawing type counts, token and cost totals, and p50/p95/p99 of every stage."""
+        by_type: Dict[str, List[FileMetrics]] = {}
+        for file_metrics in self.files:
+            by_type.setdefault(file_metrics.drawing_type, []).append(file_metrics)
+
+        summary = {}
+        for drawing_type, files in sorted(by_type.items()):
+            stage_names = sorted({name for f in files for name in f.stages})
+            stages = {}
+            for name in stage_names + ["total"]:
+                if name == "total":
+                    values = [sum(f.stages.values()) for f in files if f.stages]
+                else:
+                    values = [f.stages[name] for f in files if name in f.stages]
+                if values:
+                    stages[name] = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+            summary[drawing_type] = {
+                "files": len(files),
+                "statuses": {status: sum(f.status == status for f in files)
+                             for status in sorted({str(f.status) for f in files})},
+                "api_calls": sum(f.api_calls for f in files),
+                "retries": sum(f.retries for f in files),
+                "prompt_tokens": sum(f.prompt_tokens for f in files),
+                "completion_tokens": sum(f.completion_tokens for f in files),
+                "cost": sum(f.cost for f in files),
+                "cache_hits": sum(f.cache_hits for f in files),
+                "cache_misses": sum(f.cache_misses for f in files),
+                "input_tokens_before": sum(f.input_tokens_before for f in files),
+                "input_tokens_after": sum(f.input_tokens_after for f in files),
+                "continuations": sum(f.continuations for f in files),
+                "duplicates_reused": sum(f.duplicates_reused for f in files),
+                "duplicates_diffed": sum(f.duplicates_diffed for f in files),
+                "stages": stages,
+            }
+        return summary
+
+    def tier_summary(self) -> Dict[str, Any]:
+        """
+        Per sheet tier file counts, tokens, cost, estimated savings and p50/p95 total seconds.
+
+        A tier's saved_cost is None when none of its sheets cost less than on the full model,
+        e.g. the small tier while SMALL_MODEL is priced like the full model.
+        """
+        by_tier: Dict[str, List[FileMetrics]] = {}
+        for file_metrics in self.files:
+            if file_metrics.tier is not None:
+                by_tier.setdefault(file_metrics.tier, []).append(file_metrics)
+
+        summary = {}
+        for tier, files in sorted(by_tier.items()):
+            totals = [sum(f.stages.values()) for f in files if f.stages]
+            savings = [f.saved_cost for f in files if f.saved_cost is not None]
+            summary[tier] = {
+                "files": len(files),
+                "api_calls": sum(f.api_calls for f in files),
+                "prompt_tokens": sum(f.prompt_tokens for f in files),
+                "completion_tokens": sum(f.completion_tokens for f in files),
+                "skipped_prompt_tokens": sum(f.skipped_prompt_tokens for f in files),
+                "cost": sum(f.cost for f in files),
+                "saved_cost": sum(savings) if savings else None,
+                "total_seconds": {f"p{p}": percentile(totals, p) for p in PERCENTILES[:2]} if totals else {},
+            }
+        return summary
+
+    def write_report(self, output_folder: str, prometheus: bool = False) -> Dict[str, str]:
+        """
+        Write run_report.json, run_report.csv and optionally metrics.prom to the output folder.
+
+        Args:
+        output_folder (str): The run's output folder.
+        prometheus (bool): Also write the summary in the Prometheus text exposition format.
+
+        Returns:
+        Dict[str, str]: The paths written, keyed by format.
+        """
+        paths = {
+            "json": os.path.join(output_folder, "run_report.json"),
+            "csv": os.path.join(output_folder, "run_report.csv"),
+        }
+        summary = self.summary()
+        with open(paths["json"], 'w') as f:
+            json.dump({
+                "started": self.started,
+                "finished": time.time(),
+                "by_drawing_type": summary,
+                "by_tier": self.tier_summary(),
+                "duplicate_clusters": self.duplicate_clusters,
+                "files": [file_metrics.to_dict() for file_metrics in self.files],
+            }, f, indent=2)
+
+        stage_names = sorted({name for f in self.files for name in f.stages})
+        with open(paths["csv"], 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["file", "drawing_type", "tier", "status", "total_seconds"]
+                            + [f"{name}_seconds" for name in stage_names]
+                            + ["api_calls", "retries", "prompt_tokens", "completion_tokens", "cost",
+                               "cache_hits", "cache_misses", "input_tokens_before", "input_tokens_after",
+                               "first_item_seconds", "continuations", "duplicates_reused", "duplicates_diffed"])
+            for file_metrics in self.files:
+                row = file_metrics.to_dict()
+                writer.writerow([row["file"], row["drawing_type"], row["tier"] or "", row["status"],
+                                 f"{row['total_seconds']:.4f}"]
+                                + [f"{file_metrics.stages[name]:.4f}" if name in file_metrics.stages else ""
+                                   for name in stage_names]
+                                + [row["api_calls"], row["retries"], row["prompt_tokens"],
+                                   row["completion_tokens"], f"{row['cost']:.6f}",
+                                   row["cache_hits"], row["cache_misses"],
+                                   row["input_tokens_before"], row["input_tokens_after"],
+                                   "" if row["first_item_seconds"] is None else f"{row['first_item_seconds']:.4f}",
+                                   row["continuations"], row["duplicates_reused"], row["duplicates_diffed"]])
+
+        if prometheus:
+            paths["prometheus"] = os.path.join(output_folder, "metrics.prom")
+            with open(paths["prometheus"], 'w') as f:
+                f.write(self.to_prometheus(summary))
+
+        logger.info(f"Run report written to {paths['json']}")
+        return paths
+
+    def to_prometheus(self, summary: Optional[Dict[str, Any]] = None) -> str:
+        summary = summary if summary is not None else self.summary()
+        lines = ["# TYPE ohmni_stage_seconds gauge"]
+        for drawing_type, data in summary.items():
+            for stage, quantiles in data["stages"].items():
+                for p in PERCENTILES:
+                    lines.append(f'ohmni_stage_seconds{{drawing_type="{drawing_type}",stage="{stage}",'
+                                 f'quantile="{p / 100}"}} {quantiles[f"p{p}"]:.6f}')
+        counters = ("files", "api_calls", "retries", "prompt_tokens", "completion_tokens", "cache_hits", "cache_misses",
+                    "input_tokens_before", "input_tokens_after", "continuations", "duplicates_reused",
+                    "duplicates_diffed")
+        for counter in counters:
+            lines.append(f"# TYPE ohmni_{counter}_total counter")
+            for drawing_type, data in summary.items():
+                lines.append(f'ohmni_{counter}_total{{drawing_type="{drawing_type}"}} {data[counter]}')
+        lines.append("# TYPE ohmni_cost_dollars_total counter")
+        for drawing_type, data in summary.items():
+            lines.append(f'ohmni_cost_dollars_total{{drawing_type="{drawing_type}"}} {data["cost"]:.6f}')
+        tiers = self.tier_summary()
+        lines.append("# TYPE ohmni_tier_files_total counter")
+        for tier, data in tiers.items():
+            lines.append(f'ohmni_tier_files_total{{tier="{tier}"}} {data["files"]}')
+        lines.append("# TYPE ohmni_tier_saved_dollars_total counter")
+        for tier, data in tiers.items():
+            if data["saved_cost"] is not None:
+                lines.append(f'ohmni_tier_saved_dollars_total{{tier="{tier}"}} {data["saved_cost"]:.6f}')
+        return "\n".join(lines) + "\n"
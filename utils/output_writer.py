@@ -0,0 +1,245 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from typing import Any, Dict, IO, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+def jsonl_path(output_folder: str, drawing_type: str, compression: str = "none") -> str:
+    return os.path.join(output_folder, f"{drawing_type}.jsonl{COMPRESSION_SUFFIXES[compression]}")
+
+def _open_stream(path: str, compression: str, mode: str) -> IO[bytes]:
+    if compression == "gzip":
+        return gzip.open(path, mode)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd output requires the 'zstandard' package (pip install zstandard)")
+        fh = open(path, mode)
+        if "r" in mode:
+            return zstandard.ZstdDecompressor().stream_reader(fh, closefd=True)
+        return zstandard.ZstdCompressor().stream_writer(fh, closefd=True)
+    return open(path, mode)
+
+def _compression_for(path: str) -> str:
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return "none"
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+def _parse_record(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and "source" in record and "output" in record else None
+
+def _read_records(path: str) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+    # A run killed mid-write leaves a compressed stream without its end marker, or a last
+    # line cut short; the records before it are kept and the file is reported incomplete.
+    records = {}
+    complete = True
+    buffer = b""
+    with _open_stream(path, _compression_for(path), "rb") as f:
+        while True:
+            try:
+                block = f.read(READ_BLOCK_SIZE)
+            except Exception as e:  # EOFError/BadGzipFile for gzip, ZstdError for zstd
+                logger.warning(f"{path} ends with an incomplete record ({e}); reading up to it")
+                complete = False
+                break
+            if not block:
+                break
+            lines = (buffer + block).split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = _parse_record(line)
+                if record is None:
+                    complete = False
+                    continue
+                records[record["source"]] = record
+    if buffer.strip():
+        # Without its newline the next appended record would run into this line
+        complete = False
+        record = _parse_record(buffer)
+        if record is not None:
+            records[record["source"]] = record
+    return records, complete
+
+def read_jsonl(path: str) -> Dict[str, Any]:
+    """
+    Load a (possibly compressed) JSONL output file, up to the last complete record.
+
+    Args:
+    path (str): The JSONL file written by JsonlWriter.
+
+    Returns:
+    Dict[str, Any]: The structured output of each source file, keyed by source path.
+    When a source appears more than once (it was reprocessed), the last record wins.
+    """
+    return {source: record["output"] for source, record in _read_records(path)[0].items()}
+
+def repair_jsonl(path: str) -> bool:
+    """
+    Rewrite a JSONL file left incomplete by a crash with only its complete records, so new
+    records can be appended after them. Returns whether the file was rewritten.
+    """
+    if not os.path.exists(path):
+        return False
+    records, complete = _read_records(path)
+    if complete:
+        return False
+    tmp_path = path + ".tmp"
+    with _open_stream(tmp_path, _compression_for(path), "wb") as f:
+        for record in records.values():
+            f.write((json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+    os.replace(tmp_path, path)
+    logger.warning(f"Repaired {path}: kept {len(records)} complete records")
+    return True
+
+class StructuredOutputReader:
+    """
+    Reads back the structured results recorded for source files, from per-file JSON or
+    JSONL output. Each JSONL file is loaded once and indexed by source, so reading many
+    unchanged sheets costs one pass over each file rather than one per sheet.
+    """
+
+    def __init__(self):
+        self._jsonl: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, output_path: str, source: str) -> Optional[Any]:
+        """The structured result of a source file, or None if it is missing or unreadable."""
+        try:
+            if ".jsonl" in os.path.basename(output_path):
+                if output_path not in self._jsonl:
+                    self._jsonl[output_path] = read_jsonl(output_path)
+                return self._jsonl[output_path].get(source)
+            with open(output_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cannot read the recorded output of {source} from {output_path}: {e}")
+            return None
+
+class JsonlWriter:
+    """
+    Appends structured sheets as compact JSON lines to one file per drawing type.
+
+    Workers hand records to write(), which only enqueues them; a single writer task
+    drains the queue and does the file I/O in a thread, so workers never wait on disk.
+    wait_written() waits until a source's record has been flushed, for callers that must
+    not record success before the output exists (the manifest).
+    Each line is {"source": <pdf path>, "drawing_type": ..., "output": <structured JSON>}.
+    Files are opened in append mode, so a reprocessed sheet adds a newer line rather
+    than replacing the old one; readers keep the last line per source (see read_jsonl).
+    A file left incomplete by a crashed run is repaired before anything is appended.
+
+    Args:
+    output_folder (str): Folder the JSONL files are written to.
+    compression (str): "none", "gzip" or "zstd" (needs the optional zstandard package).
+    """
+
+    def __init__(self, output_folder: str, compression: str = "none"):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.output_folder = output_folder
+        self.compression = compression
+        self.records_written = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._streams: Dict[str, IO[bytes]] = {}
+        self._written: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "JsonlWriter":
+        self.start()
+        return self
+
+    def start(self) -> None:
+        """Start the writer task; must be called from within the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def path_for(self, drawing_type: str) -> str:
+        return jsonl_path(self.output_folder, drawing_type, self.compression)
+
+    async def write(self, source: str, drawing_type: str, output: Any) -> str:
+        """
+        Queue one structured sheet for writing.
+
+        Returns:
+        str: The JSONL file the record will be appended to.
+        """
+        line = json.dumps({"source": source, "drawing_type": drawing_type, "output": output},
+                          separators=(",", ":")) + "\n"
+        written = self._written[source] = asyncio.get_running_loop().create_future()
+        await self._queue.put((drawing_type, line.encode("utf-8"), written))
+        return self.path_for(drawing_type)
+
+    async def wait_written(self, source: str) -> None:
+        """Wait until the last record queued for a source is on disk; raises if writing it failed."""
+        written = self._written.pop(source, None)
+        if written is not None:
+            await written
+
+    def _write_batch(self, batch: Dict[str, list]) -> None:
+        for drawing_type, lines in batch.items():
+            stream = self._streams.get(drawing_type)
+            if stream is None:
+                os.makedirs(self.output_folder, exist_ok=True)
+                repair_jsonl(self.path_for(drawing_type))
+                stream = self._streams[drawing_type] = _open_stream(self.path_for(drawing_type), self.compression, "ab")
+            stream.write(b"".join(lines))
+            stream.flush()
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            # Drain whatever else is already queued so each thread hop writes a batch
+            items = [item]
+            while not self._queue.empty():
+                items.append(self._queue.get_nowait())
+
+            batch: Dict[str, list] = {}
+            written = []
+            stop = False
+            for entry in items:
+                if entry is None:
+                    stop = True
+                    continue
+                drawing_type, line, future = entry
+                batch.setdefault(drawing_type, []).append(line)
+                written.append(future)
+            if batch:
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(written)} JSONL records to {self.output_folder}: {e}")
+                    for future in written:
+                        future.set_exception(e)
+                else:
+                    self.records_written += len(written)
+                    for future in written:
+                        future.set_result(None)
+            if stop:
+                return
+
+    async def close(self) -> None:
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        for stream in self._streams.values():
+            stream.close()
+        self._streams.clear()
+        logger.info(f"Wrote {self.records_written} JSONL records to {self.output_folder}")
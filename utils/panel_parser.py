@@ -0,0 +1,243 @@
+import html
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Column header spellings seen on panel schedules, per field of a circuit
+HEADER_ALIASES = {
+    "circuit": ["ckt", "ckt no", "cir", "circ", "circuit", "circuit no", "no", "#"],
+    "description": ["description", "desc", "load description", "circuit description", "name", "load served",
+                    "designation"],
+    "load_va": ["load va", "va", "load", "watts", "w", "kva", "connected load"],
+    "breaker": ["bkr", "breaker", "trip", "amps", "cb", "ocpd", "bkr size", "breaker size"],
+    "poles": ["poles", "pole", "p", "no of poles"],
+    "phase": ["phase", "ph", "phs"],
+}
+CORE_FIELDS = ("circuit", "description", "load_va", "breaker")
+FUZZY_HEADER_RATIO = 0.8
+HEADER_SEARCH_ROWS = 3  # Title rows such as "PANEL LP-1 208/120V" may sit above the header
+
+PANEL_NAME = re.compile(r"\bPANEL(?:BOARD)?\s*(?:NAME|DESIGNATION)?\s*[:#-]?\s*(?!SCHEDULE)([A-Z]{1,4}-?[A-Z0-9]+(?:-[A-Z0-9]+)?)\b")
+VOLTAGE = re.compile(r"\b(\d{3}(?:/\d{3})?)\s*V\b")
+PHASES = re.compile(r"\b([13])\s*(?:PH|PHASE|Ø)\b")
+MAIN_RATING = re.compile(r"\b(\d{2,4})\s*A\s*(MCB|MLO|MAIN|BUS)\b")
+CIRCUIT_NUMBER = re.compile(r"^\d{1,3}$")
+BREAKER_SIZE = re.compile(r"^(\d{1,4})\s*A?(?:\s*/\s*(\d)\s*P?)?$")
+NUMBER = re.compile(r"^-?\d[\d,]*(?:\.\d+)?$")
+WORD = re.compile(r"[A-Za-z0-9]+")
+
+class PanelParse(NamedTuple):
+    panel: Dict[str, Any]
+    confidence: float
+
+class PanelSheetParse(NamedTuple):
+    panels: List[Dict[str, Any]]
+    notes: List[str]
+    confidence: float
+
+def normalize_header(cell: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9#]+", " ", cell.lower()).split())
+
+def match_header(cell: str) -> Optional[str]:
+    """
+    The circuit field a column header names, or None.
+
+    Exact spellings win, then spellings contained as whole words (the longest one, so
+    'LOAD DESCRIPTION' is a description rather than a load), then close misspellings.
+    """
+    text = normalize_header(cell)
+    if not text:
+        return None
+    best, best_score = None, 0.0
+    for field, aliases in HEADER_ALIASES.items():
+        for alias in aliases:
+            if text == alias:
+                score = 2.0
+            elif len(alias) >= 3 and re.search(rf"(?:^|\s){re.escape(alias)}(?:\s|$)", text):
+                score = 1.0 + len(alias) / 100
+            else:
+                score = SequenceMatcher(None, text, alias).ratio() if len(alias) >= 3 else 0.0
+            if score > best_score:
+                best, best_score = field, score
+    return best if best_score >= FUZZY_HEADER_RATIO else None
+
+def parse_markdown_table(markdown: str) -> List[List[str]]:
+    """The cell rows of a markdown table as written by find_tables().to_markdown() or prompt compression."""
+    rows = []
+    for line in markdown.splitlines():
+        line = line.strip()
+        if not line.startswith("|"):
+            continue
+        # to_markdown escapes cell text twice (e.g. '-' becomes '&amp;#45;')
+        cells = [html.unescape(html.unescape(cell.replace("<br>", " "))).strip() for cell in line.strip("|").split("|")]
+        if all(re.fullmatch(r":?-{3,}:?", cell) for cell in cells if cell):
+            continue  # The separator row below the header
+        rows.append(cells)
+    return rows
+
+def _column_groups(header: List[Optional[str]]) -> List[Dict[str, int]]:
+    # Two-sided schedules repeat the circuit columns (odd circuits left, even right);
+    # a repeated field starts the next group, and a single phase column is shared.
+    groups: List[Dict[str, int]] = [{}]
+    for index, field in enumerate(header):
+        if field is None:
+            continue
+        if field in groups[-1]:
+            groups.append({})
+        groups[-1][field] = index
+    groups = [group for group in groups if "circuit" in group]
+    phase_columns = [group["phase"] for group in groups if "phase" in group]
+    if len(phase_columns) == 1:
+        for group in groups:
+            group.setdefault("phase", phase_columns[0])
+    return groups
+
+def _number(value: str) -> Optional[float]:
+    value = value.replace(",", "").strip()
+    if not NUMBER.match(value):
+        return None
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+def _panel_metadata(text: str) -> Dict[str, Any]:
+    upper = text.upper()
+    metadata: Dict[str, Any] = {"panel_name": None, "voltage": None, "phases": None, "main": None}
+    match = PANEL_NAME.search(upper)
+    if match:
+        metadata["panel_name"] = match.group(1)
+    match = VOLTAGE.search(upper)
+    if match:
+        metadata["voltage"] = f"{match.group(1)}V"
+    match = PHASES.search(upper)
+    if match:
+        metadata["phases"] = int(match.group(1))
+    match = MAIN_RATING.search(upper)
+    if match:
+        metadata["main"] = f"{match.group(1)}A {match.group(2)}"
+    return metadata
+
+def parse_panel_table(rows: List[List[str]], context: str = "") -> Optional[PanelParse]:
+    """
+    Read one table as a panel schedule.
+
+    The header row is the one among the first rows whose cells name the most circuit
+    fields; rows above it are searched for the panel name, voltage, phases and main
+    rating before the surrounding text is. The confidence multiplies the share of core
+    fields (circuit, description, load, breaker) found in the header by the share of
+    data rows that read cleanly (a circuit number, a numeric load, a breaker size) and
+    the share of circuit numbers that are unique.
+
+    Args:
+    rows (List[List[str]]): The table's cell rows.
+    context (str): Text near the table, e.g. the page text outside tables.
+
+    Returns:
+    Optional[PanelParse]: The panel in the structured shape and the confidence, or None
+    if the table has no circuit column.
+    """
+    best_index, best_header, best_count = 0, [], 0
+    for index, row in enumerate(rows[:HEADER_SEARCH_ROWS]):
+        header = [match_header(cell) for cell in row]
+        count = len({field for field in header if field is not None})
+        if count > best_count:
+            best_index, best_header, best_count = index, header, count
+    groups = _column_groups(best_header)
+    if not groups:
+        return None
+
+    circuits = []
+    valid = total = 0
+    for row in rows[best_index + 1:]:
+        for group in groups:
+            cells = {field: row[index].strip() if index < len(row) else "" for field, index in group.items()}
+            if not any(cells.values()):
+                continue
+            total += 1
+            circuit = cells.get("circuit", "")
+            load = _number(cells.get("load_va", "")) if cells.get("load_va") else None
+            breaker = BREAKER_SIZE.match(cells.get("breaker", "").upper())
+            poles = _number(cells.get("poles", "")) if cells.get("poles") else None
+            ok = (CIRCUIT_NUMBER.match(circuit) is not None
+                  and (not cells.get("load_va") or load is not None)
+                  and (not cells.get("breaker") or breaker is not None))
+            valid += ok
+            circuits.append({
+                "circuit": int(circuit) if CIRCUIT_NUMBER.match(circuit) else circuit,
+                "description": cells.get("description") or None,
+                "load_va": load,
+                "breaker": f"{breaker.group(1)}A" if breaker else (cells.get("breaker") or None),
+                "poles": poles if poles is not None else (int(breaker.group(2)) if breaker and breaker.group(2) else None),
+                "phase": cells.get("phase") or None,
+            })
+    if not circuits:
+        return None
+
+    circuits.sort(key=lambda c: c["circuit"] if isinstance(c["circuit"], int) else float("inf"))
+    numbers = [c["circuit"] for c in circuits]
+    header_score = sum(any(field in group for group in groups) for field in CORE_FIELDS) / len(CORE_FIELDS)
+    confidence = header_score * (0.7 * valid / total + 0.3 * len(set(numbers)) / len(numbers))
+
+    title = "\n".join(" ".join(row) for row in rows[:best_index])
+    metadata = _panel_metadata(title)
+    for key, value in _panel_metadata(context).items():
+        if metadata[key] is None:
+            metadata[key] = value
+    panel = dict(metadata, circuits=circuits,
+                 total_load_va=sum(c["load_va"] for c in circuits if isinstance(c["load_va"], (int, float))))
+    return PanelParse(panel, round(confidence, 3))
+
+def split_prompt_page(page: str) -> Tuple[str, List[str]]:
+    """Split a TEXT:/TABLE: page as sent to the model into its text and its markdown tables."""
+    sections = re.split(r"^(TEXT|TABLE):\n", page, flags=re.MULTILINE)
+    text, tables = "", []
+    for kind, body in zip(sections[1::2], sections[2::2]):
+        if kind == "TEXT":
+            text += body
+        else:
+            tables.append(body)
+    return text, tables
+
+def parse_panel_pages(pages: List[Tuple[str, List[str]]], max_other_words: int = 200) -> Optional[PanelSheetParse]:
+    """
+    Read a sheet made of panel schedules: every table must read as a panel, and the text
+    outside them must be short (notes, title block) rather than content for the model.
+
+    Args:
+    pages (List[Tuple[str, List[str]]]): Per page, its text and its markdown tables.
+    max_other_words (int): Most words allowed outside the tables.
+
+    Returns:
+    Optional[PanelSheetParse]: The panels, the text lines outside them and the lowest
+    table confidence; None if the sheet has no tables, a table is not a panel, or there
+    is too much other text.
+    """
+    panels, notes, confidences = [], [], []
+    other_words = 0
+    for text, tables in pages:
+        table_rows = [parse_markdown_table(table) for table in tables]
+        # Uncompressed pages repeat the cell text in the page text
+        other_words += max(0, len(WORD.findall(text))
+                           - sum(len(WORD.findall(" ".join(" ".join(row) for row in rows))) for rows in table_rows))
+        for rows in table_rows:
+            parsed = parse_panel_table(rows, text if len(tables) == 1 else "")
+            if parsed is None:
+                return None
+            panels.append(parsed.panel)
+            confidences.append(parsed.confidence)
+        notes.extend(line.strip() for line in text.splitlines() if line.strip())
+    if not panels or other_words > max_other_words:
+        return None
+    return PanelSheetParse(panels, notes, min(confidences))
+
+def panel_output(panels: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The panel JSON process_pdf writes: the panel itself, or {'panels': [...]} for several."""
+    return panels[0] if len(panels) == 1 else {"panels": panels}
+
+def panel_sheet_output(parsed: PanelSheetParse, sheet_number: Optional[str]) -> Dict[str, Any]:
+    """The structured JSON of an electrical sheet read by the parser instead of the model."""
+    return {
+        "metadata": {"drawing_number": sheet_number, "drawing_type": "Electrical"},
+        "panels": parsed.panels,
+        "notes": parsed.notes,
+        "parser": {"method": "rule_based", "confidence": parsed.confidence},
+    }
@@ -1,24 +1,191 @@
 import pymupdf
 import json
 import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
 from openai import AsyncOpenAI
 
-async def extract_text_and_tables_from_pdf(pdf_path: str) -> str:
-    doc = pymupdf.open(pdf_path)
-    all_content = ""
-    for page in doc:
-        text = page.get_text()
-        all_content += "TEXT:\n" + text + "\n"
-        
-        tables = page.find_tables()
-        for table in tables:
-            all_content += "TABLE:\n"
-            markdown = table.to_markdown()
-            all_content += markdown + "\n"
-    
-    return all_content
+from config.settings import (
+    EXTRACTION_WORKERS, PANEL_PARSER, PANEL_PARSER_MIN_CONFIDENCE, PROMPT_COMPRESSION, TABLE_DETECTION,
+)
+from utils.api_utils import CircuitBreaker, async_safe_api_call
+from utils.rate_limiter import RateLimiter
+from utils.pdf_utils import PdfDocument
+from utils.output_writer import JsonlWriter
+from utils.metrics import current_file_metrics
+from utils.prompt_compression import compress_pages
+from utils.drawing_processor import chunk_pages
+from utils.panel_parser import panel_output, parse_panel_pages
+
+logger = logging.getLogger(__name__)
+
+TABLE_STRATEGIES = ("always", "heuristic", "never")
+MIN_ALIGNED_HORIZONTAL = 3  # Row rules sharing one x-extent: top, bottom and at least one separator
+MIN_ALIGNED_VERTICAL = 2  # Column rules sharing one y-extent: at least the two outer borders
+
+def create_extraction_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Create the process pool used for CPU-bound PDF extraction.
+
+    Args:
+    max_workers (Optional[int]): Number of worker processes. Defaults to EXTRACTION_WORKERS.
+
+    Returns:
+    ProcessPoolExecutor: The extraction pool. The caller is responsible for shutting it down.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers or EXTRACTION_WORKERS)
+
+def may_contain_tables(page: pymupdf.Page, text: str) -> bool:
+    """
+    Cheaply decide whether page.find_tables() could find anything on a page.
+
+    find_tables() builds tables from ruled lines, so a page qualifies only if it has text and
+    its vector drawings include several horizontal rules sharing the same x-extent together
+    with vertical rules sharing the same y-extent, as the rows and columns of a grid do.
+    Floor plans and title sheets rarely have such aligned groups.
+
+    Args:
+    page (pymupdf.Page): The page to inspect.
+    text (str): The page text, already extracted.
+
+    Returns:
+    bool: False if table detection can be skipped.
+    """
+    if not text.strip():
+        return False
+
+    horizontal = Counter()
+    vertical = Counter()
+    for drawing in page.get_cdrawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+                if abs(y0 - y1) < 1:
+                    horizontal[(round(min(x0, x1)), round(max(x0, x1)))] += 1
+                elif abs(x0 - x1) < 1:
+                    vertical[(round(min(y0, y1)), round(max(y0, y1)))] += 1
+            elif item[0] == "re":
+                x0, y0, x1, y1 = item[1]
+                horizontal[(round(x0), round(x1))] += 2
+                vertical[(round(y0), round(y1))] += 2
+
+    if not horizontal or not vertical:
+        return False
+    return (max(horizontal.values()) >= MIN_ALIGNED_HORIZONTAL
+            and max(vertical.values()) >= MIN_ALIGNED_VERTICAL)
+
+def iter_pdf_pages(pdf_path: str, table_strategy: str = TABLE_DETECTION) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily extract a PDF page by page.
+
+    Args:
+    pdf_path (str): The path to the PDF file.
+    table_strategy (str): When to run table detection: "always", "heuristic" (only on pages
+        that pass may_contain_tables) or "never".
 
-async def structure_panel_data(client: AsyncOpenAI, raw_content: str) -> dict:
+    Yields:
+    Dict[str, Any]: One record per page with 'page' (1-based number), 'text', 'tables'
+    (a list of markdown strings), 'tables_detected' (whether find_tables ran),
+    'text_outside_tables' (the text minus the lines inside a found table, or None when no
+    table was found), 'boilerplate' (the title block and notes lines, see
+    PdfDocument.boilerplate_lines) and 'timings' (seconds spent on text, the table pre-filter and table
+    detection).
+    """
+    if table_strategy not in TABLE_STRATEGIES:
+        raise ValueError(f"Unknown table detection strategy: {table_strategy}")
+
+    with PdfDocument(pdf_path) as doc:
+        for index in range(doc.page_count):
+            started = time.perf_counter()
+            text = doc.text(index)
+            text_done = time.perf_counter()
+
+            if table_strategy == "heuristic":
+                detect = may_contain_tables(doc.page(index), text)
+            else:
+                detect = table_strategy == "always"
+            filter_done = time.perf_counter()
+
+            tables = doc.tables(index) if detect else []
+            # Table cells also appear in the plain text, one per line; keep a copy without them
+            # so prompt compression can send each cell once.
+            text_outside_tables = doc.text_outside(index, doc.table_bboxes(index)) if tables else None
+            tables_done = time.perf_counter()
+
+            yield {
+                "page": index + 1,
+                "text": text,
+                "tables": tables,
+                "tables_detected": detect,
+                "text_outside_tables": text_outside_tables,
+                "boilerplate": doc.boilerplate_lines(index),
+                "timings": {
+                    "text": text_done - started,
+                    "table_filter": filter_done - text_done,
+                    "tables": tables_done - filter_done,
+                },
+            }
+            doc.release(index)
+
+def format_page(record: Dict[str, Any]) -> str:
+    """Render a page record in the TEXT:/TABLE: layout sent to the model."""
+    parts = ["TEXT:\n", record["text"], "\n"]
+    for markdown in record["tables"]:
+        parts.extend(("TABLE:\n", markdown, "\n"))
+    return "".join(parts)
+
+def extract_page_records_sync(pdf_path: str, table_strategy: str = TABLE_DETECTION) -> List[Dict[str, Any]]:
+    return list(iter_pdf_pages(pdf_path, table_strategy))
+
+def extract_pages_sync(pdf_path: str, table_strategy: str = TABLE_DETECTION) -> List[str]:
+    return [format_page(record) for record in iter_pdf_pages(pdf_path, table_strategy)]
+
+def extract_text_and_tables_sync(pdf_path: str, table_strategy: str = TABLE_DETECTION) -> str:
+    return "".join(format_page(record) for record in iter_pdf_pages(pdf_path, table_strategy))
+
+def log_page_timings(pdf_path: str, records: List[Dict[str, Any]]) -> None:
+    for record in records:
+        timings = record["timings"]
+        logger.info(
+            f"{os.path.basename(pdf_path)} page {record['page']}: text {timings['text'] * 1000:.1f}ms, "
+            f"table filter {timings['table_filter'] * 1000:.1f}ms, "
+            f"tables {timings['tables'] * 1000:.1f}ms "
+            f"({len(record['tables']) if record['tables_detected'] else 'skipped'})"
+        )
+
+async def extract_pages_from_pdf(pdf_path: str, executor: Optional[Executor] = None,
+                                 table_strategy: str = TABLE_DETECTION,
+                                 compress: bool = PROMPT_COMPRESSION) -> List[str]:
+    # Extraction is CPU-bound, so run it in the executor (the loop's default thread pool
+    # when none is given) to keep the event loop free for in-flight API calls. Records
+    # come back to this process so timings are logged by the parent's handlers.
+    loop = asyncio.get_running_loop()
+    records = await loop.run_in_executor(executor, extract_page_records_sync, pdf_path, table_strategy)
+    log_page_timings(pdf_path, records)
+    if not compress:
+        return [format_page(record) for record in records]
+
+    pages, stats = compress_pages(records, chunk_pages)
+    saved = stats["tokens_before"] - stats["tokens_after"]
+    logger.info(
+        f"{os.path.basename(pdf_path)}: prompt compression {stats['tokens_before']} -> {stats['tokens_after']} "
+        f"tokens ({saved / max(stats['tokens_before'], 1):.0%} saved)"
+    )
+    file_metrics = current_file_metrics.get()
+    if file_metrics is not None:
+        file_metrics.input_tokens_before += stats["tokens_before"]
+        file_metrics.input_tokens_after += stats["tokens_after"]
+    return pages
+
+async def extract_text_and_tables_from_pdf(pdf_path: str, executor: Optional[Executor] = None) -> str:
+    return "".join(await extract_pages_from_pdf(pdf_path, executor))
+
+async def structure_panel_data(client: AsyncOpenAI, raw_content: str, rate_limiter: Optional[RateLimiter] = None,
+                               circuit_breaker: Optional[CircuitBreaker] = None) -> dict:
     prompt = f"""
     You are an expert in electrical engineering and panel schedules. 
     Please structure the following content from an electrical panel schedule into a valid JSON format. 
@@ -28,7 +195,10 @@ async def structure_panel_data(client: AsyncOpenAI, raw_content: str) -> dict:
     Raw content:
     {raw_content}
     """
-    response = await client.chat.completions.create(
+    response = await async_safe_api_call(
+        client,
+        rate_limiter,
+        circuit_breaker,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a helpful assistant that structures electrical panel data into JSON."},
@@ -40,18 +210,34 @@ async def structure_panel_data(client: AsyncOpenAI, raw_content: str) -> dict:
     )
     return json.loads(response.choices[0].message.content)
 
-async def process_pdf(pdf_path: str, output_folder: str, client: AsyncOpenAI):
+async def process_pdf(pdf_path: str, output_folder: str, client: AsyncOpenAI, rate_limiter: Optional[RateLimiter] = None,
+                      circuit_breaker: Optional[CircuitBreaker] = None, output_writer: Optional[JsonlWriter] = None,
+                      use_parser: bool = PANEL_PARSER):
     print(f"Processing PDF: {pdf_path}")
-    raw_content = await extract_text_and_tables_from_pdf(pdf_path)
-    
-    structured_data = await structure_panel_data(client, raw_content)
-    
-    panel_name = structured_data.get('panel_name', 'unknown_panel').replace(" ", "_").lower()
-    filename = f"{panel_name}_electric_panel.json"
-    filepath = os.path.join(output_folder, filename)
+    records = await asyncio.get_running_loop().run_in_executor(None, extract_page_records_sync, pdf_path)
+    raw_content = "".join(format_page(record) for record in records)
+
+    # Clean panel grids are read directly; only low-confidence ones go to the model
+    parsed = None
+    if use_parser:
+        parsed = parse_panel_pages([(record["text_outside_tables"] if record["text_outside_tables"] is not None
+                                     else record["text"], record["tables"]) for record in records])
+    if parsed is not None and parsed.confidence >= PANEL_PARSER_MIN_CONFIDENCE:
+        logger.info(f"{os.path.basename(pdf_path)}: {len(parsed.panels)} panel schedules parsed without the model "
+                    f"(confidence {parsed.confidence:.2f})")
+        structured_data = panel_output(parsed.panels)
+    else:
+        structured_data = await structure_panel_data(client, raw_content, rate_limiter, circuit_breaker)
     
-    with open(filepath, 'w') as f:
-        json.dump(structured_data, f, indent=2)
+    if output_writer is not None:
+        filepath = await output_writer.write(pdf_path, "Electrical", structured_data)
+    else:
+        panel_name = (structured_data.get('panel_name') or 'unknown_panel').replace(" ", "_").lower()
+        filename = f"{panel_name}_electric_panel.json"
+        filepath = os.path.join(output_folder, filename)
+        
+        with open(filepath, 'w') as f:
+            json.dump(structured_data, f, indent=2)
     
     print(f"Saved structured panel data: {filepath}")
     return raw_content, structured_data
\ No newline at end of file
@@ -1,17 +1,159 @@
 # pdf_utils.py
 
-import pdfplumber
+import pymupdf
 import logging
-from typing import List, Dict, Any
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+from config.settings import PDF_READ_INTO_MEMORY
 
 logger = logging.getLogger(__name__)
 
-def extract_text(file_path: str) -> str:
+BACKENDS = ("pymupdf", "pdfplumber")
+
+# Title blocks run along the right edge or the bottom of a sheet
+TITLE_BLOCK_RIGHT = 0.8  # Share of the page width where the right-hand strip starts
+TITLE_BLOCK_BOTTOM = 0.9  # Share of the page height where the bottom strip starts
+NOTES_HEADING = re.compile(r"^(?:[A-Z]+ )*NOTES?:?$")
+NOTE_ITEM = re.compile(r"^(?:[A-Z]?\d{1,2}[.)]|[A-Z][.)])\s")
+
+class PdfDocument:
+    """
+    A PDF opened once with PyMuPDF, exposing text, tables, images and metadata lazily.
+
+    Every per-page result is memoized, so callers that need several views of the same
+    sheet share one parse instead of reopening the file. Callers that walk the document
+    once release() each page when done with it, so only the current page stays loaded.
+
+    Args:
+    file_path (str): The path to the PDF file.
+    in_memory (bool): Read the whole file into memory with one sequential read and parse
+        it from bytes. Useful for files on network shares, where PyMuPDF's random access
+        reads are slow.
+    """
+
+    def __init__(self, file_path: str, in_memory: bool = PDF_READ_INTO_MEMORY):
+        self.file_path = file_path
+        if in_memory:
+            with open(file_path, 'rb') as f:
+                self._doc = pymupdf.open(stream=f.read(), filetype="pdf")
+        else:
+            self._doc = pymupdf.open(file_path)
+        self._pages: Dict[int, pymupdf.Page] = {}
+        self._text: Dict[int, str] = {}
+        self._found_tables: Dict[int, Any] = {}
+        self._tables: Dict[int, List[str]] = {}
+        self._images: Dict[int, List[Dict[str, Any]]] = {}
+        self._metadata: Optional[Dict[str, Any]] = None
+
+    def __enter__(self) -> "PdfDocument":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pages.clear()
+        self._doc.close()
+
+    def release(self, index: int) -> None:
+        """Drop a page's Page object and memoized results; they are rebuilt if asked for again."""
+        for cache in (self._pages, self._text, self._found_tables, self._tables, self._images):
+            cache.pop(index, None)
+
+    @property
+    def page_count(self) -> int:
+        return self._doc.page_count
+
+    def page(self, index: int) -> pymupdf.Page:
+        if index not in self._pages:
+            self._pages[index] = self._doc[index]
+        return self._pages[index]
+
+    def text(self, index: int) -> str:
+        if index not in self._text:
+            self._text[index] = self.page(index).get_text()
+        return self._text[index]
+
+    def _find_tables(self, index: int) -> Any:
+        if index not in self._found_tables:
+            self._found_tables[index] = self.page(index).find_tables()
+        return self._found_tables[index]
+
+    def tables(self, index: int) -> List[str]:
+        """The tables found on a page by page.find_tables(), as markdown."""
+        if index not in self._tables:
+            self._tables[index] = [table.to_markdown() for table in self._find_tables(index)]
+        return self._tables[index]
+
+    def table_bboxes(self, index: int) -> List[Tuple[float, float, float, float]]:
+        return [tuple(table.bbox) for table in self._find_tables(index)]
+
+    def text_outside(self, index: int, bboxes: List[Tuple[float, float, float, float]]) -> str:
+        """The page text without the lines whose centre falls inside any of the given boxes."""
+        lines = []
+        for block in self.page(index).get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                x0, y0, x1, y1 = line["bbox"]
+                cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+                if any(bx0 <= cx <= bx1 and by0 <= cy <= by1 for bx0, by0, bx1, by1 in bboxes):
+                    continue
+                lines.append("".join(span["text"] for span in line["spans"]))
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def boilerplate_lines(self, index: int) -> List[str]:
+        """
+        The text lines in the page's title block strip and notes blocks: the content that
+        is repeated on every sheet of a set, as opposed to the drawing itself.
+
+        A notes block starts with a heading such as 'GENERAL NOTES' and runs on through
+        the following blocks that start with a note number.
+        """
+        page = self.page(index)
+        width, height = page.rect.width, page.rect.height
+        lines = []
+        in_notes = False
+        for x0, y0, x1, y1, text, *_ in page.get_text("blocks"):
+            block_lines = [line.strip() for line in text.splitlines() if line.strip()]
+            if not block_lines:
+                continue
+            first = block_lines[0].upper()
+            if NOTES_HEADING.match(first):
+                in_notes = True
+            elif in_notes and not NOTE_ITEM.match(first):
+                in_notes = False
+            if in_notes or x0 >= width * TITLE_BLOCK_RIGHT or y0 >= height * TITLE_BLOCK_BOTTOM:
+                lines.extend(block_lines)
+        return lines
+
+    def images(self, index: int) -> List[Dict[str, Any]]:
+        if index not in self._images:
+            self._images[index] = [{
+                'page': index + 1,
+                'bbox': info['bbox'],
+                'width': info['width'],
+                'height': info['height'],
+                'type': 'image'
+            } for info in self.page(index).get_image_info()]
+        return self._images[index]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = dict(self._doc.metadata or {})
+        return self._metadata
+
+def _check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+
+def extract_text(file_path: str, backend: str = "pymupdf") -> str:
     """
     Extract text from a PDF file.
     
     Args:
     file_path (str): The path to the PDF file.
+    backend (str): "pymupdf" (default) or the "pdfplumber" fallback.
     
     Returns:
     str: The extracted text from the PDF.
@@ -19,18 +161,24 @@ def extract_text(file_path: str) -> str:
     Raises:
     Exception: If there's an error in opening or processing the PDF.
     """
+    _check_backend(backend)
     logger.info(f"Starting text extraction for {file_path}")
     try:
-        with pdfplumber.open(file_path) as pdf:
-            logger.info(f"Successfully opened {file_path}")
-            text = ""
-            for i, page in enumerate(pdf.pages):
-                logger.info(f"Processing page {i+1} of {len(pdf.pages)}")
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-                else:
-                    logger.warning(f"No text extracted from page {i+1}")
+        page_texts = []
+        if backend == "pdfplumber":
+            import pdfplumber
+            with pdfplumber.open(file_path) as pdf:
+                logger.info(f"Successfully opened {file_path}")
+                page_texts = [page.extract_text() for page in pdf.pages]
+        else:
+            with PdfDocument(file_path) as doc:
+                logger.info(f"Successfully opened {file_path}")
+                page_texts = [doc.text(i) for i in range(doc.page_count)]
+
+        for i, page_text in enumerate(page_texts):
+            if not page_text:
+                logger.warning(f"No text extracted from page {i+1}")
+        text = "".join(page_text + "\n" for page_text in page_texts if page_text)
         
         if not text:
             logger.warning(f"No text extracted from {file_path}")
@@ -42,12 +190,13 @@ def extract_text(file_path: str) -> str:
         logger.error(f"Error extracting text from {file_path}: {str(e)}")
         raise
 
-def extract_images(file_path: str) -> List[Dict[str, Any]]:
+def extract_images(file_path: str, backend: str = "pymupdf") -> List[Dict[str, Any]]:
     """
     Extract images from a PDF file.
     
     Args:
     file_path (str): The path to the PDF file.
+    backend (str): "pymupdf" (default) or the "pdfplumber" fallback.
     
     Returns:
     List[Dict[str, Any]]: A list of dictionaries containing image information.
@@ -55,18 +204,25 @@ def extract_images(file_path: str) -> List[Dict[str, Any]]:
     Raises:
     Exception: If there's an error in opening or processing the PDF.
     """
+    _check_backend(backend)
     try:
         images = []
-        with pdfplumber.open(file_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                for image in page.images:
-                    images.append({
-                        'page': i + 1,
-                        'bbox': image['bbox'],
-                        'width': image['width'],
-                        'height': image['height'],
-                        'type': image['type']
-                    })
+        if backend == "pdfplumber":
+            import pdfplumber
+            with pdfplumber.open(file_path) as pdf:
+                for i, page in enumerate(pdf.pages):
+                    for image in page.images:
+                        images.append({
+                            'page': i + 1,
+                            'bbox': (image['x0'], image['top'], image['x1'], image['bottom']),
+                            'width': image['srcsize'][0],
+                            'height': image['srcsize'][1],
+                            'type': image['object_type']
+                        })
+        else:
+            with PdfDocument(file_path) as doc:
+                for i in range(doc.page_count):
+                    images.extend(doc.images(i))
         
         logger.info(f"Extracted {len(images)} images from {file_path}")
         return images
@@ -74,12 +230,14 @@ def extract_images(file_path: str) -> List[Dict[str, Any]]:
         logger.error(f"Error extracting images from {file_path}: {str(e)}")
         raise
 
-def get_pdf_metadata(file_path: str) -> Dict[str, Any]:
+def get_pdf_metadata(file_path: str, backend: str = "pymupdf") -> Dict[str, Any]:
     """
     Get metadata from a PDF file.
     
     Args:
     file_path (str): The path to the PDF file.
+    backend (str): "pymupdf" (default, PyMuPDF's lower-case keys) or the "pdfplumber"
+        fallback (the raw document info dictionary).
     
     Returns:
     Dict[str, Any]: A dictionary containing the PDF metadata.
@@ -87,11 +245,17 @@ def get_pdf_metadata(file_path: str) -> Dict[str, Any]:
     Raises:
     Exception: If there's an error in opening or processing the PDF.
     """
+    _check_backend(backend)
     try:
-        with pdfplumber.open(file_path) as pdf:
-            metadata = pdf.metadata
+        if backend == "pdfplumber":
+            import pdfplumber
+            with pdfplumber.open(file_path) as pdf:
+                metadata = pdf.metadata
+        else:
+            with PdfDocument(file_path) as doc:
+                metadata = doc.metadata
         logger.info(f"Successfully extracted metadata from {file_path}")
         return metadata
     except Exception as e:
         logger.error(f"Error extracting metadata from {file_path}: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,103 @@
+import html
+import re
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from utils.rate_limiter import estimate_tokens
+
+# Lines shorter than this (room numbers, breaker sizes, "20A") are data, not boilerplate,
+# so they are never dropped as repeats
+MIN_REPEATED_LINE_CHARS = 12
+
+_INLINE_WHITESPACE = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of spaces and tabs, strip every line and keep at most one blank line in a row."""
+    lines = [_INLINE_WHITESPACE.sub(" ", line).strip() for line in text.splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip("\n")
+
+def _unescape(text: str) -> str:
+    # to_markdown() escapes cell text, sometimes twice (&amp;#45; for "-")
+    for _ in range(2):
+        unescaped = html.unescape(text)
+        if unescaped == text:
+            break
+        text = unescaped
+    return text
+
+def compact_markdown_table(markdown: str) -> str:
+    """Strip the padding around markdown table cells and decode HTML entities in them."""
+    rows = []
+    for line in markdown.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("|"):
+            cells = [_INLINE_WHITESPACE.sub(" ", cell).strip() for cell in line.strip("|").split("|")]
+            line = "|" + "|".join(cells) + "|"
+        rows.append(_unescape(line))
+    return "\n".join(rows)
+
+def drop_repeated_lines(texts: List[str], boilerplate: List[Set[str]],
+                        min_chars: int = MIN_REPEATED_LINE_CHARS) -> List[str]:
+    """
+    Drop lines of a page's title block and notes (its boilerplate set) that an earlier
+    page's title block or notes already had, e.g. general notes repeated on every sheet
+    of a set. Drawing content, such as the room labels a plan and its RCP share, is kept.
+    Repeats within one page and short lines are left alone.
+    """
+    seen = set()
+    result = []
+    for text, page_boilerplate in zip(texts, boilerplate):
+        lines = text.split("\n")
+        kept = [line for line in lines
+                if len(line) < min_chars or line not in page_boilerplate or line not in seen]
+        seen.update(line for line in page_boilerplate if len(line) >= min_chars)
+        result.append("\n".join(kept))
+    return result
+
+def _render(text: str, tables: List[str]) -> str:
+    # Same layout as pdf_processor.format_page
+    parts = ["TEXT:\n", text, "\n"]
+    for markdown in tables:
+        parts.extend(("TABLE:\n", markdown, "\n"))
+    return "".join(parts)
+
+def compress_pages(records: List[Dict[str, Any]],
+                   chunker: Optional[Callable[[List[str]], List[List[str]]]] = None) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Build the compressed TEXT:/TABLE: prompt for each page record of one PDF.
+
+    Text lines that fall inside a detected table are sent once, as the table; whitespace
+    and markdown padding are collapsed. Title block and notes lines repeated from an
+    earlier page are dropped only when chunker puts all pages in one request: a page sent
+    on its own must carry its own title block, and keeps the same prompt (and cache key
+    and duplicate fingerprint) as a single-sheet copy of it. Every step is deterministic,
+    so equal input always gives equal prompts.
+
+    Args:
+    records (List[Dict[str, Any]]): Page records from iter_pdf_pages, in page order.
+    chunker (Optional[Callable]): Groups page prompts into requests (chunk_pages); None
+        never drops repeats.
+
+    Returns:
+    Tuple[List[str], Dict[str, int]]: The page prompts and the estimated
+    'tokens_before' and 'tokens_after' compression.
+    """
+    tokens_before = sum(estimate_tokens(_render(record["text"], record["tables"])) for record in records)
+
+    texts = [
+        normalize_text(record["text"] if record.get("text_outside_tables") is None
+                       else record["text_outside_tables"])
+        for record in records
+    ]
+    tables = [[compact_markdown_table(markdown) for markdown in record["tables"]] for record in records]
+    pages = [_render(text, page_tables) for text, page_tables in zip(texts, tables)]
+
+    if chunker is not None and len(pages) > 1 and len(chunker(pages)) == 1:
+        boilerplate = [{normalize_text(line) for line in record.get("boilerplate", [])} for record in records]
+        texts = drop_repeated_lines(texts, boilerplate)
+        pages = [_render(text, page_tables) for text, page_tables in zip(texts, tables)]
+
+    tokens_after = sum(estimate_tokens(page) for page in pages)
+    return pages, {"tokens_before": tokens_before, "tokens_after": tokens_after}
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # Rough average for English text and markdown tables
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separator tokens added per chat message
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheaply estimate the number of tokens in a piece of text.
+
+    Args:
+    text (str): The text to estimate.
+
+    Returns:
+    int: The estimated token count.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> int:
+    """
+    Estimate the tokens a chat completion request counts against the tokens-per-minute limit.
+
+    The API admits a request against its prompt size plus the requested max_tokens,
+    so both are reserved up front and reconciled with the actual usage afterwards.
+
+    Args:
+    messages (List[Dict[str, Any]]): The chat messages.
+    max_tokens (Optional[int]): The completion budget of the request.
+
+    Returns:
+    int: The estimated token count.
+    """
+    prompt_tokens = sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    return prompt_tokens + (max_tokens or 0)
+
+class TokenBucket:
+    """A bucket holding up to `capacity` units, refilled continuously at `capacity` per `period` seconds."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they already are)."""
+        self._refill()
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Return (positive) or take (negative) units after the fact, e.g. when reconciling usage."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+class RateLimiter:
+    """
+    Shared limiter for OpenAI calls with separate requests-per-minute and tokens-per-minute buckets.
+
+    Callers reserve an estimated token count with acquire() before sending a request and
+    report the real count from the response `usage` with reconcile() afterwards. Waiters are
+    served in FIFO order so large requests are not starved by a stream of small ones.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    async def acquire(self, estimated_tokens: int) -> int:
+        """
+        Wait until both buckets can admit one request of `estimated_tokens`, then reserve it.
+
+        Args:
+        estimated_tokens (int): The estimated tokens of the request.
+
+        Returns:
+        int: The number of tokens actually reserved, to be passed to reconcile().
+        """
+        # A request bigger than the whole bucket could otherwise never be admitted.
+        reserved = min(estimated_tokens, self.tokens.capacity)
+        async with self._lock:
+            while True:
+                delay = max(self.requests.wait_time(1), self.tokens.wait_time(reserved))
+                if delay <= 0:
+                    break
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+            self.requests.consume(1)
+            self.tokens.consume(reserved)
+        return reserved
+
+    def reconcile(self, reserved_tokens: int, actual_tokens: int) -> None:
+        """Correct the token bucket once the response reports how many tokens were really used."""
+        self.tokens.adjust(reserved_tokens - actual_tokens)
@@ -0,0 +1,130 @@
+import json
+import os
+import re
+from typing import List, NamedTuple, Optional
+
+from config.settings import MODEL_TIERING
+from utils.rate_limiter import estimate_tokens
+
+# Discipline designators of sheet numbers (A101, E-201, FA1.1); one- and two-letter
+# designators such as 'EP' or 'MH' fall back to their first letter
+SHEET_PREFIXES = {
+    'Architectural': ['A', 'AD'],
+    'Electrical': ['E', 'ED'],
+    'Mechanical': ['M', 'MD'],
+    'Plumbing': ['P', 'PD'],
+    'Site': ['S', 'SD'],
+    'Civil': ['C', 'CD'],
+    'Low Voltage': ['LV', 'LD'],
+    'Fire Alarm': ['FA', 'FD'],
+    'Kitchen': ['K', 'KD']
+}
+PREFIX_TYPES = {prefix: drawing_type for drawing_type, prefixes in SHEET_PREFIXES.items() for prefix in prefixes}
+
+# Words that mark a discipline when a sheet has no usable sheet number
+DISCIPLINE_KEYWORDS = {
+    'Architectural': ['floor plan', 'reflected ceiling', 'room finish', 'door schedule', 'partition', 'elevation',
+                      'ceiling height', 'wall type'],
+    'Electrical': ['panel', 'circuit', 'breaker', 'receptacle', 'lighting', 'conduit', 'switchboard',
+                   'transformer', 'feeder', 'kva'],
+    'Mechanical': ['hvac', 'cfm', 'diffuser', 'ductwork', 'air handl', 'rtu', 'vav', 'exhaust fan', 'chiller'],
+    'Plumbing': ['plumbing', 'fixture', 'water heater', 'sanitary', 'domestic water', 'lavatory', 'water closet',
+                 'gpm'],
+    'Site': ['site plan', 'paving', 'landscap', 'parking'],
+    'Civil': ['grading', 'storm', 'utility plan', 'erosion', 'civil'],
+    'Low Voltage': ['low voltage', 'data outlet', 'telecom', 'security', 'access control', 'cctv'],
+    'Fire Alarm': ['fire alarm', 'smoke detector', 'horn/strobe', 'pull station', 'facp'],
+    'Kitchen': ['kitchen', 'walk-in', 'hood', 'food service', 'cooler'],
+}
+MIN_KEYWORD_HITS = 2
+
+FILENAME_SHEET_NUMBER = re.compile(r"^([A-Z]{1,2})[-_. ]?\d")
+TITLE_BLOCK_SHEET_NUMBER = re.compile(
+    r"\b(?:SHEET|DWG|DRAWING)\s*(?:NO\.?|NUMBER|#)?\s*[:.]?\s*([A-Z]{1,2})[-.]?\d{1,3}(?:\.\d{1,2})?[A-Z]?\b"
+)
+COVER_SHEET = re.compile(r"\b(?:COVER SHEET|TITLE SHEET|SHEET INDEX|DRAWING INDEX|INDEX OF DRAWINGS)\b")
+WORD = re.compile(r"[A-Za-z0-9]+")
+SECTION_MARKER = re.compile(r"^(?:TEXT|TABLE):$", re.MULTILINE)
+
+SKIP_MAX_WORDS = 10  # Blank pages, scanned sheets without a text layer, sheets with only a title block stub
+SMALL_MAX_WORDS = 300
+SMALL_MAX_TABLE_ROWS = 5
+
+class SheetClassification(NamedTuple):
+    drawing_type: str
+    tier: str
+    sheet_number: Optional[str]
+    reason: str
+
+def prefix_drawing_type(prefix: str) -> Optional[str]:
+    prefix = prefix.upper()
+    return PREFIX_TYPES.get(prefix) or PREFIX_TYPES.get(prefix[:1])
+
+def get_drawing_type(filename: str) -> str:
+    """The drawing type given by the sheet number a file is named after, or 'General'."""
+    match = FILENAME_SHEET_NUMBER.match(os.path.basename(filename).upper())
+    return (prefix_drawing_type(match.group(1)) if match else None) or 'General'
+
+def keyword_drawing_type(text: str) -> Optional[str]:
+    lowered = text.lower()
+    hits = {drawing_type: sum(lowered.count(keyword) for keyword in keywords)
+            for drawing_type, keywords in DISCIPLINE_KEYWORDS.items()}
+    drawing_type, count = max(hits.items(), key=lambda item: item[1])
+    return drawing_type if count >= MIN_KEYWORD_HITS else None
+
+def classify_sheet(pages: List[str], file_path: str, tiering: bool = MODEL_TIERING) -> SheetClassification:
+    """
+    Classify an extracted sheet without a model call: its drawing type and processing tier.
+
+    The drawing type comes from the sheet number in the file name, else from the sheet
+    number in the title block text, else (for sheets without a number) from discipline keywords. The tier is 'skip' for
+    sheets with (almost) no text, 'small' for cover and index sheets and for short sheets
+    with little tabular content, and 'full' for everything else.
+
+    Args:
+    pages (List[str]): The extracted TEXT:/TABLE: page contents.
+    file_path (str): The source PDF.
+    tiering (bool): Choose a tier; with False every sheet is 'full'.
+
+    Returns:
+    SheetClassification: The drawing type, tier, sheet number found (if any) and the
+    reason for the tier.
+    """
+    content = SECTION_MARKER.sub("", "".join(pages))
+    sheet_number = None
+    drawing_type = get_drawing_type(file_path)
+    match = FILENAME_SHEET_NUMBER.match(os.path.basename(file_path).upper())
+    if match:
+        sheet_number = os.path.splitext(os.path.basename(file_path))[0]
+    else:
+        match = TITLE_BLOCK_SHEET_NUMBER.search(content.upper())
+        if match:
+            sheet_number = match.group(0).split()[-1].lstrip(":.")
+            drawing_type = prefix_drawing_type(match.group(1)) or drawing_type
+    if sheet_number is None:
+        # A number with a general designator (G001, T001) keeps the sheet 'General'
+        drawing_type = keyword_drawing_type(content) or 'General'
+
+    if not tiering:
+        return SheetClassification(drawing_type, "full", sheet_number, "tiering off")
+    words = len(WORD.findall(content))
+    table_rows = sum(1 for line in content.splitlines()
+                     if line.startswith("|") and line.strip("|-: "))
+    if words <= SKIP_MAX_WORDS:
+        return SheetClassification(drawing_type, "skip", sheet_number, f"{words} words")
+    if COVER_SHEET.search(content.upper()):
+        return SheetClassification(drawing_type, "small", sheet_number, "cover or index sheet")
+    if words <= SMALL_MAX_WORDS and table_rows <= SMALL_MAX_TABLE_ROWS:
+        return SheetClassification(drawing_type, "small", sheet_number, f"{words} words, {table_rows} table rows")
+    return SheetClassification(drawing_type, "full", sheet_number, f"{words} words, {table_rows} table rows")
+
+def skipped_sheet_output(classification: SheetClassification, pages: List[str]) -> str:
+    """The structured JSON recorded for a 'skip' sheet in place of a model response."""
+    return json.dumps({
+        "metadata": {"drawing_number": classification.sheet_number, "drawing_type": classification.drawing_type},
+        "skipped": classification.reason,
+        "text": SECTION_MARKER.sub("", "".join(pages)).strip(),
+    })
+
+def skipped_prompt_tokens(pages: List[str]) -> int:
+    return estimate_tokens("".join(pages))
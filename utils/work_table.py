@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from config.settings import WORK_LEASE_SECONDS, WORK_MAX_ATTEMPTS
+from utils.file_utils import _relative
+
+logger = logging.getLogger(__name__)
+
+WORK_FOLDER = '.work'
+WORK_TABLE_FILENAME = 'work.sqlite'
+WORKER_ROOTS_FILENAME = 'roots.json'
+# Not yet started, or leased by a worker that stopped renewing; parameters: now, max attempts
+CLAIMABLE = "(status = 'pending' OR (status = 'claimed' AND lease_until < ?)) AND attempts < ?"
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def work_folder(output_folder: str) -> str:
+    return os.path.join(output_folder, WORK_FOLDER)
+
+def worker_shard_folder(output_folder: str, worker_id: str) -> str:
+    """Folder holding one worker's manifest, run report and JSONL output until they are merged."""
+    return os.path.join(work_folder(output_folder), 'workers', worker_id)
+
+def write_worker_roots(shard_folder: str, job_folder: str, output_folder: str) -> None:
+    """Record where this worker mounts the input and output, so --merge can map its paths to its own."""
+    with open(os.path.join(shard_folder, WORKER_ROOTS_FILENAME), 'w') as f:
+        json.dump({'job_folder': os.path.abspath(job_folder), 'output_folder': os.path.abspath(output_folder)}, f)
+
+def read_worker_roots(shard_folder: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(shard_folder, WORKER_ROOTS_FILENAME), 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def rebase_path(path: str, old_root: Optional[str], new_root: str) -> str:
+    """Move a path under old_root to the same place under new_root; other paths are returned as is."""
+    if not old_root or not path:
+        return path
+    relative = _relative(path, old_root)
+    if relative.startswith('../'):
+        return path
+    return os.path.join(os.path.abspath(new_root), *relative.split('/'))
+
+def list_worker_shards(output_folder: str) -> List[str]:
+    workers_folder = os.path.join(work_folder(output_folder), 'workers')
+    if not os.path.isdir(workers_folder):
+        return []
+    return sorted(entry.path for entry in os.scandir(workers_folder) if entry.is_dir())
+
+class WorkTable:
+    """
+    SQLite work table through which several worker processes, on one or more machines,
+    share the files of one job.
+
+    Every worker adds the files it discovers and claims a file before processing it. A
+    claim is a lease: the owner renews it while it works, and once it has expired (the
+    worker crashed or lost the share) any other worker may claim the file again, up to
+    WORK_MAX_ATTEMPTS times. Claims are single UPDATE statements, so SQLite's file
+    locking makes them atomic; the output folder must be on a filesystem with working
+    POSIX locks when workers run on several machines.
+
+    Files are keyed by their path relative to the job folder, so workers may mount the
+    input at different paths; the methods take and return this worker's local paths.
+
+    Args:
+    output_folder (str): The shared output folder; the table lives in its .work folder.
+    worker_id (str): This worker's unique name.
+    lease_seconds (float): How long a claim stays valid without renewal.
+    max_attempts (int): How many times a file is claimed before it is given up.
+    job_folder (Optional[str]): This worker's job folder; without it paths are stored as given.
+    """
+
+    def __init__(self, output_folder: str, worker_id: str, lease_seconds: float = WORK_LEASE_SECONDS,
+                 max_attempts: int = WORK_MAX_ATTEMPTS, job_folder: Optional[str] = None):
+        os.makedirs(work_folder(output_folder), exist_ok=True)
+        self.path = os.path.join(work_folder(output_folder), WORK_TABLE_FILENAME)
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.job_folder = job_folder
+        self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS work ("
+            " path TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " worker TEXT,"
+            " lease_until REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " updated REAL NOT NULL)"
+        )
+
+    def _key(self, path: str) -> str:
+        return _relative(path, self.job_folder) if self.job_folder else path
+
+    def _local(self, key: str) -> str:
+        return os.path.join(self.job_folder, *key.split('/')) if self.job_folder else key
+
+    def add(self, path: str) -> None:
+        self._conn.execute("INSERT OR IGNORE INTO work (path, status, updated) VALUES (?, 'pending', ?)",
+                           (self._key(path), time.time()))
+
+    def claim(self, path: str) -> bool:
+        """Claim a file; False if it is done, failed or leased by another worker."""
+        now = time.time()
+        cursor = self._conn.execute(
+            f"UPDATE work SET status = 'claimed', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ?"
+            f" WHERE path = ? AND {CLAIMABLE}",
+            (self.worker_id, now + self.lease_seconds, now, self._key(path), now, self.max_attempts),
+        )
+        return cursor.rowcount == 1
+
+    def claimable(self, limit: int) -> List[str]:
+        """Up to limit files that could be claimed now: not yet started, or with an expired lease."""
+        rows = self._conn.execute(f"SELECT path FROM work WHERE {CLAIMABLE} ORDER BY path LIMIT ?",
+                                  (time.time(), self.max_attempts, limit)).fetchall()
+        return [self._local(row[0]) for row in rows]
+
+    def renew(self) -> int:
+        """Extend the leases of every file this worker holds; returns how many were renewed."""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE work SET lease_until = ?, updated = ? WHERE worker = ? AND status = 'claimed'",
+            (now + self.lease_seconds, now, self.worker_id),
+        )
+        return cursor.rowcount
+
+    def complete(self, path: str, status: str) -> None:
+        """Mark a claimed file 'done', 'skipped' or 'failed'."""
+        self._conn.execute(
+            "UPDATE work SET status = ?, lease_until = NULL, updated = ? WHERE path = ? AND worker = ?",
+            (status, time.time(), self._key(path), self.worker_id),
+        )
+
+    def release(self) -> None:
+        """Hand this worker's unfinished claims back, e.g. when it is interrupted."""
+        self._conn.execute(
+            "UPDATE work SET status = 'pending', worker = NULL, lease_until = NULL, attempts = attempts - 1,"
+            " updated = ? WHERE worker = ? AND status = 'claimed'",
+            (time.time(), self.worker_id),
+        )
+
+    def claimed_elsewhere(self) -> int:
+        """Number of files other workers hold live leases on."""
+        row = self._conn.execute(
+            "SELECT COUNT(*) FROM work WHERE status = 'claimed' AND worker != ? AND lease_until >= ?",
+            (self.worker_id, time.time()),
+        ).fetchone()
+        return row[0]
+
+    def remaining(self) -> int:
+        """Number of files still to be processed: claimable, or leased to a live worker."""
+        now = time.time()
+        row = self._conn.execute(
+            f"SELECT COUNT(*) FROM work WHERE ({CLAIMABLE}) OR (status = 'claimed' AND lease_until >= ?)",
+            (now, self.max_attempts, now),
+        ).fetchone()
+        return row[0]
+
+    def counts(self) -> Dict[str, int]:
+        """Files per status; expired claims of crashed workers count as 'expired'."""
+        rows = self._conn.execute(
+            "SELECT CASE WHEN status = 'claimed' AND lease_until < ? THEN 'expired' ELSE status END, COUNT(*)"
+            " FROM work GROUP BY 1",
+            (time.time(),),
+        ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        self._conn.close()